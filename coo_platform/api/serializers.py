@@ -3,13 +3,56 @@ Serializers for the REST API.
 """
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db import models
+from django.db.models import Count, F, Prefetch, Q
 from projects.models import Project, Task, ProjectCategory, ProjectMembership
 from kpis.models import SmartKPI, KPIDataPoint, KPICategory, KPIAlert
+from kpis.series import attach_recent_series, attach_trend_series
 from automation.models import AutomationRule, AutomationAction
-from tenants.models import Tenant, TenantUser
+from tenants.models import Tenant, TenantUser, TenantReport
 from core.models import UserProfile, Notification
 
 
+def get_requested_fields(request):
+    """
+    Return the set of field names requested with ``?fields=a,b``, or None
+    when the client did not ask for a sparse fieldset.
+    """
+    if request is None:
+        return None
+    
+    query_params = getattr(request, 'query_params', request.GET)
+    raw = query_params.get('fields')
+    if not raw:
+        return None
+    
+    return {name.strip() for name in raw.split(',') if name.strip()}
+
+
+def wants_field(fields, name):
+    """Check whether a field is part of the requested sparse fieldset."""
+    return fields is None or name in fields
+
+
+class SparseFieldsetMixin:
+    """
+    Drop fields not listed in the ``?fields=`` query parameter from
+    read responses, so list endpoints can skip expensive fields entirely.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        
+        request = self.context.get('request')
+        if request is None or request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            return
+        
+        fields = get_requested_fields(request)
+        if fields is not None:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+
 class UserProfileSerializer(serializers.ModelSerializer):
     """Serializer for user profiles."""
     full_name = serializers.SerializerMethodField()
@@ -50,7 +93,16 @@ class TenantSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'slug', 'created_at']
 
 
-class ProjectCategorySerializer(serializers.ModelSerializer):
+class TenantReportSerializer(serializers.ModelSerializer):
+    """Serializer for stored monthly tenant reports."""
+    
+    class Meta:
+        model = TenantReport
+        fields = ['id', 'month', 'data', 'deltas', 'generated_at', 'generation_ms']
+        read_only_fields = fields
+
+
+class ProjectCategorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for project categories."""
     project_count = serializers.SerializerMethodField()
     
@@ -58,7 +110,22 @@ class ProjectCategorySerializer(serializers.ModelSerializer):
         model = ProjectCategory
         fields = ['id', 'name', 'description', 'color', 'is_active', 'project_count']
     
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None):
+        """Annotate the computed fields so a list page costs a constant number of queries."""
+        if wants_field(fields, 'project_count'):
+            queryset = queryset.annotate(
+                num_projects=Count(
+                    'projects',
+                    filter=Q(projects__tenant=F('tenant')),
+                    distinct=True
+                )
+            )
+        return queryset
+    
     def get_project_count(self, obj):
+        if hasattr(obj, 'num_projects'):
+            return obj.num_projects
         return obj.projects.filter(tenant=obj.tenant).count()
 
 
@@ -99,13 +166,13 @@ class TaskSerializer(serializers.ModelSerializer):
             'id', 'title', 'description', 'status', 'priority',
             'assigned_to', 'assigned_to_id', 'created_by',
             'due_date', 'started_at', 'completed_at',
-            'estimated_hours', 'actual_hours', 'tags',
+            'estimated_hours', 'actual_hours', 'tags', 'rank',
             'is_overdue', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_by', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'created_by', 'rank', 'created_at', 'updated_at']
 
 
-class ProjectSerializer(serializers.ModelSerializer):
+class ProjectSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for projects."""
     category = ProjectCategorySerializer(read_only=True)
     project_manager = UserSerializer(read_only=True)
@@ -149,10 +216,40 @@ class ProjectSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
     
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None):
+        """Annotate the computed fields so a list page costs a constant number of queries."""
+        if wants_field(fields, 'project_manager'):
+            queryset = queryset.select_related('project_manager__profile')
+        if wants_field(fields, 'team_members'):
+            queryset = queryset.prefetch_related('team_members__profile')
+        if wants_field(fields, 'category'):
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    'category',
+                    queryset=ProjectCategorySerializer.setup_eager_loading(
+                        ProjectCategory.objects.all()
+                    )
+                )
+            )
+        if wants_field(fields, 'task_count'):
+            queryset = queryset.annotate(num_tasks=Count('tasks', distinct=True))
+        if wants_field(fields, 'completed_tasks'):
+            queryset = queryset.annotate(
+                num_completed_tasks=Count(
+                    'tasks', filter=Q(tasks__status='completed'), distinct=True
+                )
+            )
+        return queryset
+    
     def get_task_count(self, obj):
+        if hasattr(obj, 'num_tasks'):
+            return obj.num_tasks
         return obj.tasks.count()
     
     def get_completed_tasks(self, obj):
+        if hasattr(obj, 'num_completed_tasks'):
+            return obj.num_completed_tasks
         return obj.tasks.filter(status='completed').count()
 
 
@@ -183,7 +280,16 @@ class KPIDataPointSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'entered_by', 'created_at']
 
 
-class SmartKPISerializer(serializers.ModelSerializer):
+class SmartKPIListSerializer(serializers.ListSerializer):
+    """Attach the series of the KPIs being serialized (see SmartKPISerializer.attach_series)."""
+    
+    def to_representation(self, data):
+        kpis = list(data.all() if isinstance(data, models.Manager) else data)
+        self.child.attach_series(kpis)
+        return super().to_representation(kpis)
+
+
+class SmartKPISerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Smart KPIs."""
     category = KPICategorySerializer(read_only=True)
     owner = UserSerializer(read_only=True)
@@ -208,6 +314,12 @@ class SmartKPISerializer(serializers.ModelSerializer):
     current_value = serializers.SerializerMethodField()
     performance_status = serializers.SerializerMethodField()
     trend_data = serializers.SerializerMethodField()
+    sparkline = serializers.SerializerMethodField()
+    
+    # Number of days covered by trend_data
+    TREND_DAYS = 30
+    # Number of latest data points in sparkline
+    SPARKLINE_POINTS = 30
     
     class Meta:
         model = SmartKPI
@@ -217,10 +329,41 @@ class SmartKPISerializer(serializers.ModelSerializer):
             'target_value', 'warning_threshold', 'critical_threshold',
             'trend_direction', 'auto_update_frequency', 'owner', 'owner_id',
             'stakeholders', 'is_active', 'is_featured', 'chart_type',
-            'current_value', 'performance_status', 'trend_data',
+            'current_value', 'performance_status', 'trend_data', 'sparkline',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+        list_serializer_class = SmartKPIListSerializer
+    
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None):
+        """Annotate the computed fields so a list page costs a constant number of queries."""
+        if wants_field(fields, 'owner'):
+            queryset = queryset.select_related('owner__profile')
+        if wants_field(fields, 'stakeholders'):
+            queryset = queryset.prefetch_related('stakeholders__profile')
+        if wants_field(fields, 'category'):
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    'category',
+                    queryset=KPICategory.objects.annotate(
+                        active_kpi_count=Count('kpis', filter=Q(kpis__is_active=True))
+                    )
+                )
+            )
+        if wants_field(fields, 'current_value') or wants_field(fields, 'performance_status'):
+            queryset = queryset.with_latest_value()
+        return queryset
+    
+    def attach_series(self, kpis):
+        """
+        Load the trend_data and sparkline series of ``kpis`` (an evaluated
+        page) with one query each, instead of two queries per KPI.
+        """
+        if 'trend_data' in self.fields:
+            attach_trend_series(kpis, self.TREND_DAYS)
+        if 'sparkline' in self.fields:
+            attach_recent_series(kpis, self.SPARKLINE_POINTS)
     
     def get_current_value(self, obj):
         value = obj.get_latest_value()
@@ -231,10 +374,24 @@ class SmartKPISerializer(serializers.ModelSerializer):
     
     def get_trend_data(self, obj):
         # Return last 30 days of trend data
-        return obj.get_trend_data(days=30)
+        return obj.get_trend_data(days=self.TREND_DAYS)
+    
+    def get_sparkline(self, obj):
+        # Values of the latest data points, oldest first
+        return obj.get_recent_series(points=self.SPARKLINE_POINTS).values.tolist()
+
+
+class KPIAlertListSerializer(serializers.ListSerializer):
+    """Attach the series of the alerts' KPIs for the nested KPI serializer."""
+    
+    def to_representation(self, data):
+        alerts = list(data.all() if isinstance(data, models.Manager) else data)
+        if 'kpi' in self.child.fields:
+            self.child.fields['kpi'].attach_series([alert.kpi for alert in alerts])
+        return super().to_representation(alerts)
 
 
-class KPIAlertSerializer(serializers.ModelSerializer):
+class KPIAlertSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for KPI alerts."""
     kpi = SmartKPISerializer(read_only=True)
     acknowledged_by = UserSerializer(read_only=True)
@@ -248,6 +405,21 @@ class KPIAlertSerializer(serializers.ModelSerializer):
             'resolved_at', 'created_at'
         ]
         read_only_fields = ['id', 'acknowledged_by', 'created_at']
+        list_serializer_class = KPIAlertListSerializer
+    
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None):
+        """Load the nested KPI with its own computed fields in bulk."""
+        if wants_field(fields, 'acknowledged_by'):
+            queryset = queryset.select_related('acknowledged_by__profile')
+        if wants_field(fields, 'kpi'):
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    'kpi',
+                    queryset=SmartKPISerializer.setup_eager_loading(SmartKPI.objects.all())
+                )
+            )
+        return queryset
 
 
 class AutomationActionSerializer(serializers.ModelSerializer):
@@ -262,7 +434,7 @@ class AutomationActionSerializer(serializers.ModelSerializer):
         ]
 
 
-class AutomationRuleSerializer(serializers.ModelSerializer):
+class AutomationRuleSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for automation rules."""
     created_by = UserSerializer(read_only=True)
     team_access = UserSerializer(many=True, read_only=True)
@@ -285,7 +457,33 @@ class AutomationRuleSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
     
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None):
+        """Annotate the computed fields so a list page costs a constant number of queries."""
+        if wants_field(fields, 'created_by'):
+            queryset = queryset.select_related('created_by__profile')
+        if wants_field(fields, 'team_access'):
+            queryset = queryset.prefetch_related('team_access__profile')
+        if wants_field(fields, 'actions'):
+            queryset = queryset.prefetch_related('actions')
+        if wants_field(fields, 'execution_stats'):
+            queryset = queryset.annotate(
+                logs_total=Count('logs'),
+                logs_success=Count('logs', filter=Q(logs__status='success')),
+                logs_error=Count('logs', filter=Q(logs__status='error')),
+                logs_partial=Count('logs', filter=Q(logs__status='partial')),
+            )
+        return queryset
+    
     def get_execution_stats(self, obj):
+        if hasattr(obj, 'logs_total'):
+            return {
+                'total': obj.logs_total,
+                'success': obj.logs_success,
+                'error': obj.logs_error,
+                'partial': obj.logs_partial,
+            }
+        
         logs = obj.logs.all()
         return {
             'total': logs.count(),
@@ -16,6 +16,7 @@ router.register(r'kpi-categories', views.KPICategoryViewSet)
 router.register(r'kpi-alerts', views.KPIAlertViewSet)
 router.register(r'automation-rules', views.AutomationRuleViewSet)
 router.register(r'notifications', views.NotificationViewSet)
+router.register(r'tenant-reports', views.TenantReportViewSet)
 
 app_name = 'api'
 
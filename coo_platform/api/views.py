@@ -9,20 +9,28 @@ from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 from django.db.models import Count, Q
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 from .serializers import (
     UserSerializer, UserProfileSerializer, TenantSerializer,
     ProjectSerializer, ProjectCategorySerializer, TaskSerializer,
     SmartKPISerializer, KPICategorySerializer, KPIDataPointSerializer,
-    KPIAlertSerializer, AutomationRuleSerializer, NotificationSerializer
+    KPIAlertSerializer, AutomationRuleSerializer, NotificationSerializer,
+    TenantReportSerializer, get_requested_fields
 )
 
 from projects.models import Project, ProjectCategory, Task
+from projects.graph import get_task_graph
+from projects.board import BOARD_COLUMN_SIZE, MAX_BOARD_COLUMN_SIZE, get_board, move_task
 from kpis.models import SmartKPI, KPICategory, KPIDataPoint, KPIAlert
 from automation.models import AutomationRule
 from core.models import Notification
+from tenants.models import TenantReport
 from tenants.middleware import get_current_tenant
+from tenants.reports import generate_report, get_report, get_report_month
+from kpis.calculation import FormulaError, backfill_kpi
+from kpis.forecasting import get_forecast, get_forecasts
+from kpis.freshness import get_freshness_summary
 from core.utils import log_user_action
 
 
@@ -39,9 +47,27 @@ class TenantFilterMixin:
         return queryset
 
 
-class ProjectCategoryViewSet(TenantFilterMixin, viewsets.ModelViewSet):
+class EagerLoadingMixin:
+    """
+    Mixin that lets the serializer annotate/prefetch its computed fields,
+    honouring the ``?fields=`` sparse fieldset of the request.
+    """
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(
+                queryset, get_requested_fields(self.request)
+            )
+        
+        return queryset
+
+
+class ProjectCategoryViewSet(EagerLoadingMixin, TenantFilterMixin, viewsets.ModelViewSet):
     """API ViewSet for Project Categories."""
-    queryset = ProjectCategory.objects.all()
+    queryset = ProjectCategory.objects.order_by('name')
     serializer_class = ProjectCategorySerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
@@ -53,7 +79,7 @@ class ProjectCategoryViewSet(TenantFilterMixin, viewsets.ModelViewSet):
         serializer.save(tenant=tenant)
 
 
-class ProjectViewSet(TenantFilterMixin, viewsets.ModelViewSet):
+class ProjectViewSet(EagerLoadingMixin, TenantFilterMixin, viewsets.ModelViewSet):
     """API ViewSet for Projects."""
     queryset = Project.objects.all()
     serializer_class = ProjectSerializer
@@ -64,10 +90,6 @@ class ProjectViewSet(TenantFilterMixin, viewsets.ModelViewSet):
     ordering_fields = ['name', 'created_at', 'target_end_date', 'progress_percentage']
     ordering = ['-created_at']
     
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        return queryset.select_related('category', 'project_manager').prefetch_related('team_members')
-    
     def perform_create(self, serializer):
         tenant = get_current_tenant()
         serializer.save(tenant=tenant)
@@ -128,6 +150,32 @@ class ProjectViewSet(TenantFilterMixin, viewsets.ModelViewSet):
             'is_overdue': project.is_overdue,
             'days_remaining': project.days_remaining,
         })
+    
+    @action(detail=True, methods=['get'], url_path='dependency-graph')
+    def dependency_graph(self, request, pk=None):
+        """Get the task dependency analysis: cycles, blocked tasks and the critical path schedule."""
+        project = self.get_object()
+        return Response({'project_id': project.id, **get_task_graph(project)})
+    
+    @action(detail=True, methods=['get'])
+    def board(self, request, pk=None):
+        """Get the Kanban board: the first ``size`` tasks of every status column, by rank, and the column counts."""
+        project = self.get_object()
+        try:
+            size = min(max(int(request.query_params.get('size', BOARD_COLUMN_SIZE)), 1), MAX_BOARD_COLUMN_SIZE)
+        except ValueError:
+            size = BOARD_COLUMN_SIZE
+        
+        columns = get_board(
+            project.tasks.select_related('assigned_to__profile', 'created_by__profile'), size
+        )
+        return Response({
+            'project_id': project.id,
+            'columns': [
+                {**column, 'tasks': TaskSerializer(column['tasks'], many=True).data}
+                for column in columns
+            ],
+        })
 
 
 class TaskViewSet(viewsets.ModelViewSet):
@@ -138,14 +186,14 @@ class TaskViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['title', 'description']
     filterset_fields = ['status', 'priority', 'assigned_to', 'project']
-    ordering_fields = ['title', 'created_at', 'due_date', 'priority']
+    ordering_fields = ['title', 'created_at', 'due_date', 'priority', 'rank']
     ordering = ['-created_at']
     
     def get_queryset(self):
         tenant = get_current_tenant()
         if tenant:
             return Task.objects.filter(project__tenant=tenant).select_related(
-                'project', 'assigned_to', 'created_by'
+                'project', 'assigned_to__profile', 'created_by__profile'
             )
         return Task.objects.none()
     
@@ -174,6 +222,36 @@ class TaskViewSet(viewsets.ModelViewSet):
             {'status': 'error', 'message': 'Invalid status'},
             status=status.HTTP_400_BAD_REQUEST
         )
+    
+    @action(detail=True, methods=['post'])
+    def move(self, request, pk=None):
+        """
+        Move the task on the Kanban board: to the ``status`` column (default:
+        its own), after the task ``after`` and/or before the task ``before``
+        (default: the bottom of the column).
+        """
+        task = self.get_object()
+        old_status = task.status
+        try:
+            rank = move_task(
+                task,
+                request.data.get('status') or task.status,
+                after=request.data.get('after'),
+                before=request.data.get('before')
+            )
+        except ValueError as e:
+            return Response(
+                {'status': 'error', 'message': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if task.status != old_status:
+            log_user_action(
+                request, 'update', 'Task', str(task.id),
+                f'Moved from {old_status} to {task.status}'
+            )
+        
+        return Response({'status': 'success', 'new_status': task.status, 'rank': rank})
 
 
 class KPICategoryViewSet(TenantFilterMixin, viewsets.ModelViewSet):
@@ -191,7 +269,7 @@ class KPICategoryViewSet(TenantFilterMixin, viewsets.ModelViewSet):
         serializer.save(tenant=tenant)
 
 
-class SmartKPIViewSet(TenantFilterMixin, viewsets.ModelViewSet):
+class SmartKPIViewSet(EagerLoadingMixin, TenantFilterMixin, viewsets.ModelViewSet):
     """API ViewSet for Smart KPIs."""
     queryset = SmartKPI.objects.all()
     serializer_class = SmartKPISerializer
@@ -202,10 +280,6 @@ class SmartKPIViewSet(TenantFilterMixin, viewsets.ModelViewSet):
     ordering_fields = ['name', 'created_at']
     ordering = ['category', 'name']
     
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        return queryset.select_related('category', 'owner').prefetch_related('stakeholders')
-    
     def perform_create(self, serializer):
         tenant = get_current_tenant()
         if not serializer.validated_data.get('owner'):
@@ -274,6 +348,66 @@ class SmartKPIViewSet(TenantFilterMixin, viewsets.ModelViewSet):
             'target_value': kpi.target_value,
             'performance_status': kpi.calculate_performance_status(),
         })
+    
+    @action(detail=True, methods=['post'])
+    def backfill(self, request, pk=None):
+        """
+        Recompute the history of a calculated KPI from its parents. With
+        ``dry_run`` only the diff is returned and nothing is written.
+        """
+        kpi = self.get_object()
+        if kpi.data_source_type != 'calculated':
+            return Response(
+                {'detail': 'Only calculated KPIs can be backfilled.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        dry_run = str(request.data.get('dry_run', request.query_params.get('dry_run', ''))).lower() in ('1', 'true', 'yes')
+        since = request.data.get('since')
+        try:
+            since = datetime.strptime(since, '%Y-%m-%d').date() if since else None
+            diff = backfill_kpi(kpi, since=since, dry_run=dry_run)
+        except (FormulaError, ValueError) as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if not dry_run:
+            log_user_action(
+                request, 'update', 'SmartKPI', str(kpi.id),
+                f"Backfilled {kpi.name}: {diff['created']} created, {diff['updated']} updated"
+            )
+        
+        return Response(diff)
+    
+    @action(detail=False, methods=['get'])
+    def freshness(self, request):
+        """Get the data freshness of the tenant's active KPIs and the most overdue ones."""
+        kpis = self.get_queryset().filter(is_active=True)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 100)), 1), 1000)
+        except ValueError:
+            limit = 100
+        return Response(get_freshness_summary(kpis, limit=limit))
+    
+    @action(detail=True, methods=['get'])
+    def forecast(self, request, pk=None):
+        """Get the projected trend of a KPI (cached until new data arrives)."""
+        kpi = self.get_object()
+        forecast = get_forecast(kpi)
+        
+        if forecast is None:
+            return Response(
+                {'detail': 'Not enough data points to forecast this KPI.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        return Response({'kpi_name': kpi.name, 'unit': kpi.unit, **forecast})
+    
+    @action(detail=False, methods=['get'])
+    def forecasts(self, request):
+        """Get the forecasts of all (filtered) KPIs in one batch."""
+        kpis = self.filter_queryset(self.get_queryset())
+        forecasts = get_forecasts(kpis)
+        return Response(list(forecasts.values()))
 
 
 class KPIAlertViewSet(viewsets.ReadOnlyModelViewSet):
@@ -288,7 +422,10 @@ class KPIAlertViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         tenant = get_current_tenant()
         if tenant:
-            return KPIAlert.objects.filter(kpi__tenant=tenant).select_related('kpi', 'acknowledged_by')
+            return KPIAlertSerializer.setup_eager_loading(
+                KPIAlert.objects.filter(kpi__tenant=tenant),
+                get_requested_fields(self.request)
+            )
         return KPIAlert.objects.none()
     
     @action(detail=True, methods=['post'])
@@ -305,7 +442,7 @@ class KPIAlertViewSet(viewsets.ReadOnlyModelViewSet):
         return Response({'status': 'acknowledged'})
 
 
-class AutomationRuleViewSet(TenantFilterMixin, viewsets.ModelViewSet):
+class AutomationRuleViewSet(EagerLoadingMixin, TenantFilterMixin, viewsets.ModelViewSet):
     """API ViewSet for Automation Rules."""
     queryset = AutomationRule.objects.all()
     serializer_class = AutomationRuleSerializer
@@ -316,10 +453,6 @@ class AutomationRuleViewSet(TenantFilterMixin, viewsets.ModelViewSet):
     ordering_fields = ['name', 'created_at', 'last_triggered']
     ordering = ['-created_at']
     
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        return queryset.select_related('created_by').prefetch_related('team_access', 'actions')
-    
     def perform_create(self, serializer):
         tenant = get_current_tenant()
         serializer.save(tenant=tenant, created_by=self.request.user)
@@ -393,6 +526,57 @@ class NotificationViewSet(viewsets.ModelViewSet):
         return Response({'marked_read': updated})
 
 
+class TenantReportViewSet(viewsets.ReadOnlyModelViewSet):
+    """API ViewSet for monthly tenant reports (served from stored snapshots)."""
+    queryset = TenantReport.objects.all()
+    serializer_class = TenantReportSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['month']
+    ordering = ['-month']
+    
+    def get_queryset(self):
+        tenant = get_current_tenant()
+        if tenant:
+            return TenantReport.objects.filter(tenant=tenant)
+        return TenantReport.objects.none()
+    
+    @action(detail=False, methods=['get'], url_path='for-month')
+    def for_month(self, request):
+        """Get the report of a month (``?month=YYYY-MM-DD``, default last month), generating it if not stored yet."""
+        tenant = get_current_tenant()
+        if not tenant:
+            return Response({'error': 'No tenant found'}, status=404)
+        
+        try:
+            month = get_report_month(request.query_params.get('month') or None)
+        except ValueError:
+            return Response({'error': 'Invalid month, expected YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(self.get_serializer(get_report(tenant, month)).data)
+    
+    @action(detail=False, methods=['post'])
+    def regenerate(self, request):
+        """Regenerate the report of a month (``month=YYYY-MM-DD``, default last month)."""
+        tenant = get_current_tenant()
+        if not tenant:
+            return Response({'error': 'No tenant found'}, status=404)
+        
+        try:
+            month = get_report_month(request.data.get('month'))
+        except ValueError:
+            return Response({'error': 'Invalid month, expected YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        report = generate_report(tenant, month)
+        
+        log_user_action(
+            request, 'update', 'TenantReport', str(report.id),
+            f'Regenerated report for {month:%B %Y}'
+        )
+        
+        return Response(self.get_serializer(report).data)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def dashboard_summary(request):
@@ -486,11 +670,10 @@ def platform_analytics(request):
         'performance_summary': {},
     }
     
-    # Calculate performance summary
+    # Calculate performance summary (computed in SQL and grouped, so KPIs are never loaded)
     performance_counts = {'excellent': 0, 'good': 0, 'warning': 0, 'critical': 0, 'unknown': 0}
-    for kpi in kpis:
-        status = kpi.calculate_performance_status()
-        performance_counts[status] = performance_counts.get(status, 0) + 1
+    for row in kpis.with_performance_status().values('performance_status').annotate(count=Count('id')).order_by():
+        performance_counts[row['performance_status']] = row['count']
     
     kpi_analytics['performance_summary'] = performance_counts
     
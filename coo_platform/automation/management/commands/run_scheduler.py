@@ -0,0 +1,46 @@
+"""
+Management command to run the schedule dispatcher for time-based automation rules.
+"""
+from django.core.management.base import BaseCommand
+import signal
+
+from automation.scheduling import ScheduleDispatcher, dispatch_due_schedules
+
+
+class Command(BaseCommand):
+    help = 'Dispatch time-based automation rules as they become due'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--inline',
+            action='store_true',
+            help='Execute the rules in this process instead of sending them to Celery workers'
+        )
+        parser.add_argument('--once', action='store_true', help='Dispatch what is due now and exit')
+        parser.add_argument('--batch-size', type=int, default=None, help='Schedules dispatched per batch')
+    
+    def execute_inline(self, claims, fired_at):
+        """Dispatcher executing the claimed rules in this process."""
+        from automation.tasks.celery_tasks import execute_scheduled_rules
+        
+        execute_scheduled_rules([[str(pk), str(token)] for pk, token in claims], fired_at.isoformat())
+    
+    def handle(self, *args, **options):
+        dispatch = self.execute_inline if options['inline'] else None
+        dispatcher = ScheduleDispatcher(dispatch=dispatch, batch_size=options['batch_size'])
+        
+        if options['once']:
+            dispatched = dispatch_due_schedules(dispatch=dispatch, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Dispatched {dispatched} scheduled rules'))
+            return
+        
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+        
+        self.stdout.write('Schedule dispatcher running (Ctrl+C to stop)')
+        try:
+            dispatcher.run_forever(should_stop=lambda: bool(stopping))
+        except KeyboardInterrupt:
+            pass
+        
+        self.stdout.write(self.style.SUCCESS('Schedule dispatcher stopped'))
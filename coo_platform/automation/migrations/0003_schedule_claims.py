@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('automation', '0002_partition_automationlog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='automationschedule',
+            name='claimed_by',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='automationschedule',
+            name='execution_token',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='automationschedule',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='automationschedule',
+            index=models.Index(fields=['is_active', 'next_run'], name='automation__is_acti_dfa02a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='automationschedule',
+            index=models.Index(fields=['lease_expires_at'], name='automation__lease_e_e9539f_idx'),
+        ),
+    ]
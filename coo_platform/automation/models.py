@@ -164,17 +164,30 @@ class AutomationRule(UUIDModel, TenantAwareModel, TimeStampedModel):
                 except Task.DoesNotExist:
                     pass
         
-        elif self.trigger_type == 'time_based':
-            schedule = self.trigger_config.get('schedule')  # 'daily', 'weekly', 'monthly'
-            time_of_day = self.trigger_config.get('time_of_day')  # HH:MM format
+        elif self.trigger_type == 'data_anomaly':
+            from kpis.models import KPIAnomalyState
             
-            if schedule and time_of_day:
-                now = timezone.now()
-                
-                # Simple time-based checking (could be enhanced with cron-like syntax)
-                if schedule == 'daily':
-                    return now.strftime('%H:%M') == time_of_day
-                # Add more schedule types as needed
+            # Anomalies scored by kpis.anomaly since the rule last fired
+            states = KPIAnomalyState.objects.filter(kpi__tenant=self.tenant)
+            kpi_id = self.trigger_config.get('kpi_id')
+            z_threshold = self.trigger_config.get('z_threshold')
+            
+            if kpi_id:
+                states = states.filter(kpi_id=kpi_id)
+            if z_threshold is not None:
+                states = states.filter(
+                    models.Q(last_zscore__gte=z_threshold) | models.Q(last_zscore__lte=-z_threshold)
+                )
+            else:
+                states = states.filter(is_anomalous=True)
+            if self.last_triggered:
+                states = states.filter(updated_at__gt=self.last_triggered)
+            
+            return states.exists()
+        
+        elif self.trigger_type == 'time_based':
+            # Time-based rules are fired by their AutomationSchedule (see automation.scheduling)
+            return False
         
         return False
     
@@ -358,6 +371,7 @@ class AutomationAction(UUIDModel, TimeStampedModel):
         
         if user_ids and title and message:
             from django.contrib.auth.models import User
+            from core.utils import create_notification
             
             users = User.objects.filter(id__in=user_ids)
             for user in users:
@@ -566,58 +580,52 @@ class AutomationSchedule(UUIDModel, TimeStampedModel):
     last_run = models.DateTimeField(null=True, blank=True)
     next_run = models.DateTimeField()
     
+    # Claim of the run in flight (see automation.scheduling.claim_due_schedules)
+    execution_token = models.UUIDField(null=True, blank=True, editable=False)
+    claimed_by = models.CharField(max_length=100, blank=True, editable=False)
+    lease_expires_at = models.DateTimeField(null=True, blank=True, editable=False)
+    
     is_active = models.BooleanField(default=True)
     
     class Meta:
         ordering = ['next_run']
+        indexes = [
+            models.Index(fields=['is_active', 'next_run']),
+            models.Index(fields=['lease_expires_at']),
+        ]
     
     def __str__(self):
         return f"{self.rule.name} - {self.frequency}"
     
-    def calculate_next_run(self):
-        """Calculate the next execution time based on frequency."""
-        from datetime import datetime, timedelta
-        import pytz
-        
-        tz = pytz.timezone(self.timezone)
-        now = timezone.now().astimezone(tz)
-        
-        if self.frequency == 'once':
-            # For one-time execution, use start_date + start_time
-            next_run = datetime.combine(self.start_date, self.start_time)
-            next_run = tz.localize(next_run)
-        elif self.frequency == 'daily':
-            next_run = now.replace(
-                hour=self.start_time.hour,
-                minute=self.start_time.minute,
-                second=0,
-                microsecond=0
-            )
-            if next_run <= now:
-                next_run += timedelta(days=1)
-        elif self.frequency == 'weekly':
-            # Add weekly logic
-            next_run = now.replace(
-                hour=self.start_time.hour,
-                minute=self.start_time.minute,
-                second=0,
-                microsecond=0
-            )
-            days_ahead = 7 - now.weekday()
-            if days_ahead <= 0 or (days_ahead == 7 and next_run <= now):
-                days_ahead += 7
-            next_run += timedelta(days=days_ahead)
+    def clean(self):
+        from .scheduling import InvalidCronExpression, get_cron
+        
+        if self.frequency == 'custom':
+            if not self.cron_expression:
+                raise ValidationError({'cron_expression': 'A cron expression is required for custom schedules.'})
+            try:
+                get_cron(self.cron_expression)
+            except InvalidCronExpression as e:
+                raise ValidationError({'cron_expression': str(e)})
+        
+        if self.end_date and self.end_date < self.start_date:
+            raise ValidationError({'end_date': 'End date cannot be before the start date.'})
+    
+    def calculate_next_run(self, after=None, save=True):
+        """
+        Calculate the next execution time from the frequency (or cron
+        expression), evaluated in the schedule's timezone. Schedules with no
+        further runs are deactivated.
+        """
+        from .scheduling import get_next_run
+        
+        next_run = get_next_run(self, after)
+        if next_run is None:
+            self.is_active = False
         else:
-            # Default to daily for other frequencies (can be enhanced)
-            next_run = now.replace(
-                hour=self.start_time.hour,
-                minute=self.start_time.minute,
-                second=0,
-                microsecond=0
-            ) + timedelta(days=1)
-        
-        # Convert back to UTC
-        self.next_run = next_run.astimezone(pytz.UTC)
-        self.save(update_fields=['next_run'])
-        
-        return self.next_run
+            self.next_run = next_run
+        
+        if save:
+            self.save(update_fields=['next_run', 'is_active'])
+        
+        return next_run
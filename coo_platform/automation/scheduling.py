@@ -0,0 +1,515 @@
+"""
+Scheduling engine for time-based automation rules.
+
+Every AutomationSchedule frequency is translated into a cron expression, and
+next fire times are computed field by field in the schedule's own timezone
+(bounded work per schedule, no scanning minute by minute). The
+ScheduleDispatcher keeps the upcoming fire times in a min-heap and sleeps
+until the earliest one instead of polling every schedule on every tick; due
+schedules are advanced first and then dispatched in batches.
+
+Schedules and rules are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so
+any number of dispatcher and worker nodes can run side by side: each row is
+claimed by exactly one of them, without a central lock. A claimed schedule
+run carries an execution token and a lease; the token is consumed when the
+run executes (so redelivered tasks are no-ops), and runs whose lease expires
+without executing are claimed again.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from bisect import bisect_left
+from datetime import datetime, time, timedelta
+from datetime import timezone as dt_timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import calendar
+import heapq
+import logging
+import os
+import socket
+import time as clock
+import uuid
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'BATCH_SIZE': 50,
+    'MAX_SLEEP_SECONDS': 60,
+    'REFRESH_SECONDS': 30,
+    'LEASE_SECONDS': 300,
+    'RULE_CHECK_SECONDS': 60,
+}
+
+MACROS = {
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@hourly': '0 * * * *',
+}
+
+MONTH_NAMES = {name.lower(): i for i, name in enumerate(calendar.month_abbr) if name}
+DAY_NAMES = {name: i for i, name in enumerate(['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'])}
+
+# Searching further than this means the expression can never match (e.g. "0 0 30 2 *")
+MAX_SEARCH_YEARS = 8
+
+
+def get_scheduler_settings():
+    """Return the scheduler settings merged over the defaults."""
+    configured = settings.COO_PLATFORM_SETTINGS.get('SCHEDULER', {})
+    return {**DEFAULT_SETTINGS, **configured}
+
+
+class InvalidCronExpression(ValueError):
+    """Raised when a cron expression cannot be parsed."""
+
+
+class CronExpression:
+    """
+    A standard five-field cron expression: minute, hour, day of month, month
+    and day of week. Supports ``*``, ranges, steps, lists, month and day
+    names and the ``@daily`` style macros. As in cron, when both day fields
+    are restricted a day matches if either of them does.
+    """
+    
+    FIELDS = [
+        ('minute', 0, 59, None),
+        ('hour', 0, 23, None),
+        ('day', 1, 31, None),
+        ('month', 1, 12, MONTH_NAMES),
+        ('weekday', 0, 7, DAY_NAMES),
+    ]
+    
+    def __init__(self, expression):
+        self.expression = expression.strip()
+        parts = MACROS.get(self.expression.lower(), self.expression).split()
+        if len(parts) != 5:
+            raise InvalidCronExpression(f'Expected 5 fields, got {len(parts)}: "{expression}"')
+        
+        values = {}
+        for part, (name, low, high, names) in zip(parts, self.FIELDS):
+            values[name] = self.parse_field(part, name, low, high, names)
+        
+        self.minutes = sorted(values['minute'])
+        self.hours = sorted(values['hour'])
+        self.days = values['day']
+        self.months = sorted(values['month'])
+        # Sunday is both 0 and 7
+        self.weekdays = {day % 7 for day in values['weekday']}
+        self.day_restricted = not parts[2].startswith('*')
+        self.weekday_restricted = not parts[4].startswith('*')
+    
+    def __repr__(self):
+        return f'<CronExpression "{self.expression}">'
+    
+    @staticmethod
+    def parse_field(part, name, low, high, names):
+        values = set()
+        for item in part.lower().split(','):
+            step = 1
+            if '/' in item:
+                item, step_text = item.split('/', 1)
+                if not step_text.isdigit() or int(step_text) < 1:
+                    raise InvalidCronExpression(f'Invalid step "{step_text}" in {name} field')
+                step = int(step_text)
+            
+            if item == '*':
+                start, end = low, high
+            elif '-' in item:
+                first, last = item.split('-', 1)
+                start = CronExpression.parse_value(first, name, low, high, names)
+                end = CronExpression.parse_value(last, name, low, high, names)
+            else:
+                start = CronExpression.parse_value(item, name, low, high, names)
+                end = high if step > 1 else start
+            
+            if start > end:
+                raise InvalidCronExpression(f'Invalid range "{item}" in {name} field')
+            values.update(range(start, end + 1, step))
+        return values
+    
+    @staticmethod
+    def parse_value(text, name, low, high, names):
+        if names and text in names:
+            return names[text]
+        if not text.isdigit() or not low <= int(text) <= high:
+            raise InvalidCronExpression(f'Invalid value "{text}" in {name} field')
+        return int(text)
+    
+    def matches_day(self, day):
+        in_month = day.day in self.days
+        in_week = (day.weekday() + 1) % 7 in self.weekdays
+        if self.day_restricted and self.weekday_restricted:
+            return in_month or in_week
+        if self.day_restricted:
+            return in_month
+        if self.weekday_restricted:
+            return in_week
+        return True
+    
+    def next_local(self, after):
+        """
+        Return the first matching naive wall-clock time strictly after the
+        naive datetime ``after``, or None if there is none.
+        """
+        candidate = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = after.year + MAX_SEARCH_YEARS
+        
+        while candidate.year <= limit:
+            if candidate.month not in self.months:
+                index = bisect_left(self.months, candidate.month)
+                if index < len(self.months):
+                    candidate = candidate.replace(month=self.months[index], day=1, hour=0, minute=0)
+                else:
+                    candidate = candidate.replace(year=candidate.year + 1, month=self.months[0], day=1, hour=0, minute=0)
+                continue
+            
+            if not self.matches_day(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            
+            if candidate.hour not in self.hours:
+                index = bisect_left(self.hours, candidate.hour)
+                if index < len(self.hours):
+                    candidate = candidate.replace(hour=self.hours[index], minute=0)
+                else:
+                    candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            
+            if candidate.minute not in self.minutes:
+                index = bisect_left(self.minutes, candidate.minute)
+                if index < len(self.minutes):
+                    candidate = candidate.replace(minute=self.minutes[index])
+                else:
+                    candidate = candidate.replace(minute=0) + timedelta(hours=1)
+                continue
+            
+            return candidate
+        
+        return None
+    
+    def next_fire(self, after, tz):
+        """
+        Return the first fire time strictly after the aware datetime
+        ``after``, as an aware UTC datetime, evaluating the expression in
+        ``tz``. Wall-clock times skipped by a DST change fire at the
+        equivalent instant after the change; repeated ones fire once.
+        """
+        local = after.astimezone(tz).replace(tzinfo=None)
+        
+        while True:
+            local = self.next_local(local)
+            if local is None:
+                return None
+            
+            fire = local.replace(tzinfo=tz).astimezone(dt_timezone.utc)
+            if fire > after:
+                return fire
+
+
+@lru_cache(maxsize=1024)
+def get_cron(expression):
+    """Parse ``expression`` once and cache the result."""
+    return CronExpression(expression)
+
+
+@lru_cache(maxsize=None)
+def get_zone(name):
+    try:
+        return ZoneInfo(name or 'UTC')
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning(f'Unknown schedule timezone "{name}", using UTC')
+        return ZoneInfo('UTC')
+
+
+def get_cron_expression(schedule):
+    """Translate the frequency of an AutomationSchedule into a cron expression."""
+    minute, hour = schedule.start_time.minute, schedule.start_time.hour
+    day, month = schedule.start_date.day, schedule.start_date.month
+    
+    if schedule.frequency == 'custom':
+        return schedule.cron_expression
+    if schedule.frequency == 'hourly':
+        return f'{minute} * * * *'
+    if schedule.frequency == 'weekly':
+        return f'{minute} {hour} * * {(schedule.start_date.weekday() + 1) % 7}'
+    if schedule.frequency == 'monthly':
+        return f'{minute} {hour} {day} * *'
+    if schedule.frequency == 'quarterly':
+        months = sorted((month - 1 + offset) % 12 + 1 for offset in (0, 3, 6, 9))
+        return f'{minute} {hour} {day} {",".join(map(str, months))} *'
+    if schedule.frequency == 'yearly':
+        return f'{minute} {hour} {day} {month} *'
+    return f'{minute} {hour} * * *'
+
+
+def get_next_run(schedule, after=None):
+    """
+    Return the next fire time of ``schedule`` strictly after ``after`` (now by
+    default), honouring its start and end dates, or None once it is exhausted.
+    """
+    after = after or timezone.now()
+    tz = get_zone(schedule.timezone)
+    
+    if schedule.frequency == 'once':
+        if schedule.last_run:
+            return None
+        fire = datetime.combine(schedule.start_date, schedule.start_time).replace(tzinfo=tz)
+        return fire.astimezone(dt_timezone.utc) if fire > after else None
+    
+    # Nothing fires before the start date
+    start = datetime.combine(schedule.start_date, time.min).replace(tzinfo=tz) - timedelta(microseconds=1)
+    fire = get_cron(get_cron_expression(schedule)).next_fire(max(after, start), tz)
+    
+    if fire is None or (schedule.end_date and fire.astimezone(tz).date() > schedule.end_date):
+        return None
+    return fire
+
+
+def build_schedule(rule):
+    """
+    Build (without saving) the schedule of a time-based rule from its
+    ``trigger_config``: ``schedule`` (a frequency), ``time_of_day`` (HH:MM),
+    ``cron`` and ``timezone``.
+    """
+    from .models import AutomationSchedule
+    
+    config = rule.trigger_config or {}
+    frequencies = dict(AutomationSchedule.FREQUENCY_CHOICES)
+    frequency = 'custom' if config.get('cron') else config.get('schedule', 'daily')
+    
+    try:
+        start_time = time.fromisoformat(config.get('time_of_day', '09:00'))
+    except (TypeError, ValueError):
+        start_time = time(9, 0)
+    
+    schedule = AutomationSchedule(
+        rule=rule,
+        frequency=frequency if frequency in frequencies else 'daily',
+        start_time=start_time,
+        timezone=config.get('timezone', 'UTC'),
+        cron_expression=config.get('cron', ''),
+        start_date=timezone.localdate(),
+        next_run=timezone.now(),
+    )
+    schedule.calculate_next_run(save=False)
+    return schedule
+
+
+def get_worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim_due_schedules(now, limit, schedule_ids=None):
+    """
+    Claim up to ``limit`` due schedule runs, skipping rows locked by other
+    nodes, and return the claimed schedules.
+    
+    Fresh runs are advanced to their next fire time; runs whose lease
+    expired without executing are claimed again as they are. Each claim gets
+    a new execution token, which invalidates any previous one.
+    """
+    from .models import AutomationSchedule
+    
+    lease_expires_at = now + timedelta(seconds=get_scheduler_settings()['LEASE_SECONDS'])
+    worker = get_worker_name()
+    due = (
+        Q(is_active=True, execution_token__isnull=True, next_run__lte=now) |
+        Q(execution_token__isnull=False, lease_expires_at__lt=now)
+    )
+    
+    with transaction.atomic():
+        queryset = AutomationSchedule.objects.select_for_update(
+            skip_locked=True, of=('self',)
+        ).filter(
+            due,
+            rule__is_enabled=True,
+            rule__status='active'
+        )
+        if schedule_ids is not None:
+            queryset = queryset.filter(id__in=schedule_ids)
+        
+        schedules = list(queryset.order_by('next_run')[:limit])
+        for schedule in schedules:
+            if schedule.execution_token is None:
+                # Missed runs are not replayed: the next run is computed from now
+                schedule.calculate_next_run(after=now, save=False)
+            else:
+                logger.warning(f'Lease of {schedule.claimed_by} on schedule {schedule.id} expired; claiming again')
+            
+            schedule.execution_token = uuid.uuid4()
+            schedule.claimed_by = worker
+            schedule.lease_expires_at = lease_expires_at
+        
+        # bulk_update skips the post_save signal that would recompute next_run again
+        AutomationSchedule.objects.bulk_update(
+            schedules,
+            ['next_run', 'is_active', 'execution_token', 'claimed_by', 'lease_expires_at']
+        )
+    
+    return schedules
+
+
+def consume_execution_token(schedule_id, token, fired_at):
+    """
+    Mark a claimed run as executed. Returns False if the token is no longer
+    current (the run already executed, or was claimed again after its lease
+    expired), in which case the run must be skipped.
+    
+    Call inside the transaction that executes the run, so a failed run keeps
+    its token and is retried once the lease expires.
+    """
+    from .models import AutomationSchedule
+    
+    return bool(AutomationSchedule.objects.filter(
+        id=schedule_id,
+        execution_token=token
+    ).update(
+        execution_token=None,
+        claimed_by='',
+        lease_expires_at=None,
+        last_run=fired_at
+    ))
+
+
+def claim_due_rules(now, limit):
+    """
+    Claim up to ``limit`` condition-based rules due for evaluation, skipping
+    rows locked by other nodes. ``next_check`` is pushed forward by the check
+    interval, so concurrent or overlapping runs never evaluate a rule twice.
+    """
+    from .models import AutomationRule
+    
+    next_check = now + timedelta(seconds=get_scheduler_settings()['RULE_CHECK_SECONDS'])
+    
+    with transaction.atomic():
+        rules = list(AutomationRule.objects.select_for_update(
+            skip_locked=True, of=('self',)
+        ).filter(
+            Q(next_check__isnull=True) | Q(next_check__lte=now),
+            is_enabled=True,
+            status='active'
+        ).exclude(
+            trigger_type='time_based'
+        ).select_related('tenant').order_by('priority', 'id')[:limit])
+        
+        AutomationRule.objects.filter(id__in=[rule.id for rule in rules]).update(next_check=next_check)
+    
+    return rules
+
+
+def dispatch_to_workers(claims, fired_at):
+    """Default dispatch: execute the batch of ``(schedule_id, token)`` claims in a Celery worker."""
+    from .tasks.celery_tasks import execute_scheduled_rules
+    execute_scheduled_rules.delay([[str(pk), str(token)] for pk, token in claims], fired_at.isoformat())
+
+
+def dispatch_claimed(schedules, now, dispatch):
+    dispatch([(schedule.id, schedule.execution_token) for schedule in schedules], now)
+
+
+def dispatch_due_schedules(now=None, dispatch=None, batch_size=None):
+    """
+    Claim every due schedule run (including runs with an expired lease) and
+    dispatch them in batches. Returns the number of runs dispatched.
+    """
+    now = now or timezone.now()
+    dispatch = dispatch or dispatch_to_workers
+    batch_size = batch_size or get_scheduler_settings()['BATCH_SIZE']
+    
+    dispatched = 0
+    while True:
+        claimed = claim_due_schedules(now, batch_size)
+        if not claimed:
+            break
+        
+        dispatch_claimed(claimed, now, dispatch)
+        dispatched += len(claimed)
+    return dispatched
+
+
+class ScheduleDispatcher:
+    """
+    Long-running dispatcher that keeps ``(next_run, schedule_id)`` entries in
+    a min-heap and sleeps until the earliest one is due.
+    
+    The heap is rebuilt from the database every ``refresh_seconds`` to pick
+    up new and edited schedules (and runs with an expired lease); entries
+    that went stale in between, or were claimed by another node, are skipped
+    when they are claimed.
+    """
+    
+    def __init__(self, dispatch=None, batch_size=None, max_sleep=None, refresh_seconds=None):
+        config = get_scheduler_settings()
+        self.dispatch = dispatch or dispatch_to_workers
+        self.batch_size = batch_size or config['BATCH_SIZE']
+        self.max_sleep = max_sleep or config['MAX_SLEEP_SECONDS']
+        self.refresh_seconds = refresh_seconds or config['REFRESH_SECONDS']
+        self.heap = []
+        self.refreshed_at = None
+    
+    def refresh(self, now=None):
+        """Dispatch anything overdue, then rebuild the heap from the active schedules."""
+        from .models import AutomationSchedule
+        
+        dispatch_due_schedules(now, self.dispatch, self.batch_size)
+        
+        self.heap = list(AutomationSchedule.objects.filter(
+            is_active=True,
+            rule__is_enabled=True,
+            rule__status='active'
+        ).values_list('next_run', 'id'))
+        heapq.heapify(self.heap)
+        self.refreshed_at = clock.monotonic()
+    
+    def needs_refresh(self):
+        return self.refreshed_at is None or clock.monotonic() - self.refreshed_at >= self.refresh_seconds
+    
+    def run_pending(self, now=None):
+        """Claim and dispatch every entry due at ``now``; returns how many ran."""
+        now = now or timezone.now()
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due.append(heapq.heappop(self.heap)[1])
+        
+        dispatched = 0
+        for i in range(0, len(due), self.batch_size):
+            batch = due[i:i + self.batch_size]
+            claimed = claim_due_schedules(now, len(batch), schedule_ids=batch)
+            if not claimed:
+                continue
+            
+            dispatch_claimed(claimed, now, self.dispatch)
+            dispatched += len(claimed)
+            for schedule in claimed:
+                if schedule.is_active:
+                    heapq.heappush(self.heap, (schedule.next_run, schedule.id))
+        
+        return dispatched
+    
+    def seconds_until_next(self, now=None):
+        """Seconds to sleep: until the earliest entry, the next refresh or ``max_sleep``."""
+        now = now or timezone.now()
+        wait = self.max_sleep
+        if self.heap:
+            wait = min(wait, (self.heap[0][0] - now).total_seconds())
+        if self.refreshed_at is not None:
+            wait = min(wait, self.refreshed_at + self.refresh_seconds - clock.monotonic())
+        return max(wait, 0)
+    
+    def run_forever(self, should_stop=lambda: False):
+        logger.info('Schedule dispatcher started')
+        while not should_stop():
+            if self.needs_refresh():
+                self.refresh()
+            
+            dispatched = self.run_pending()
+            if dispatched:
+                logger.info(f'Dispatched {dispatched} scheduled rules')
+            
+            clock.sleep(self.seconds_until_next())
@@ -24,17 +24,11 @@ def automation_rule_created(sender, instance, created, **kwargs):
         )
     
     # Auto-create schedule for time-based triggers
-    elif instance.trigger_type == 'time_based' and not hasattr(instance, 'schedule'):
-        from datetime import datetime, time
+    elif instance.trigger_type == 'time_based' and not AutomationSchedule.objects.filter(rule=instance).exists():
+        from .scheduling import build_schedule
         
-        # Create a default schedule
-        AutomationSchedule.objects.create(
-            rule=instance,
-            frequency='daily',
-            start_time=time(9, 0),  # 9 AM default
-            start_date=datetime.now().date(),
-            next_run=datetime.now().replace(hour=9, minute=0, second=0, microsecond=0)
-        )
+        # Created from trigger_config (schedule/time_of_day/cron), 9 AM daily by default
+        build_schedule(instance).save()
 
 
 @receiver(post_save, sender=AutomationAction)
@@ -71,10 +65,13 @@ def automation_rule_deleted(sender, instance, **kwargs):
 
 
 @receiver(post_save, sender=AutomationSchedule)
-def schedule_updated(sender, instance, **kwargs):
+def schedule_updated(sender, instance, created, update_fields=None, **kwargs):
     """
     Handle schedule updates.
     """
-    # Recalculate next run time when schedule is updated
-    if not kwargs.get('created', False):  # Only for updates, not creation
-        instance.calculate_next_run()
+    # Saves that only move the schedule along (calculate_next_run, the dispatcher) need no recalculation
+    if update_fields and set(update_fields) <= {'next_run', 'last_run', 'is_active'}:
+        return
+    
+    # Recalculate next run time when the schedule is created or edited
+    instance.calculate_next_run()
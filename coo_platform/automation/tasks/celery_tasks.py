@@ -4,6 +4,7 @@ Celery tasks for automation processing.
 from celery import shared_task
 from django.utils import timezone
 from django.db import transaction
+from django.db.models import Q
 from datetime import timedelta
 import logging
 
@@ -15,46 +16,52 @@ def process_automation_rules(self):
     """
     Process all active automation rules to check if they should be triggered.
     This task runs periodically to evaluate rule conditions.
+    
+    Rules are claimed in batches with SKIP LOCKED (see
+    automation.scheduling.claim_due_rules), so the task can run on several
+    workers at once without evaluating a rule twice.
     """
-    from automation.models import AutomationRule, AutomationLog
-    from tenants.models import Tenant
+    from automation.models import AutomationLog
+    from automation.scheduling import claim_due_rules, get_scheduler_settings
     
     processed_count = 0
     triggered_count = 0
     error_count = 0
+    now = timezone.now()
+    batch_size = get_scheduler_settings()['BATCH_SIZE']
     
     try:
-        # Get all active rules that could potentially be triggered
-        rules = AutomationRule.objects.filter(
-            is_enabled=True,
-            status='active'
-        ).select_related('tenant')
-        
-        for rule in rules:
-            try:
-                with transaction.atomic():
-                    # Check if rule should be triggered
-                    if rule.should_trigger():
-                        success = rule.execute()
-                        triggered_count += 1
+        while True:
+            # Claim the next batch of rules due for evaluation
+            rules = claim_due_rules(now, batch_size)
+            if not rules:
+                break
+            
+            for rule in rules:
+                try:
+                    with transaction.atomic():
+                        # Check if rule should be triggered
+                        if rule.should_trigger():
+                            success = rule.execute()
+                            triggered_count += 1
+                            
+                            if success:
+                                logger.info(f"Successfully executed automation rule: {rule.name}")
+                            else:
+                                logger.warning(f"Automation rule executed with errors: {rule.name}")
                         
-                        if success:
-                            logger.info(f"Successfully executed automation rule: {rule.name}")
-                        else:
-                            logger.warning(f"Automation rule executed with errors: {rule.name}")
-                    
-                    processed_count += 1
-                    
-            except Exception as e:
-                error_count += 1
-                logger.error(f"Error processing automation rule {rule.name}: {str(e)}")
+                        processed_count += 1
                 
-                # Log the error
-                AutomationLog.objects.create(
-                    rule=rule,
-                    status='error',
-                    message=f'Error during rule evaluation: {str(e)}'
-                )
+                except Exception as e:
+                    error_count += 1
+                    logger.error(f"Error processing automation rule {rule.name}: {str(e)}")
+                    
+                    # Log the error
+                    AutomationLog.objects.create(
+                        rule=rule,
+                        status='error',
+                        message=f'Error during rule evaluation: {str(e)}'
+                    )
         
         logger.info(
             f"Automation processing completed. "
@@ -75,40 +82,110 @@ def process_automation_rules(self):
 @shared_task(bind=True)
 def process_scheduled_rules(self):
     """
-    Process time-based automation rules that are scheduled to run.
+    Dispatch time-based automation rules that are due, in batches.
+    
+    Polling fallback for deployments that do not run the run_scheduler
+    dispatcher; due schedules are advanced before they are dispatched.
+    """
+    from automation.scheduling import dispatch_due_schedules
+    
+    dispatched = dispatch_due_schedules()
+    return {'dispatched': dispatched}
+
+
+@shared_task
+def execute_scheduled_rules(claims, fired_at):
+    """
+    Execute a batch of schedule runs claimed by the dispatcher.
+    
+    ``claims`` is a list of ``[schedule_id, execution_token]`` pairs. Each
+    token is consumed in the transaction that executes the rule, so a task
+    delivered twice (or a run claimed again after its lease expired)
+    executes only once.
     """
     from automation.models import AutomationSchedule
+    from automation.scheduling import consume_execution_token
+    from django.utils.dateparse import parse_datetime
     
-    now = timezone.now()
-    scheduled_rules = AutomationSchedule.objects.filter(
-        is_active=True,
-        next_run__lte=now,
-        rule__is_enabled=True,
-        rule__status='active'
-    ).select_related('rule')
+    fired_at = parse_datetime(fired_at)
+    tokens = dict(claims)
+    schedules = AutomationSchedule.objects.filter(
+        id__in=list(tokens)
+    ).select_related('rule', 'rule__tenant')
     
     executed_count = 0
+    skipped_count = 0
+    error_count = 0
     
-    for schedule in scheduled_rules:
+    for schedule in schedules:
         try:
             with transaction.atomic():
-                rule = schedule.rule
+                if not consume_execution_token(schedule.id, tokens[str(schedule.id)], fired_at):
+                    skipped_count += 1
+                    continue
                 
-                # Execute the rule
-                success = rule.execute()
+                schedule.rule.execute()
                 executed_count += 1
-                
-                # Update schedule
-                schedule.last_run = now
-                schedule.calculate_next_run()
-                schedule.save()
-                
-                logger.info(f"Executed scheduled rule: {rule.name}")
-                
+                logger.info(f"Executed scheduled rule: {schedule.rule.name}")
+        
         except Exception as e:
+            error_count += 1
             logger.error(f"Error executing scheduled rule {schedule.rule.name}: {str(e)}")
     
-    return {'executed': executed_count}
+    return {'executed': executed_count, 'skipped': skipped_count, 'errors': error_count}
+
+
+@shared_task
+def backfill_anomaly_states(tenant_id=None):
+    """
+    Rebuild the KPI anomaly detector states from the stored history, e.g.
+    after bulk imports (which bypass the per-data-point detector) or a
+    change of the detector settings.
+    """
+    from tenants.models import Tenant
+    from kpis.anomaly import backfill_tenant
+    
+    tenants = Tenant.objects.filter(status='active')
+    if tenant_id:
+        tenants = tenants.filter(id=tenant_id)
+    
+    states_rebuilt = 0
+    for tenant in tenants:
+        try:
+            states_rebuilt += backfill_tenant(tenant)
+        except Exception as e:
+            logger.error(f"Error rebuilding anomaly states for {tenant.name}: {str(e)}")
+    
+    return {'states_rebuilt': states_rebuilt}
+
+
+@shared_task
+def update_kpi_forecasts(tenant_id=None):
+    """
+    Refresh the KPI forecasts (only KPIs with new data are refitted) and
+    raise early warning alerts for KPIs projected to breach their critical
+    threshold. Runs daily at 03:00 (the ``update-kpi-forecasts`` entry of
+    CELERY_BEAT_SCHEDULE).
+    """
+    from tenants.models import Tenant
+    from kpis.forecasting import get_forecasts, raise_forecast_alerts
+    
+    tenants = Tenant.objects.filter(status='active')
+    if tenant_id:
+        tenants = tenants.filter(id=tenant_id)
+    
+    forecasts_updated = 0
+    alerts_created = 0
+    for tenant in tenants:
+        try:
+            kpis = list(tenant.smartkpi_set.filter(is_active=True))
+            forecasts = get_forecasts(kpis)
+            forecasts_updated += len(forecasts)
+            alerts_created += raise_forecast_alerts(kpis, forecasts)
+        except Exception as e:
+            logger.error(f"Error updating KPI forecasts for {tenant.name}: {str(e)}")
+    
+    return {'forecasts': forecasts_updated, 'alerts_created': alerts_created}
 
 
 @shared_task
@@ -158,6 +235,34 @@ def update_calculated_kpis():
     return {'updated': updated_count}
 
 
+@shared_task
+def backfill_calculated_kpis(kpi_ids=None):
+    """
+    Recompute the history of calculated KPIs (e.g. after their formula or
+    parents changed), parents before the KPIs calculated from them.
+    """
+    from kpis.models import SmartKPI
+    from kpis.calculation import backfill_kpi, dependency_order
+    
+    kpis = SmartKPI.objects.filter(
+        data_source_type='calculated',
+        is_active=True
+    ).prefetch_related('parent_kpis')
+    if kpi_ids:
+        kpis = kpis.filter(id__in=kpi_ids)
+    
+    created = updated = 0
+    for kpi in dependency_order(list(kpis)):
+        try:
+            diff = backfill_kpi(kpi)
+            created += diff['created']
+            updated += diff['updated']
+        except Exception as e:
+            logger.error(f"Error backfilling calculated KPI {kpi.name}: {str(e)}")
+    
+    return {'created': created, 'updated': updated}
+
+
 @shared_task
 def check_kpi_thresholds():
     """
@@ -172,10 +277,10 @@ def check_kpi_thresholds():
     kpis = SmartKPI.objects.filter(
         is_active=True
     ).filter(
-        models.Q(critical_threshold__isnull=False) |
-        models.Q(warning_threshold__isnull=False) |
-        models.Q(target_value__isnull=False)
-    ).prefetch_related('stakeholders')
+        Q(critical_threshold__isnull=False) |
+        Q(warning_threshold__isnull=False) |
+        Q(target_value__isnull=False)
+    ).with_latest_value().prefetch_related('stakeholders')
     
     for kpi in kpis:
         try:
@@ -260,189 +365,206 @@ def check_kpi_thresholds():
     return {'alerts_created': alerts_created}
 
 
+@shared_task
+def refresh_due_kpis():
+    """
+    Collect new values for KPIs due for an automatic update (claimed in
+    batches with SKIP LOCKED, so the task can run on several workers). Runs
+    every 5 minutes (the ``refresh-due-kpis`` entry of CELERY_BEAT_SCHEDULE).
+    """
+    from kpis.refresh import refresh_due_kpis as refresh
+    
+    return refresh()
+
+
+@shared_task
+def detect_stale_kpis():
+    """
+    Raise ``data_missing`` alerts for KPIs whose data is overdue according to
+    their update frequency, and resolve the alerts of KPIs updated since.
+    Runs hourly (the ``detect-stale-kpis`` entry of CELERY_BEAT_SCHEDULE).
+    """
+    from kpis.freshness import detect_stale_kpis as detect
+    
+    return detect()
+
+
+@shared_task
+def publish_widget_updates(widget_ids=None):
+    """
+    Recompute shared dashboard widgets and push the changes to WebSocket
+    subscribers as patches (widgets whose data did not change send nothing).
+    Runs every minute (the ``publish-widget-updates`` entry of
+    CELERY_BEAT_SCHEDULE).
+    """
+    from dashboard.models import DashboardWidget
+    from dashboard.deltas import publish_widget_update
+    from dashboard.realtime import USER_SPECIFIC_WIDGETS
+    
+    widgets = DashboardWidget.objects.filter(is_active=True).exclude(
+        widget_type__in=USER_SPECIFIC_WIDGETS
+    ).select_related('tenant')
+    if widget_ids:
+        widgets = widgets.filter(id__in=widget_ids)
+    
+    published = 0
+    for widget in widgets.iterator():
+        try:
+            if publish_widget_update(widget):
+                published += 1
+        except Exception as e:
+            logger.error(f"Error publishing widget {widget.title}: {str(e)}")
+    
+    return {'published': published}
+
+
 @shared_task
 def cleanup_old_logs():
     """
     Clean up old automation logs and audit logs to prevent database bloat.
-    """
-    from automation.models import AutomationLog
-    from core.models import AuditLog
     
-    # Delete automation logs older than 90 days
-    cutoff_date = timezone.now() - timedelta(days=90)
+    Rows are removed in throttled, resumable batches according to the
+    retention policies (see core.retention); whole expired partitions are
+    dropped on PostgreSQL.
+    """
+    from core.retention import RetentionEngine
     
-    automation_deleted = AutomationLog.objects.filter(
-        created_at__lt=cutoff_date
-    ).delete()[0]
+    results = {stats['model']: stats for stats in RetentionEngine().run()}
     
-    # Delete audit logs older than 6 months
-    audit_cutoff = timezone.now() - timedelta(days=180)
-    audit_deleted = AuditLog.objects.filter(
-        created_at__lt=audit_cutoff
-    ).delete()[0]
+    automation_stats = results.get('automation.AutomationLog', {})
+    audit_stats = results.get('core.AuditLog', {})
     
-    logger.info(f"Cleanup completed. Deleted {automation_deleted} automation logs, {audit_deleted} audit logs")
+    logger.info(
+        f"Cleanup completed. Deleted {automation_stats.get('deleted', 0)} automation logs, "
+        f"{audit_stats.get('deleted', 0)} audit logs"
+    )
     
     return {
-        'automation_logs_deleted': automation_deleted,
-        'audit_logs_deleted': audit_deleted
+        'automation_logs_deleted': automation_stats.get('deleted', 0),
+        'audit_logs_deleted': audit_stats.get('deleted', 0),
+        'policies': list(results.values())
     }
 
 
 @shared_task
-def send_daily_digest():
+def maintain_partitions():
     """
-    Send daily digest emails to users with their relevant updates.
+    Create the upcoming monthly partitions of the partitioned tables so new
+    rows never land in the default partitions. Runs daily at 02:00 (the
+    ``maintain-partitions`` entry of CELERY_BEAT_SCHEDULE).
     """
-    from django.contrib.auth.models import User
-    from django.core.mail import send_mail
-    from django.template.loader import render_to_string
-    from django.conf import settings
-    from tenants.models import TenantUser
+    from core.partitioning import ensure_all_partitions
     
-    sent_count = 0
+    created = ensure_all_partitions()
+    created_count = sum(len(names) for names in created.values())
     
-    # Get all active users who want email notifications
-    users = User.objects.filter(
-        profile__email_notifications=True,
-        is_active=True
-    ).select_related('profile')
+    if created_count:
+        logger.info(f"Created {created_count} table partitions")
+    
+    return {'partitions_created': created_count}
+
+
+@shared_task
+def rebalance_task_ranks():
+    """
+    Rewrite the Kanban ranks of the task columns whose ranks grew too long
+    (or that have unranked tasks) with short, evenly spaced ones. Run hourly.
+    """
+    from projects.ranking import columns_to_rebalance, rebalance_column
     
-    for user in users:
+    columns = columns_to_rebalance()
+    updated_count = 0
+    for project_id, status in columns:
         try:
-            # Get user's tenant(s)
-            tenant_users = TenantUser.objects.filter(user=user, is_active=True)
-            
-            for tenant_user in tenant_users:
-                tenant = tenant_user.tenant
-                
-                # Gather digest data
-                digest_data = {
-                    'user': user,
-                    'tenant': tenant,
-                    'date': timezone.now().date(),
-                }
-                
-                # Get user's tasks
-                from projects.models import Task
-                user_tasks = Task.objects.filter(
-                    project__tenant=tenant,
-                    assigned_to=user,
-                    status__in=['todo', 'in_progress']
-                )
-                
-                digest_data['tasks'] = {
-                    'total': user_tasks.count(),
-                    'overdue': sum(1 for t in user_tasks if t.is_overdue),
-                    'due_today': user_tasks.filter(due_date__date=timezone.now().date()).count(),
-                }
-                
-                # Get unread notifications
-                unread_notifications = user.notifications.filter(
-                    is_read=False,
-                    created_at__date=timezone.now().date()
-                )
-                
-                digest_data['notifications'] = {
-                    'count': unread_notifications.count(),
-                    'recent': unread_notifications[:5]
-                }
-                
-                # Get KPI alerts
-                from kpis.models import KPIAlert
-                kpi_alerts = KPIAlert.objects.filter(
-                    kpi__tenant=tenant,
-                    kpi__stakeholders=user,
-                    is_resolved=False,
-                    created_at__date=timezone.now().date()
-                )
-                
-                digest_data['kpi_alerts'] = {
-                    'count': kpi_alerts.count(),
-                    'critical': kpi_alerts.filter(severity='critical').count()
-                }
-                
-                # Only send if there's something to report
-                if (digest_data['tasks']['total'] > 0 or 
-                    digest_data['notifications']['count'] > 0 or 
-                    digest_data['kpi_alerts']['count'] > 0):
-                    
-                    # Render email template
-                    subject = f"Daily Digest - {tenant.name}"
-                    html_message = render_to_string('emails/daily_digest.html', digest_data)
-                    plain_message = render_to_string('emails/daily_digest.txt', digest_data)
-                    
-                    send_mail(
-                        subject=subject,
-                        message=plain_message,
-                        html_message=html_message,
-                        from_email=settings.DEFAULT_FROM_EMAIL,
-                        recipient_list=[user.email],
-                        fail_silently=True
-                    )
-                    
-                    sent_count += 1
-                    logger.info(f"Sent daily digest to {user.email} for {tenant.name}")
-                
+            updated_count += rebalance_column(project_id, status)
         except Exception as e:
-            logger.error(f"Error sending daily digest to {user.email}: {str(e)}")
+            logger.error(f"Error rebalancing task ranks of project {project_id} ({status}): {str(e)}")
+    
+    if columns:
+        logger.info(f"Rebalanced {len(columns)} task columns ({updated_count} tasks)")
+    
+    return {'columns_rebalanced': len(columns), 'tasks_updated': updated_count}
+
+
+@shared_task
+def send_daily_digest():
+    """
+    Send daily digest emails to users with their relevant updates.
+    
+    Counters for all users are computed with a few grouped queries and the
+    emails are sent in batches over one mail connection (see core.digest).
+    """
+    from core.digest import build_digests, send_digests
+    
+    digests = build_digests()
+    sent_count = send_digests(digests)
+    
+    logger.info(f"Sent {sent_count} of {len(digests)} daily digests")
     
     return {'digests_sent': sent_count}
 
 
 @shared_task
-def generate_monthly_reports():
+def generate_monthly_reports(month=None, regenerate=False):
+    """
+    Generate monthly reports for all active tenants in parallel.
+    
+    One task per tenant is dispatched as a chord; tenants that already have
+    a snapshot for the month are skipped unless ``regenerate`` is set.
+    """
+    from celery import chord
+    from tenants.models import Tenant, TenantReport
+    from tenants.reports import get_report_month
+    
+    month = get_report_month(month)
+    tenants = Tenant.objects.filter(status='active')
+    if not regenerate:
+        tenants = tenants.exclude(
+            id__in=TenantReport.objects.filter(month=month).values('tenant_id')
+        )
+    
+    tenant_ids = [str(tenant_id) for tenant_id in tenants.values_list('id', flat=True)]
+    if not tenant_ids:
+        return {'reports_generated': 0, 'month': month.isoformat()}
+    
+    chord(
+        generate_tenant_report.s(tenant_id, month.isoformat()) for tenant_id in tenant_ids
+    )(summarize_monthly_reports.s(month.isoformat()))
+    
+    logger.info(f"Dispatched {len(tenant_ids)} monthly reports for {month:%B %Y}")
+    return {'reports_dispatched': len(tenant_ids), 'month': month.isoformat()}
+
+
+@shared_task(bind=True, max_retries=2, default_retry_delay=60)
+def generate_tenant_report(self, tenant_id, month=None):
     """
-    Generate monthly reports for all tenants.
+    Generate and store the monthly report of one tenant.
     """
     from tenants.models import Tenant
-    from projects.models import Project
-    from kpis.models import SmartKPI
-    from django.db.models import Count, Avg
+    from tenants.reports import generate_report
     
-    reports_generated = 0
-    current_month = timezone.now().replace(day=1).date()
+    try:
+        tenant = Tenant.objects.get(id=tenant_id)
+        report = generate_report(tenant, month)
+        return {'tenant_id': tenant_id, 'report_id': str(report.id), 'success': True}
     
-    for tenant in Tenant.objects.filter(status='active'):
-        try:
-            # Generate project report
-            projects = Project.objects.filter(tenant=tenant)
-            project_stats = {
-                'total': projects.count(),
-                'completed_this_month': projects.filter(
-                    status='completed',
-                    actual_end_date__gte=current_month
-                ).count(),
-                'average_progress': projects.aggregate(
-                    avg_progress=Avg('progress_percentage')
-                )['avg_progress'] or 0,
-            }
-            
-            # Generate KPI report
-            kpis = SmartKPI.objects.filter(tenant=tenant, is_active=True)
-            kpi_stats = {
-                'total': kpis.count(),
-                'on_target': sum(1 for kpi in kpis if kpi.calculate_performance_status() in ['excellent', 'good']),
-                'alerts_this_month': tenant.kpialert_set.filter(
-                    created_at__gte=current_month,
-                    is_resolved=False
-                ).count(),
-            }
-            
-            # Store report data (you might want to create a Report model)
-            report_data = {
-                'tenant': tenant.name,
-                'month': current_month,
-                'projects': project_stats,
-                'kpis': kpi_stats,
-                'generated_at': timezone.now()
-            }
-            
-            # Here you would save the report or send it via email
-            logger.info(f"Generated monthly report for {tenant.name}")
-            reports_generated += 1
-            
-        except Exception as e:
-            logger.error(f"Error generating monthly report for {tenant.name}: {str(e)}")
+    except Tenant.DoesNotExist:
+        return {'tenant_id': tenant_id, 'success': False, 'error': 'Tenant not found'}
+    
+    except Exception as e:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e)
+        logger.error(f"Error generating monthly report for tenant {tenant_id}: {str(e)}")
+        return {'tenant_id': tenant_id, 'success': False, 'error': str(e)}
+
+
+@shared_task
+def summarize_monthly_reports(results, month):
+    """
+    Chord callback: log the outcome of a monthly report run.
+    """
+    generated = sum(1 for result in results if result.get('success'))
+    failed = len(results) - generated
     
-    return {'reports_generated': reports_generated}
+    logger.info(f"Monthly reports for {month}: {generated} generated, {failed} failed")
+    return {'reports_generated': generated, 'failed': failed, 'month': month}
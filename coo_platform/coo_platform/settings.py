@@ -4,7 +4,8 @@ Django settings for COO Platform project.
 
 import os
 from pathlib import Path
-from decouple import config
+from celery.schedules import crontab
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -49,6 +50,7 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'core.middleware.QueryInstrumentationMiddleware',  # Must be first to see every query
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -105,6 +107,22 @@ if config('USE_SQLITE', default=False, cast=bool):
         }
     }
 
+# Cache
+# Instrumented backends record cache hits/misses per request (see core.instrumentation)
+CACHES = {
+    'default': {
+        'BACKEND': 'core.instrumentation.InstrumentedLocMemCache',
+    }
+}
+
+if config('USE_REDIS_CACHE', default=False, cast=bool):
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.instrumentation.InstrumentedRedisCache',
+            'LOCATION': config('REDIS_URL', default='redis://localhost:6379/2'),
+        }
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -150,6 +168,15 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.fastjson.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.fastjson.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
@@ -181,6 +208,35 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Periodic tasks, run by `celery -A coo_platform beat`
+CELERY_IMPORTS = ['automation.tasks.celery_tasks']
+CELERY_BEAT_SCHEDULE = {
+    'maintain-partitions': {
+        'task': 'automation.tasks.celery_tasks.maintain_partitions',
+        'schedule': crontab(hour=2, minute=0),
+    },
+    'rebalance-task-ranks': {
+        'task': 'automation.tasks.celery_tasks.rebalance_task_ranks',
+        'schedule': crontab(minute=15),
+    },
+    'refresh-due-kpis': {
+        'task': 'automation.tasks.celery_tasks.refresh_due_kpis',
+        'schedule': crontab(minute='*/5'),
+    },
+    'detect-stale-kpis': {
+        'task': 'automation.tasks.celery_tasks.detect_stale_kpis',
+        'schedule': crontab(minute=30),
+    },
+    'publish-widget-updates': {
+        'task': 'automation.tasks.celery_tasks.publish_widget_updates',
+        'schedule': crontab(),
+    },
+    'update-kpi-forecasts': {
+        'task': 'automation.tasks.celery_tasks.update_kpi_forecasts',
+        'schedule': crontab(hour=3, minute=0),
+    },
+}
+
 # Channels Configuration
 CHANNEL_LAYERS = {
     'default': {
@@ -259,5 +315,95 @@ COO_PLATFORM_SETTINGS = {
         'basic': ['projects', 'tasks', 'basic_kpis'],
         'professional': ['projects', 'tasks', 'advanced_kpis', 'automation', 'integrations'],
         'enterprise': ['all_features', 'custom_branding', 'api_access', 'priority_support'],
-    }
+    },
+    'INSTRUMENTATION': {
+        'ENABLED': config('INSTRUMENTATION_ENABLED', default=True, cast=bool),
+        'SLOW_REQUEST_MS': config('SLOW_REQUEST_MS', default=500, cast=int),
+        'SLOW_REQUEST_QUERIES': config('SLOW_REQUEST_QUERIES', default=50, cast=int),
+        'TOP_FINGERPRINTS': 5,
+        # Raise QueryBudgetExceeded instead of logging (enable in tests)
+        'STRICT_QUERY_BUDGETS': config('STRICT_QUERY_BUDGETS', default=False, cast=bool),
+        # Per-endpoint query budgets, calibrated with `manage.py run_benchmarks`
+        'QUERY_BUDGETS': {
+            'api:dashboard_summary': 20,
+            'api:platform_analytics': 15,
+            'kpis:chart_data': 15,
+        },
+        'METRICS_TOKEN': config('METRICS_TOKEN', default=''),
+    },
+    # Retention of log tables (see core.retention); tenants can override the
+    # number of days in Tenant.settings['retention_days']
+    'RETENTION': {
+        'BATCH_SIZE': config('RETENTION_BATCH_SIZE', default=2000, cast=int),
+        'SLEEP_SECONDS': config('RETENTION_SLEEP_SECONDS', default=0.05, cast=float),
+        'MAX_SECONDS': 600,
+        'ARCHIVE_DIR': config('RETENTION_ARCHIVE_DIR', default=''),
+        'POLICIES': {
+            'automation.AutomationLog': {'days': 90, 'tenant_field': 'rule__tenant'},
+            'core.AuditLog': {'days': 180},
+        },
+    },
+    # Daily digest emails (see core.digest)
+    'DIGEST': {
+        'RENDER_WORKERS': config('DIGEST_RENDER_WORKERS', default=4, cast=int),
+        'SEND_BATCH_SIZE': config('DIGEST_SEND_BATCH_SIZE', default=100, cast=int),
+        'RECENT_NOTIFICATIONS': 5,
+    },
+    'SCHEDULER': {
+        'BATCH_SIZE': config('SCHEDULER_BATCH_SIZE', default=50, cast=int),
+        'MAX_SLEEP_SECONDS': 60,
+        'REFRESH_SECONDS': config('SCHEDULER_REFRESH_SECONDS', default=30, cast=int),
+        'LEASE_SECONDS': config('SCHEDULER_LEASE_SECONDS', default=300, cast=int),
+        'RULE_CHECK_SECONDS': config('SCHEDULER_RULE_CHECK_SECONDS', default=60, cast=int),
+    },
+    'ANOMALY': {
+        'ALPHA': config('ANOMALY_ALPHA', default=0.1, cast=float),
+        'Z_THRESHOLD': config('ANOMALY_Z_THRESHOLD', default=3.0, cast=float),
+        'MIN_SAMPLES': 10,
+    },
+    'FORECAST': {
+        'HISTORY_DAYS': 365,
+        'HORIZON_DAYS': 90,
+        'ALERT_DAYS': config('FORECAST_ALERT_DAYS', default=30, cast=int),
+        'WORKERS': config('FORECAST_WORKERS', default=4, cast=int),
+    },
+    'FRESHNESS': {
+        'GRACE_DAYS': {
+            'daily': 1,
+            'weekly': 2,
+            'monthly': 5,
+            'quarterly': 10,
+            'yearly': 30,
+        },
+        'CRITICAL_INTERVALS': 3,
+    },
+    'REFRESH': {
+        'BATCH_SIZE': config('KPI_REFRESH_BATCH_SIZE', default=200, cast=int),
+        'JITTER_FRACTION': 0.05,
+        'MAX_JITTER_SECONDS': 3600,
+    },
+    'COLLECTORS': {
+        'API_MAX_CONNECTIONS': config('COLLECTOR_API_MAX_CONNECTIONS', default=20, cast=int),
+        'API_MAX_PER_HOST': config('COLLECTOR_API_MAX_PER_HOST', default=4, cast=int),
+        'API_TIMEOUT': 10,
+        'API_IDLE_SECONDS': 30,
+        'API_ALLOWED_HOSTS': config('COLLECTOR_API_ALLOWED_HOSTS', default='', cast=Csv()),
+        'DATABASES': config('COLLECTOR_DATABASES', default='', cast=Csv()),
+        'DB_STATEMENT_TIMEOUT_MS': 5000,
+        'DB_CACHE_SECONDS': 300,
+    },
+    'REALTIME': {
+        'DB_WORKERS': config('WEBSOCKET_DB_WORKERS', default=8, cast=int),
+        'ACL_CACHE_SECONDS': 300,
+    },
+    'JSON': {
+        'DECIMAL_AS_STRING': config('JSON_DECIMAL_AS_STRING', default=False, cast=bool),
+    },
+    'TASK_GRAPH': {
+        'DEFAULT_TASK_HOURS': 8,
+        'CACHE_SECONDS': 300,
+    },
+    'RANKING': {
+        'MAX_RANK_LENGTH': 12,
+    },
 }
@@ -11,3 +11,4 @@ class CoreConfig(AppConfig):
     
     def ready(self):
         import core.signals  # Import signals when app is ready
+        import core.instrumentation  # Install the query recorder on new connections
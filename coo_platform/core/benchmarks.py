@@ -0,0 +1,263 @@
+"""
+Benchmark suite for the hot paths of the platform.
+
+Each case is run a number of times against an existing (usually generated)
+tenant and reports latency percentiles, throughput and query counts. Results
+are plain dicts so they can be stored as JSON and compared across commits.
+"""
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from asgiref.sync import async_to_sync
+from datetime import timedelta
+from statistics import mean
+import asyncio
+import random
+import time
+
+from .instrumentation import collect
+
+
+def percentile(samples, pct):
+    """Return the ``pct`` percentile of ``samples`` (nearest-rank, interpolated)."""
+    if not samples:
+        return None
+    
+    ordered = sorted(samples)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(durations, queries, operations=1):
+    """Build the result dict for one case from per-iteration durations (seconds)."""
+    total = sum(durations)
+    return {
+        'iterations': len(durations),
+        'p50_ms': round(percentile(durations, 50) * 1000, 3),
+        'p95_ms': round(percentile(durations, 95) * 1000, 3),
+        'mean_ms': round(mean(durations) * 1000, 3),
+        'min_ms': round(min(durations) * 1000, 3),
+        'max_ms': round(max(durations) * 1000, 3),
+        'throughput_per_s': round(len(durations) * operations / total, 2) if total else None,
+        'queries_per_iteration': round(mean(queries), 1) if queries else 0,
+    }
+
+
+class BenchmarkSuite:
+    """
+    Runs the benchmark cases against a tenant.
+    
+    Mutating cases (automation processing, threshold checks) run inside a
+    transaction that is rolled back, so every iteration sees the same data.
+    """
+    
+    CASES = [
+        'dashboard_summary',
+        'platform_analytics',
+        'kpi_chart_data',
+        'process_automation_rules',
+        'check_kpi_thresholds',
+        'websocket_fanout',
+        'json_trend_payload',
+        'json_list_payload',
+    ]
+    
+    def __init__(self, tenant, iterations=20, warmup=2, ws_clients=50, seed=42):
+        self.tenant = tenant
+        self.iterations = iterations
+        self.warmup = warmup
+        self.ws_clients = ws_clients
+        self.random = random.Random(seed)
+        
+        self.user = self.get_benchmark_user()
+        self.client = Client()
+        self.client.force_login(self.user)
+        
+        from kpis.models import SmartKPI
+        self.kpi_ids = list(
+            SmartKPI.objects.filter(tenant=tenant, is_active=True).values_list('id', flat=True)[:500]
+        )
+    
+    def get_benchmark_user(self):
+        """Pick the tenant's administrator (or any active member)."""
+        membership = self.tenant.tenant_users.filter(
+            is_active=True
+        ).select_related('user').order_by('-can_manage_kpis', 'created_at').first()
+        
+        if membership is None:
+            raise ValueError(f'Tenant "{self.tenant.slug}" has no active users to benchmark with')
+        return membership.user
+    
+    def run(self, cases=None):
+        """Run the selected cases (all by default) and return their results."""
+        results = {}
+        for name in cases or self.CASES:
+            results[name] = getattr(self, f'bench_{name}')()
+        return results
+    
+    def measure(self, label, func, rollback=False, operations=1):
+        """Time ``func`` over warmup + measured iterations."""
+        durations = []
+        queries = []
+        
+        for i in range(self.warmup + self.iterations):
+            with collect(f'bench:{label}') as collector:
+                started = time.perf_counter()
+                if rollback:
+                    with transaction.atomic():
+                        func()
+                        transaction.set_rollback(True)
+                else:
+                    func()
+                elapsed = time.perf_counter() - started
+            
+            if i >= self.warmup:
+                durations.append(elapsed)
+                queries.append(collector.queries)
+        
+        return summarize(durations, queries, operations)
+    
+    def get(self, url):
+        response = self.client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {url} returned {response.status_code}')
+        return response
+    
+    def bench_dashboard_summary(self):
+        url = reverse('api:dashboard_summary')
+        return self.measure('dashboard_summary', lambda: self.get(url))
+    
+    def bench_platform_analytics(self):
+        url = reverse('api:platform_analytics')
+        return self.measure('platform_analytics', lambda: self.get(url))
+    
+    def bench_kpi_chart_data(self):
+        if not self.kpi_ids:
+            return {'skipped': 'tenant has no active KPIs'}
+        
+        def request_chart():
+            kpi_id = self.random.choice(self.kpi_ids)
+            self.get(reverse('kpis:chart_data', args=[kpi_id]) + '?days=90')
+        
+        return self.measure('kpi_chart_data', request_chart)
+    
+    def bench_process_automation_rules(self):
+        from automation.tasks.celery_tasks import process_automation_rules
+        return self.measure(
+            'process_automation_rules',
+            lambda: process_automation_rules.apply(throw=True),
+            rollback=True
+        )
+    
+    def bench_check_kpi_thresholds(self):
+        from automation.tasks.celery_tasks import check_kpi_thresholds
+        return self.measure(
+            'check_kpi_thresholds',
+            lambda: check_kpi_thresholds.apply(throw=True),
+            rollback=True
+        )
+    
+    def bench_websocket_fanout(self):
+        """
+        Connect ``ws_clients`` dashboard consumers to one group and time a
+        group_send until every client has received the frame.
+        """
+        return async_to_sync(self._websocket_fanout)()
+    
+    async def _websocket_fanout(self):
+        from channels.layers import get_channel_layer
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from dashboard.routing import websocket_urlpatterns
+        
+        application = URLRouter(websocket_urlpatterns)
+        dashboard_id = f'bench{self.tenant.pk.hex[:8]}'
+        communicators = []
+        
+        try:
+            for _ in range(self.ws_clients):
+                communicator = WebsocketCommunicator(application, f'/ws/dashboard/{dashboard_id}/')
+                communicator.scope['user'] = self.user
+                connected, _ = await communicator.connect()
+                if not connected:
+                    raise RuntimeError('WebSocket connection was refused')
+                await communicator.receive_from()  # connection_established
+                communicators.append(communicator)
+            
+            channel_layer = get_channel_layer()
+            durations = []
+            for i in range(self.warmup + self.iterations):
+                started = time.perf_counter()
+                await channel_layer.group_send(f'dashboard_{dashboard_id}', {
+                    'type': 'widget_update',
+                    'widget_id': 'benchmark',
+                    'data': {'value': i, 'series': list(range(30))},
+                    'timestamp': timezone.now().isoformat(),
+                })
+                await asyncio.gather(*(c.receive_from(timeout=10) for c in communicators))
+                if i >= self.warmup:
+                    durations.append(time.perf_counter() - started)
+        finally:
+            for communicator in communicators:
+                await communicator.disconnect()
+        
+        result = summarize(durations, [], operations=self.ws_clients)
+        result['clients'] = self.ws_clients
+        return result
+    
+    def compare_encoders(self, label, baseline, fast):
+        """
+        Time ``fast`` and report it with the p50 of ``baseline`` (the
+        stdlib encoder) and the resulting speedup.
+        """
+        before = self.measure(f'{label}:stdlib', baseline)
+        result = self.measure(label, fast)
+        result['stdlib_p50_ms'] = before['p50_ms']
+        result['speedup'] = round(before['p50_ms'] / result['p50_ms'], 2) if result['p50_ms'] else None
+        result['bytes'] = len(fast())
+        return result
+    
+    def bench_json_trend_payload(self):
+        """Encode a year of raw data points (Decimals, UUIDs, dates) of up to 100 KPIs."""
+        from django.core.serializers.json import DjangoJSONEncoder
+        from kpis.models import KPIDataPoint
+        from .fastjson import dumps
+        import json
+        
+        if not self.kpi_ids:
+            return {'skipped': 'tenant has no active KPIs'}
+        
+        since = timezone.now().date() - timedelta(days=365)
+        payload = {'datapoints': list(KPIDataPoint.objects.filter(
+            kpi_id__in=self.kpi_ids[:100], date__gte=since
+        ).values('kpi_id', 'date', 'value', 'source'))}
+        
+        return self.compare_encoders(
+            'json_trend_payload',
+            lambda: json.dumps(payload, cls=DjangoJSONEncoder).encode(),
+            lambda: dumps(payload)
+        )
+    
+    def bench_json_list_payload(self):
+        """Render the serialized active KPIs of the tenant with DRF's renderer and the orjson one."""
+        from rest_framework.renderers import JSONRenderer
+        from api.serializers import SmartKPISerializer
+        from kpis.models import SmartKPI
+        from .fastjson import ORJSONRenderer
+        
+        if not self.kpi_ids:
+            return {'skipped': 'tenant has no active KPIs'}
+        
+        kpis = SmartKPI.objects.filter(id__in=self.kpi_ids).select_related(
+            'category', 'owner'
+        ).prefetch_related('stakeholders')
+        data = SmartKPISerializer(kpis, many=True).data
+        
+        return self.compare_encoders(
+            'json_list_payload',
+            lambda: JSONRenderer().render(data),
+            lambda: ORJSONRenderer().render(data)
+        )
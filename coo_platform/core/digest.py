@@ -0,0 +1,258 @@
+"""
+Daily digest pipeline.
+
+The counters of every recipient are computed with a handful of grouped
+aggregate queries (one per kind of data, for all tenants at once), the
+emails are rendered in a worker pool and sent in batches over a single
+reused mail connection.
+"""
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+from django.template.loader import render_to_string
+from django.utils import timezone
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'RENDER_WORKERS': 4,
+    'SEND_BATCH_SIZE': 100,
+    'RECENT_NOTIFICATIONS': 5,
+}
+
+OPEN_TASK_STATUSES = ['todo', 'in_progress']
+
+
+def get_digest_settings():
+    """Return the digest settings merged over the defaults."""
+    configured = settings.COO_PLATFORM_SETTINGS.get('DIGEST', {})
+    return {**DEFAULT_SETTINGS, **configured}
+
+
+def _day_bounds(day):
+    """Aware datetimes delimiting ``day`` in the current timezone (index friendly)."""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def get_recipients():
+    """Active tenant memberships of users who want email notifications."""
+    from tenants.models import TenantUser
+    
+    return TenantUser.objects.filter(
+        is_active=True,
+        user__is_active=True,
+        user__profile__email_notifications=True
+    ).exclude(
+        user__email=''
+    ).values(
+        'user_id', 'tenant_id', 'tenant__name',
+        'user__email', 'user__username', 'user__first_name', 'user__last_name'
+    ).order_by('tenant_id', 'user_id')
+
+
+def get_task_counters(day):
+    """Open task counters keyed by ``(tenant_id, user_id)``."""
+    from projects.models import Task
+    
+    now = timezone.now()
+    start, end = _day_bounds(day)
+    rows = Task.objects.filter(
+        status__in=OPEN_TASK_STATUSES,
+        assigned_to__isnull=False
+    ).values(
+        'project__tenant_id', 'assigned_to_id'
+    ).annotate(
+        total=Count('id'),
+        overdue=Count('id', filter=Q(due_date__lt=now)),
+        due_today=Count('id', filter=Q(due_date__gte=start, due_date__lt=end)),
+    ).order_by()
+    
+    return {
+        (row['project__tenant_id'], row['assigned_to_id']): {
+            'total': row['total'],
+            'overdue': row['overdue'],
+            'due_today': row['due_today'],
+        }
+        for row in rows
+    }
+
+
+def get_notification_counters(day, recent=DEFAULT_SETTINGS['RECENT_NOTIFICATIONS']):
+    """
+    Today's unread notifications keyed by user id: the count and the most
+    recent few (fetched with one windowed query for all users).
+    """
+    from .models import Notification
+    
+    start, end = _day_bounds(day)
+    unread_today = Notification.objects.filter(
+        is_read=False,
+        created_at__gte=start,
+        created_at__lt=end
+    )
+    
+    counters = {
+        row['recipient_id']: {'count': row['count'], 'recent': []}
+        for row in unread_today.values('recipient_id').annotate(count=Count('id')).order_by()
+    }
+    
+    latest = unread_today.annotate(
+        rank=Window(
+            RowNumber(),
+            partition_by=[F('recipient_id')],
+            order_by=F('created_at').desc()
+        )
+    ).filter(
+        rank__lte=recent
+    ).values(
+        'recipient_id', 'title', 'message', 'action_url', 'created_at'
+    ).order_by('recipient_id', 'rank')
+    
+    for row in latest:
+        counters[row.pop('recipient_id')]['recent'].append(row)
+    return counters
+
+
+def get_alert_counters(day):
+    """Today's unresolved KPI alerts keyed by ``(tenant_id, stakeholder_id)``."""
+    from kpis.models import KPIAlert
+    
+    start, end = _day_bounds(day)
+    rows = KPIAlert.objects.filter(
+        is_resolved=False,
+        created_at__gte=start,
+        created_at__lt=end,
+        kpi__stakeholders__isnull=False
+    ).values(
+        'kpi__tenant_id', 'kpi__stakeholders'
+    ).annotate(
+        count=Count('id'),
+        critical=Count('id', filter=Q(severity='critical')),
+    ).order_by()
+    
+    return {
+        (row['kpi__tenant_id'], row['kpi__stakeholders']): {
+            'count': row['count'],
+            'critical': row['critical'],
+        }
+        for row in rows
+    }
+
+
+def build_digests(day=None):
+    """
+    Return the digest context of every recipient with something to report.
+    Runs a fixed number of queries regardless of the number of users.
+    """
+    day = day or timezone.now().date()
+    config = get_digest_settings()
+    
+    tasks = get_task_counters(day)
+    notifications = get_notification_counters(day, config['RECENT_NOTIFICATIONS'])
+    alerts = get_alert_counters(day)
+    
+    empty_tasks = {'total': 0, 'overdue': 0, 'due_today': 0}
+    empty_notifications = {'count': 0, 'recent': []}
+    empty_alerts = {'count': 0, 'critical': 0}
+    
+    digests = []
+    for recipient in get_recipients().iterator():
+        key = (recipient['tenant_id'], recipient['user_id'])
+        digest = {
+            'user': {
+                'email': recipient['user__email'],
+                'username': recipient['user__username'],
+                'first_name': recipient['user__first_name'],
+                'full_name': f"{recipient['user__first_name']} {recipient['user__last_name']}".strip(),
+            },
+            'tenant': {'id': recipient['tenant_id'], 'name': recipient['tenant__name']},
+            'date': day,
+            'tasks': tasks.get(key, empty_tasks),
+            'notifications': notifications.get(recipient['user_id'], empty_notifications),
+            'kpi_alerts': alerts.get(key, empty_alerts),
+        }
+        
+        if digest['tasks']['total'] or digest['notifications']['count'] or digest['kpi_alerts']['count']:
+            digests.append(digest)
+    
+    return digests
+
+
+def render_digest(digest):
+    """Render one digest into an email message."""
+    message = EmailMultiAlternatives(
+        subject=f"Daily Digest - {digest['tenant']['name']}",
+        body=render_to_string('emails/daily_digest.txt', digest),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[digest['user']['email']]
+    )
+    message.attach_alternative(render_to_string('emails/daily_digest.html', digest), 'text/html')
+    return message
+
+
+def send_batch(connection, messages):
+    """
+    Send a batch over ``connection`` one message at a time, so a failure
+    never resends delivered messages: the connection is reopened once and
+    the undelivered rest retried, and if that fails too the rest of the
+    batch is logged and skipped. Returns the number of emails sent.
+    """
+    sent = delivered = 0
+    retried = False
+    while delivered < len(messages):
+        try:
+            sent += connection.send_messages([messages[delivered]]) or 0
+            delivered += 1
+        except Exception as e:
+            if retried:
+                logger.error(
+                    f"Digest batch failed again, skipping {len(messages) - delivered} emails: {str(e)}"
+                )
+                break
+            logger.warning(f"Digest batch failed ({e}); reconnecting and retrying once")
+            retried = True
+            try:
+                connection.close()
+                connection.open()
+            except Exception as e:
+                logger.error(
+                    f"Error reconnecting, skipping {len(messages) - delivered} digest emails: {str(e)}"
+                )
+                break
+    return sent
+
+
+def send_digests(digests, workers=None, batch_size=None):
+    """
+    Render ``digests`` in a worker pool and send them over one mail
+    connection in batches. Returns the number of emails sent.
+    """
+    config = get_digest_settings()
+    workers = workers or config['RENDER_WORKERS']
+    batch_size = batch_size or config['SEND_BATCH_SIZE']
+    
+    sent = 0
+    batch = []
+    connection = get_connection()
+    
+    # Contexts are plain data, so rendering needs no database access
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        connection.open()
+        try:
+            for message in executor.map(render_digest, digests):
+                batch.append(message)
+                if len(batch) >= batch_size:
+                    sent += send_batch(connection, batch)
+                    batch = []
+            
+            if batch:
+                sent += send_batch(connection, batch)
+        finally:
+            connection.close()
+    
+    return sent
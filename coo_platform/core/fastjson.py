@@ -0,0 +1,121 @@
+"""
+Project-wide JSON encoding with orjson.
+
+Used by the DRF renderer and parser configured in ``REST_FRAMEWORK`` and by
+``FastJsonResponse`` (a drop-in for ``JsonResponse`` on hot endpoints), so
+every JSON payload follows the same encoding policy:
+
+- datetimes, dates and times: ISO 8601, UTC as ``Z`` (natively)
+- UUIDs: canonical strings (natively)
+- Decimals: numbers, or strings with the ``DECIMAL_AS_STRING`` setting
+- timedeltas: seconds, as DRF's encoder does
+- numpy arrays and scalars: lists and numbers (natively)
+- lazy translations, sets, querysets and other iterables: str / list
+- non-string dict keys (dates, UUIDs, ints): strings
+"""
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.functional import Promise
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from datetime import timedelta
+from decimal import Decimal
+
+import orjson
+
+DEFAULT_SETTINGS = {
+    # Encode Decimals as strings (exact) instead of numbers
+    'DECIMAL_AS_STRING': False,
+}
+
+OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def get_json_settings():
+    """Return the JSON settings merged over the defaults."""
+    configured = settings.COO_PLATFORM_SETTINGS.get('JSON', {})
+    return {**DEFAULT_SETTINGS, **configured}
+
+
+def _default_decimal_as_float(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    return _default(obj)
+
+
+def _default_decimal_as_string(obj):
+    if isinstance(obj, Decimal):
+        return str(obj)
+    return _default(obj)
+
+
+def _default(obj):
+    """Encode the types orjson does not support natively."""
+    if isinstance(obj, Promise):
+        return str(obj)
+    if isinstance(obj, timedelta):
+        return obj.total_seconds()
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if hasattr(obj, 'tolist'):
+        # numpy values orjson does not handle natively (e.g. float16)
+        return obj.tolist()
+    if hasattr(obj, '__iter__'):
+        return list(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def dumps(obj, indent=False):
+    """Encode ``obj`` to JSON bytes following the project's encoding policy."""
+    default = (
+        _default_decimal_as_string if get_json_settings()['DECIMAL_AS_STRING']
+        else _default_decimal_as_float
+    )
+    options = OPTIONS | orjson.OPT_INDENT_2 if indent else OPTIONS
+    return orjson.dumps(obj, default=default, option=options)
+
+
+def loads(data):
+    """Decode JSON ``data`` (bytes or str); raises ``orjson.JSONDecodeError`` (a ``ValueError``)."""
+    return orjson.loads(data)
+
+
+class FastJsonResponse(HttpResponse):
+    """
+    ``JsonResponse`` encoding its data with ``dumps``.
+    
+    As with ``JsonResponse``, only dicts are accepted unless ``safe`` is False.
+    """
+    
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                'In order to allow non-dict objects to be serialized set the safe parameter to False.'
+            )
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """DRF renderer encoding with ``dumps``; honours ``; indent=N`` in the Accept header."""
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        return dumps(data, indent=bool(indent))
+
+
+class ORJSONParser(JSONParser):
+    """DRF parser decoding request bodies with orjson."""
+    
+    renderer_class = ORJSONRenderer
+    
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return loads(stream.read())
+        except ValueError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,404 @@
+"""
+Query-count and latency instrumentation.
+
+Every database query executed while a collector is active is counted,
+timed and fingerprinted. Collectors are opened per HTTP request (see
+core.middleware.QueryInstrumentationMiddleware), per Channels message
+(see InstrumentedConsumerMixin) or around any block of code with
+``collect()``. Finished collectors are aggregated in a per-process
+registry that is exposed in the Prometheus text format.
+"""
+import contextvars
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger('coo_platform.performance')
+
+# Collectors active in the current context (request, consumer message, block)
+_active_collectors = contextvars.ContextVar('coo_active_collectors', default=())
+
+# Latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DEFAULT_SETTINGS = {
+    'ENABLED': True,
+    'SLOW_REQUEST_MS': 500,
+    'SLOW_REQUEST_QUERIES': 50,
+    'TOP_FINGERPRINTS': 5,
+    'STRICT_QUERY_BUDGETS': False,
+    'QUERY_BUDGETS': {},
+    'METRICS_TOKEN': '',
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Raised when an endpoint runs more queries than its declared budget and
+    strict budgets are enabled (as they should be in the test settings).
+    """
+
+
+def get_instrumentation_settings():
+    """Return the instrumentation settings merged over the defaults."""
+    configured = settings.COO_PLATFORM_SETTINGS.get('INSTRUMENTATION', {})
+    return {**DEFAULT_SETTINGS, **configured}
+
+
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint_sql(sql):
+    """
+    Normalize a SQL statement so that repeated queries which only differ by
+    their parameters (the signature of an N+1) share one fingerprint.
+    """
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _IN_LIST_RE.sub('(?, ...)', sql)
+    return _WHITESPACE_RE.sub(' ', sql).strip()
+
+
+class Collector:
+    """
+    Measurements for one unit of work (a request, a message or a block).
+    """
+    
+    def __init__(self, label, budget=None):
+        self.label = label
+        self.budget = budget
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.fingerprints = Counter()
+        self.started = time.perf_counter()
+        self.duration = None
+    
+    def add_query(self, fingerprint, duration):
+        self.queries += 1
+        self.db_time += duration
+        self.fingerprints[fingerprint] += 1
+    
+    def add_cache_access(self, hits=0, misses=0):
+        self.cache_hits += hits
+        self.cache_misses += misses
+    
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+    
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.queries > self.budget
+    
+    def top_fingerprints(self, limit=5):
+        """Most repeated SQL fingerprints, as (count, fingerprint) pairs."""
+        return [
+            (count, fingerprint)
+            for fingerprint, count in self.fingerprints.most_common(limit)
+            if count > 1
+        ]
+
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry:
+    """
+    Thread-safe, per-process aggregation of finished collectors.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self._series = defaultdict(lambda: {
+                'count': 0,
+                'queries': 0,
+                'db_time': 0.0,
+                'cache_hits': 0,
+                'cache_misses': 0,
+                'latency_sum': 0.0,
+                'latency_buckets': [0] * len(LATENCY_BUCKETS),
+                'budget_exceeded': 0,
+            })
+    
+    def observe(self, collector):
+        with self._lock:
+            series = self._series[collector.label]
+            series['count'] += 1
+            series['queries'] += collector.queries
+            series['db_time'] += collector.db_time
+            series['cache_hits'] += collector.cache_hits
+            series['cache_misses'] += collector.cache_misses
+            series['latency_sum'] += collector.duration
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if collector.duration <= bound:
+                    series['latency_buckets'][index] += 1
+            if collector.over_budget:
+                series['budget_exceeded'] += 1
+    
+    def snapshot(self):
+        """Return a copy of all series keyed by label."""
+        with self._lock:
+            return {
+                label: {**series, 'latency_buckets': list(series['latency_buckets'])}
+                for label, series in self._series.items()
+            }
+    
+    def render_prometheus(self):
+        """Render all series in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+        
+        def emit(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+        
+        def labels(label, **extra):
+            pairs = [('endpoint', label)] + list(extra.items())
+            return '{' + ','.join(
+                f'{key}="{_escape_label_value(value)}"' for key, value in pairs
+            ) + '}'
+        
+        emit('coo_requests_total', 'counter', 'Handled requests, messages and blocks.', [
+            f'coo_requests_total{labels(label)} {series["count"]}'
+            for label, series in snapshot.items()
+        ])
+        emit('coo_db_queries_total', 'counter', 'Database queries executed.', [
+            f'coo_db_queries_total{labels(label)} {series["queries"]}'
+            for label, series in snapshot.items()
+        ])
+        emit('coo_db_time_seconds_total', 'counter', 'Time spent in the database.', [
+            f'coo_db_time_seconds_total{labels(label)} {series["db_time"]:.6f}'
+            for label, series in snapshot.items()
+        ])
+        emit('coo_cache_hits_total', 'counter', 'Cache hits.', [
+            f'coo_cache_hits_total{labels(label)} {series["cache_hits"]}'
+            for label, series in snapshot.items()
+        ])
+        emit('coo_cache_misses_total', 'counter', 'Cache misses.', [
+            f'coo_cache_misses_total{labels(label)} {series["cache_misses"]}'
+            for label, series in snapshot.items()
+        ])
+        emit('coo_query_budget_exceeded_total', 'counter', 'Executions over their query budget.', [
+            f'coo_query_budget_exceeded_total{labels(label)} {series["budget_exceeded"]}'
+            for label, series in snapshot.items()
+        ])
+        
+        latency_samples = []
+        for label, series in snapshot.items():
+            for bound, bucket_count in zip(LATENCY_BUCKETS, series['latency_buckets']):
+                latency_samples.append(
+                    f'coo_latency_seconds_bucket{labels(label, le=bound)} {bucket_count}'
+                )
+            latency_samples.append(
+                f'coo_latency_seconds_bucket{labels(label, le="+Inf")} {series["count"]}'
+            )
+            latency_samples.append(f'coo_latency_seconds_sum{labels(label)} {series["latency_sum"]:.6f}')
+            latency_samples.append(f'coo_latency_seconds_count{labels(label)} {series["count"]}')
+        emit('coo_latency_seconds', 'histogram', 'Total latency.', latency_samples)
+        
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper that feeds every active collector.
+    """
+    collectors = _active_collectors.get()
+    if not collectors:
+        return execute(sql, params, many, context)
+    
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        fingerprint = fingerprint_sql(sql)
+        for collector in collectors:
+            collector.add_query(fingerprint, duration)
+
+
+def record_cache_access(hits=0, misses=0):
+    """Record cache hits/misses against every active collector."""
+    for collector in _active_collectors.get():
+        collector.add_cache_access(hits=hits, misses=misses)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    """Install the execute wrapper on every new database connection."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def collect(label, budget=None):
+    """
+    Measure everything executed inside the block under ``label``.
+    
+    Usage:
+        with collect('widget.kpi_summary', budget=5):
+            widget.get_data()
+    
+    Nested blocks are counted in every enclosing collector too. When the
+    block exceeds its query budget a warning is logged, and
+    QueryBudgetExceeded is raised if strict budgets are enabled and the
+    block itself completed (its own exceptions are never replaced).
+    """
+    collector = Collector(label, budget=budget)
+    token = _active_collectors.set(_active_collectors.get() + (collector,))
+    completed = False
+    try:
+        yield collector
+        completed = True
+    finally:
+        _active_collectors.reset(token)
+        collector.finish()
+        registry.observe(collector)
+        report(collector, strict=completed)
+
+
+def report(collector, strict=True):
+    """
+    Log slow or over-budget executions with their repeated SQL. With
+    ``strict``, over-budget executions raise QueryBudgetExceeded when
+    strict budgets are enabled.
+    """
+    config = get_instrumentation_settings()
+    slow = (
+        collector.duration * 1000 >= config['SLOW_REQUEST_MS'] or
+        collector.queries >= config['SLOW_REQUEST_QUERIES']
+    )
+    
+    if slow or collector.over_budget:
+        repeated = '\n'.join(
+            f'  {count}x {fingerprint}'
+            for count, fingerprint in collector.top_fingerprints(config['TOP_FINGERPRINTS'])
+        )
+        logger.warning(
+            f'{"Over budget" if collector.over_budget else "Slow"}: {collector.label} '
+            f'took {collector.duration * 1000:.1f}ms with {collector.queries} queries '
+            f'({collector.db_time * 1000:.1f}ms in DB, budget={collector.budget}, '
+            f'cache {collector.cache_hits} hits/{collector.cache_misses} misses)'
+            + (f'\nTop repeated queries:\n{repeated}' if repeated else '')
+        )
+    
+    if strict and collector.over_budget and config['STRICT_QUERY_BUDGETS']:
+        raise QueryBudgetExceeded(
+            f'{collector.label} ran {collector.queries} queries, '
+            f'budget is {collector.budget}. Top repeated queries: '
+            f'{collector.top_fingerprints(config["TOP_FINGERPRINTS"])}'
+        )
+
+
+def query_budget(max_queries):
+    """
+    Declare the query budget of a function-based view.
+    
+    Usage:
+        @login_required
+        @query_budget(10)
+        def kpi_chart_data(request, kpi_id):
+            ...
+    
+    Class-based views declare ``query_budget = 10`` and DRF viewsets
+    ``query_budgets = {'list': 10, 'retrieve': 8}`` instead. Budgets in
+    COO_PLATFORM_SETTINGS['INSTRUMENTATION']['QUERY_BUDGETS'] take precedence.
+    """
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+def get_query_budget(label, view_func=None, action=None):
+    """Resolve the query budget for an endpoint, or None if it has none."""
+    budgets = get_instrumentation_settings()['QUERY_BUDGETS']
+    if label in budgets:
+        return budgets[label]
+    
+    if view_func is None:
+        return None
+    
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if action and view_class is not None:
+        action_budgets = getattr(view_class, 'query_budgets', {})
+        if action in action_budgets:
+            return action_budgets[action]
+    
+    if hasattr(view_func, 'query_budget'):
+        return view_func.query_budget
+    return getattr(view_class, 'query_budget', None)
+
+
+class InstrumentedConsumerMixin:
+    """
+    Channels consumer mixin that measures every handled message.
+    
+    Messages are labelled ``ws:<Consumer>.<message type>``; consumers may
+    declare ``query_budgets = {'websocket.receive': 5}``.
+    """
+    query_budgets = {}
+    
+    async def dispatch(self, message):
+        message_type = message.get('type', 'unknown')
+        label = f'ws:{self.__class__.__name__}.{message_type}'
+        budget = get_query_budget(label)
+        if budget is None:
+            budget = self.query_budgets.get(message_type)
+        
+        with collect(label, budget=budget):
+            await super().dispatch(message)
+
+
+_MISSING = object()
+
+
+class InstrumentedCacheMixin:
+    """
+    Cache backend mixin that records hits and misses for the collectors.
+    """
+    
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version=version)
+        if value is _MISSING:
+            record_cache_access(misses=1)
+            return default
+        record_cache_access(hits=1)
+        return value
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    """Local-memory cache with hit/miss instrumentation."""
+
+
+class InstrumentedRedisCache(InstrumentedCacheMixin, RedisCache):
+    """Redis cache with hit/miss instrumentation."""
+    
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = super().get_many(keys, version=version)
+        record_cache_access(hits=len(found), misses=len(keys) - len(found))
+        return found
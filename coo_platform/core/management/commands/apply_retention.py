@@ -0,0 +1,47 @@
+"""
+Management command to apply the data retention policies.
+"""
+from django.core.management.base import BaseCommand
+
+from core.retention import RetentionEngine, get_policies
+
+
+class Command(BaseCommand):
+    help = 'Delete (and optionally archive) expired rows according to the retention policies'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            action='append',
+            help='Only apply the policy of this model, e.g. automation.AutomationLog (can be repeated)'
+        )
+        parser.add_argument('--batch-size', type=int, default=None, help='Rows deleted per batch')
+        parser.add_argument('--sleep', type=float, default=None, help='Seconds to sleep between batches')
+        parser.add_argument('--max-seconds', type=int, default=None, help='Stop (and resume next run) after this long')
+        parser.add_argument('--archive-dir', type=str, default=None, help='Archive rows to gzip files in this directory')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the expired rows')
+    
+    def handle(self, *args, **options):
+        engine = RetentionEngine(
+            batch_size=options['batch_size'],
+            sleep_seconds=options['sleep'],
+            max_seconds=options['max_seconds'],
+            archive_dir=options['archive_dir'],
+            dry_run=options['dry_run']
+        )
+        
+        for stats in engine.run(get_policies(options['model'])):
+            if options['dry_run']:
+                self.stdout.write(f"{stats['model']}: {stats['would_delete']} rows would be deleted")
+                continue
+            
+            self.stdout.write(
+                f"{stats['model']}: deleted {stats['deleted']} rows "
+                f"(archived {stats['archived']}) in {stats['batches']} batches, "
+                f"{stats['rows_per_second']} rows/s, "
+                f"dropped {len(stats['partitions_dropped'])} partitions"
+            )
+            if not stats['completed']:
+                self.stdout.write(self.style.WARNING('  Time budget reached; the next run will resume.'))
+        
+        self.stdout.write(self.style.SUCCESS('Retention completed'))
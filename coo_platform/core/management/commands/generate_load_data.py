@@ -0,0 +1,496 @@
+"""
+Management command to generate large synthetic tenants for load testing and benchmarks.
+
+Unlike the demo data commands, rows are written in batches with bulk_create
+(or COPY on PostgreSQL), so tenants with millions of data points can be built
+in minutes.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, models
+from django.utils import timezone
+from decimal import Decimal
+from datetime import timedelta
+from itertools import islice
+import io
+import json
+import random
+import time
+import uuid
+
+from tenants.models import Tenant, TenantUser
+from core.models import UserProfile
+from projects.models import Project, ProjectCategory, ProjectMembership, Task
+from kpis.models import SmartKPI, KPICategory, KPIDataPoint
+from automation.models import AutomationRule, AutomationAction, AutomationSchedule
+from automation.scheduling import build_schedule
+
+
+# Row counts per tenant for each preset
+SCALES = {
+    'small': {
+        'users': 20,
+        'projects': 20,
+        'tasks': 2000,
+        'kpis': 100,
+        'datapoints': 36500,
+        'rules': 200,
+    },
+    'medium': {
+        'users': 100,
+        'projects': 100,
+        'tasks': 20000,
+        'kpis': 1000,
+        'datapoints': 730000,
+        'rules': 5000,
+    },
+    'large': {
+        'users': 500,
+        'projects': 500,
+        'tasks': 100000,
+        'kpis': 5000,
+        'datapoints': 10000000,
+        'rules': 50000,
+    },
+}
+
+TENANT_SLUG_PREFIX = 'load-tenant'
+LOAD_PASSWORD = 'load123'
+
+
+def chunked(iterable, size):
+    """Yield lists of at most ``size`` items from ``iterable``."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _copy_value(field, obj):
+    """Render a model field value in PostgreSQL COPY text format."""
+    value = field.pre_save(obj, add=True)
+    if value is None:
+        return r'\N'
+    
+    if isinstance(field, models.JSONField):
+        value = json.dumps(value)
+    elif isinstance(value, bool):
+        value = 't' if value else 'f'
+    else:
+        value = str(value)
+    
+    return (
+        value.replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+def copy_fields(model):
+    """Concrete fields written by COPY: all but auto-generated primary keys, left to the database."""
+    return [field for field in model._meta.concrete_fields if not isinstance(field, models.AutoField)]
+
+
+def copy_objects(model, objs):
+    """Insert unsaved model instances with a single COPY statement."""
+    fields = copy_fields(model)
+    buffer = io.StringIO()
+    for obj in objs:
+        buffer.write('\t'.join(_copy_value(field, obj) for field in fields))
+        buffer.write('\n')
+    buffer.seek(0)
+    
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(f'COPY {table} ({columns}) FROM STDIN', buffer)
+
+
+class Command(BaseCommand):
+    help = 'Generate large synthetic tenants for load testing and benchmarks'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            choices=sorted(SCALES),
+            default='small',
+            help='Preset row counts per tenant (default: small)'
+        )
+        parser.add_argument('--tenants', type=int, default=1, help='Number of tenants to generate')
+        for entity in SCALES['small']:
+            parser.add_argument(
+                f'--{entity}',
+                type=int,
+                default=None,
+                help=f'Number of {entity} per tenant (overrides --scale)'
+            )
+        parser.add_argument(
+            '--dependency-ratio',
+            type=float,
+            default=0.2,
+            help='Fraction of tasks depending on an earlier task of the same project'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT/COPY batch')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for repeatable data')
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Use bulk_create even on PostgreSQL instead of COPY'
+        )
+        parser.add_argument(
+            '--flush',
+            action='store_true',
+            help='Delete previously generated load tenants first'
+        )
+    
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.use_copy = connection.vendor == 'postgresql' and not options['no_copy']
+        self.dependency_ratio = options['dependency_ratio']
+        
+        counts = dict(SCALES[options['scale']])
+        for entity in counts:
+            if options[entity] is not None:
+                counts[entity] = options[entity]
+        
+        if counts['users'] < 1 or counts['kpis'] < 1 or counts['projects'] < 1:
+            raise CommandError('At least one user, project and KPI per tenant is required.')
+        
+        if options['flush']:
+            self.flush_load_tenants()
+        
+        started = time.monotonic()
+        for index in range(options['tenants']):
+            self.generate_tenant(index, counts)
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Generated {options["tenants"]} load tenant(s) in {time.monotonic() - started:.1f}s '
+                f'({"COPY" if self.use_copy else "bulk_create"}). '
+                f'Users can log in with password "{LOAD_PASSWORD}".'
+            )
+        )
+    
+    def flush_load_tenants(self):
+        """Delete tenants (and their users) created by previous runs."""
+        tenants = Tenant.objects.filter(slug__startswith=TENANT_SLUG_PREFIX)
+        count = tenants.count()
+        tenants.delete()
+        User.objects.filter(username__startswith=f'{TENANT_SLUG_PREFIX}-').delete()
+        self.stdout.write(f'Deleted {count} existing load tenant(s)')
+    
+    def insert(self, model, objs):
+        """Write instances in batches, using COPY when available. Returns the row count."""
+        total = 0
+        for batch in chunked(objs, self.batch_size):
+            if self.use_copy:
+                copy_objects(model, batch)
+            else:
+                model.objects.bulk_create(batch, batch_size=self.batch_size)
+            total += len(batch)
+        return total
+    
+    def timed(self, label, model, objs):
+        """Insert rows and report the throughput."""
+        started = time.monotonic()
+        total = self.insert(model, objs)
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(f'  {label}: {total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)')
+        return total
+    
+    def generate_tenant(self, index, counts):
+        """Generate one tenant with all of its data."""
+        slug = f'{TENANT_SLUG_PREFIX}-{index + 1}'
+        if Tenant.objects.filter(slug=slug).exists():
+            raise CommandError(f'Tenant "{slug}" already exists. Use --flush to regenerate.')
+        
+        tenant = Tenant.objects.create(
+            name=f'Load Tenant {index + 1}',
+            slug=slug,
+            contact_email=f'{slug}@example.com',
+            subscription_tier='enterprise',
+            status='active',
+            max_users=counts['users'] + 1,
+            max_projects=counts['projects'] + 1,
+        )
+        self.stdout.write(f'Generating tenant: {tenant.name}')
+        
+        users = self.generate_users(tenant, counts['users'])
+        projects = self.generate_projects(tenant, users, counts['projects'])
+        self.generate_tasks(projects, users, counts['tasks'])
+        kpis = self.generate_kpis(tenant, users, counts['kpis'])
+        self.generate_datapoints(kpis, counts['datapoints'])
+        self.generate_rules(tenant, users, kpis, counts['rules'])
+    
+    def generate_users(self, tenant, count):
+        """Create users with profiles and tenant memberships."""
+        prefix = f'{tenant.slug}-user-'
+        password = make_password(LOAD_PASSWORD)
+        
+        self.timed('users', User, (
+            User(
+                username=f'{prefix}{i}',
+                email=f'{prefix}{i}@example.com',
+                first_name='Load',
+                last_name=f'User {i}',
+                password=password,
+                is_active=True,
+            )
+            for i in range(count)
+        ))
+        
+        # Re-read so primary keys are known on every backend
+        users = list(User.objects.filter(username__startswith=prefix).order_by('id'))
+        
+        self.timed('profiles', UserProfile, (
+            UserProfile(
+                user=user,
+                role='client_admin' if i == 0 else 'client_user',
+                subscription_tier='enterprise',
+            )
+            for i, user in enumerate(users)
+        ))
+        
+        # bulk_create skips TenantUser.save(), so set role permissions explicitly
+        self.timed('tenant memberships', TenantUser, (
+            TenantUser(
+                tenant=tenant,
+                user=user,
+                role='admin' if i == 0 else 'user',
+                can_invite_users=i == 0,
+                can_manage_projects=i == 0,
+                can_manage_kpis=i == 0,
+                can_view_analytics=True,
+                can_export_data=i == 0,
+            )
+            for i, user in enumerate(users)
+        ))
+        
+        return users
+    
+    def generate_projects(self, tenant, users, count):
+        """Create project categories, projects and memberships."""
+        categories = [
+            ProjectCategory(tenant=tenant, name=name, color=color)
+            for name, color in [
+                ('Operations', '#007bff'),
+                ('Technology', '#28a745'),
+                ('Finance', '#ffc107'),
+                ('Marketing', '#dc3545'),
+                ('People', '#6f42c1'),
+            ]
+        ]
+        ProjectCategory.objects.bulk_create(categories)
+        categories = list(ProjectCategory.objects.filter(tenant=tenant))
+        
+        today = timezone.now().date()
+        statuses = ['planning', 'active', 'active', 'active', 'on_hold', 'completed', 'cancelled']
+        projects = []
+        for i in range(count):
+            start_date = today - timedelta(days=self.random.randint(0, 540))
+            status = self.random.choice(statuses)
+            budget = Decimal(self.random.randint(10, 500) * 1000)
+            projects.append(Project(
+                id=uuid.uuid4(),
+                tenant=tenant,
+                name=f'Load Project {i + 1}',
+                description='Synthetic project generated for load testing.',
+                category=self.random.choice(categories),
+                status=status,
+                priority=self.random.choice(['low', 'medium', 'high', 'critical']),
+                project_manager=self.random.choice(users),
+                start_date=start_date,
+                target_end_date=start_date + timedelta(days=self.random.randint(30, 365)),
+                actual_end_date=today if status == 'completed' else None,
+                budget_allocated=budget,
+                budget_spent=(budget * Decimal(self.random.randint(0, 110)) / 100).quantize(Decimal('0.01')),
+            ))
+        self.timed('projects', Project, projects)
+        
+        roles = [role for role, _ in ProjectMembership.ROLE_CHOICES]
+        self.timed('project memberships', ProjectMembership, (
+            ProjectMembership(
+                project=project,
+                user=user,
+                role=self.random.choice(roles),
+                can_edit_project=user == project.project_manager,
+            )
+            for project in projects
+            for user in self.random.sample(users, min(len(users), self.random.randint(3, 8)))
+        ))
+        
+        return projects
+    
+    def generate_tasks(self, projects, users, count):
+        """Create tasks spread across projects, with dependencies and project progress."""
+        now = timezone.now()
+        statuses = ['todo', 'todo', 'in_progress', 'review', 'completed', 'completed', 'blocked']
+        progress = {project.id: [0, 0] for project in projects}
+        dependencies = []
+        previous_task = {}
+        
+        def build_tasks():
+            for i in range(count):
+                project = projects[i % len(projects)]
+                status = self.random.choice(statuses)
+                due_date = now + timedelta(days=self.random.randint(-60, 120))
+                task = Task(
+                    id=uuid.uuid4(),
+                    project=project,
+                    title=f'Load Task {i + 1}',
+                    assigned_to=self.random.choice(users),
+                    created_by=project.project_manager,
+                    status=status,
+                    priority=self.random.choice(['low', 'medium', 'high', 'urgent']),
+                    due_date=due_date,
+                    started_at=now - timedelta(days=self.random.randint(1, 30)) if status != 'todo' else None,
+                    completed_at=min(due_date, now) if status == 'completed' else None,
+                    estimated_hours=Decimal(self.random.randint(1, 40)),
+                    actual_hours=Decimal(self.random.randint(0, 40)) if status != 'todo' else 0,
+                )
+                
+                progress[project.id][0] += 1
+                if status == 'completed':
+                    progress[project.id][1] += 1
+                
+                earlier = previous_task.get(project.id)
+                if earlier is not None and self.random.random() < self.dependency_ratio:
+                    dependencies.append((task.id, earlier))
+                previous_task[project.id] = task.id
+                
+                yield task
+        
+        self.timed('tasks', Task, build_tasks())
+        
+        Dependency = Task.depends_on.through
+        self.timed('task dependencies', Dependency, (
+            Dependency(from_task_id=from_id, to_task_id=to_id)
+            for from_id, to_id in dependencies
+        ))
+        
+        # Task.save() normally keeps project progress in sync; bulk inserts do not
+        for project in projects:
+            total, completed = progress[project.id]
+            project.progress_percentage = int(completed / total * 100) if total else 0
+        Project.objects.bulk_update(projects, ['progress_percentage'], batch_size=self.batch_size)
+    
+    def generate_kpis(self, tenant, users, count):
+        """Create KPI categories, KPIs and stakeholders."""
+        categories = [
+            KPICategory(tenant=tenant, name=label, category_type=category_type, display_order=i)
+            for i, (category_type, label) in enumerate(KPICategory.CATEGORY_TYPES)
+        ]
+        KPICategory.objects.bulk_create(categories)
+        categories = list(KPICategory.objects.filter(tenant=tenant))
+        
+        now = timezone.now()
+        kpis = []
+        for i in range(count):
+            target = Decimal(self.random.randint(50, 5000))
+            trend_direction = self.random.choice(['up_good', 'up_good', 'down_good'])
+            if trend_direction == 'up_good':
+                warning, critical = target * Decimal('0.9'), target * Decimal('0.75')
+            else:
+                warning, critical = target * Decimal('1.1'), target * Decimal('1.25')
+            kpis.append(SmartKPI(
+                id=uuid.uuid4(),
+                tenant=tenant,
+                name=f'Load KPI {i + 1}',
+                category=self.random.choice(categories),
+                data_source_type=self.random.choice(['manual', 'manual', 'api', 'csv_upload']),
+                unit=self.random.choice(['', '%', '$', 'count', 'hours']),
+                target_value=target,
+                warning_threshold=warning,
+                critical_threshold=critical,
+                trend_direction=trend_direction,
+                auto_update_frequency=self.random.choice(['daily', 'weekly', 'monthly']),
+                next_auto_update=now + timedelta(hours=self.random.randint(-48, 720)),
+                owner=self.random.choice(users),
+                is_featured=self.random.random() < 0.05,
+            ))
+        self.timed('kpis', SmartKPI, kpis)
+        
+        Stakeholder = SmartKPI.stakeholders.through
+        self.timed('kpi stakeholders', Stakeholder, (
+            Stakeholder(smartkpi_id=kpi.id, user_id=user.id)
+            for kpi in kpis
+            for user in self.random.sample(users, min(len(users), 2))
+        ))
+        
+        return kpis
+    
+    def generate_datapoints(self, kpis, count):
+        """Create a daily random-walk series per KPI, ending today."""
+        per_kpi, remainder = divmod(count, len(kpis))
+        today = timezone.now().date()
+        
+        def build_datapoints():
+            for i, kpi in enumerate(kpis):
+                days = per_kpi + (1 if i < remainder else 0)
+                target = float(kpi.target_value)
+                value = target * self.random.uniform(0.7, 1.1)
+                for offset in range(days, 0, -1):
+                    value = max(0.0, value + self.random.gauss(0, target * 0.02))
+                    yield KPIDataPoint(
+                        id=uuid.uuid4(),
+                        kpi_id=kpi.id,
+                        date=today - timedelta(days=offset - 1),
+                        value=Decimal(f'{value:.4f}'),
+                        source='api' if kpi.data_source_type == 'api' else 'manual',
+                    )
+        
+        self.timed('kpi datapoints', KPIDataPoint, build_datapoints())
+    
+    def generate_rules(self, tenant, users, kpis, count):
+        """Create automation rules, mostly KPI threshold rules, each with one action."""
+        operators = ['gt', 'lt', 'gte', 'lte']
+        rules = []
+        for i in range(count):
+            trigger_type = self.random.choice(['kpi_threshold', 'kpi_threshold', 'kpi_threshold', 'time_based'])
+            if trigger_type == 'kpi_threshold':
+                kpi = self.random.choice(kpis)
+                trigger_config = {
+                    'kpi_id': str(kpi.id),
+                    'operator': self.random.choice(operators),
+                    'threshold': float(kpi.target_value),
+                }
+            else:
+                trigger_config = {
+                    'schedule': 'daily',
+                    'time_of_day': f'{self.random.randint(0, 23):02d}:00',
+                }
+            rules.append(AutomationRule(
+                id=uuid.uuid4(),
+                tenant=tenant,
+                name=f'Load Rule {i + 1}',
+                status=self.random.choice(['active', 'active', 'active', 'paused', 'draft']),
+                trigger_type=trigger_type,
+                trigger_config=trigger_config,
+                created_by=self.random.choice(users),
+                priority=self.random.randint(1, 10),
+            ))
+        self.timed('automation rules', AutomationRule, rules)
+        
+        self.timed('automation actions', AutomationAction, (
+            AutomationAction(
+                id=uuid.uuid4(),
+                rule=rule,
+                action_type='send_notification',
+                name='Notify owner',
+                action_config={
+                    'user_ids': [rule.created_by_id],
+                    'title': f'{rule.name} triggered',
+                    'message': 'Synthetic automation rule fired.',
+                },
+            )
+            for rule in rules
+        ))
+        
+        self.timed('automation schedules', AutomationSchedule, (
+            build_schedule(rule) for rule in rules if rule.trigger_type == 'time_based'
+        ))
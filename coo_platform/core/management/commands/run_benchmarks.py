@@ -0,0 +1,158 @@
+"""
+Management command to run the benchmark suite and store the results as JSON.
+
+Typical usage:
+    python manage.py generate_load_data --scale medium --flush
+    python manage.py run_benchmarks --tenant load-tenant-1
+    python manage.py run_benchmarks --compare benchmarks/results/<previous>.json
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    override_settings, setup_test_environment, teardown_test_environment
+)
+from django.utils import timezone
+from pathlib import Path
+import json
+import platform
+import subprocess
+
+from tenants.models import Tenant
+from core.benchmarks import BenchmarkSuite
+
+
+def get_git_commit():
+    """Return the current git commit hash, or None outside a checkout."""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR,
+            stderr=subprocess.DEVNULL,
+            text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Run the benchmark suite against a tenant and store the results as JSON'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            type=str,
+            default='load-tenant-1',
+            help='Slug of the tenant to benchmark (default: load-tenant-1)'
+        )
+        parser.add_argument(
+            '--case',
+            action='append',
+            choices=BenchmarkSuite.CASES,
+            help='Run only this case (can be repeated)'
+        )
+        parser.add_argument('--iterations', type=int, default=20, help='Measured iterations per case')
+        parser.add_argument('--warmup', type=int, default=2, help='Unmeasured warmup iterations per case')
+        parser.add_argument('--ws-clients', type=int, default=50, help='WebSocket clients for the fan-out case')
+        parser.add_argument(
+            '--in-memory-channel-layer',
+            action='store_true',
+            help='Use the in-memory channel layer instead of the configured one'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Result file (default: benchmarks/results/<timestamp>-<commit>.json)'
+        )
+        parser.add_argument('--compare', type=str, default=None, help='Previous result file to compare with')
+    
+    def handle(self, *args, **options):
+        try:
+            tenant = Tenant.objects.get(slug=options['tenant'])
+        except Tenant.DoesNotExist:
+            raise CommandError(
+                f'Tenant "{options["tenant"]}" not found. Create one with generate_load_data.'
+            )
+        
+        channel_layers = settings.CHANNEL_LAYERS
+        if options['in_memory_channel_layer']:
+            channel_layers = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+        
+        self.stdout.write(f'Benchmarking tenant: {tenant.name}')
+        
+        # Allows the test client host and keeps outgoing email in memory
+        setup_test_environment()
+        try:
+            with override_settings(CHANNEL_LAYERS=channel_layers):
+                suite = BenchmarkSuite(
+                    tenant,
+                    iterations=options['iterations'],
+                    warmup=options['warmup'],
+                    ws_clients=options['ws_clients']
+                )
+                results = suite.run(options['case'])
+        finally:
+            teardown_test_environment()
+        
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'git_commit': get_git_commit(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'tenant': {
+                'slug': tenant.slug,
+                'projects': tenant.project_set.count(),
+                'kpis': tenant.smartkpi_set.count(),
+                'automation_rules': tenant.automationrule_set.count(),
+            },
+            'options': {
+                'iterations': options['iterations'],
+                'warmup': options['warmup'],
+                'ws_clients': options['ws_clients'],
+            },
+            'results': results,
+        }
+        
+        output = self.get_output_path(options['output'], report)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2))
+        
+        self.print_results(results)
+        
+        if options['compare']:
+            previous = json.loads(Path(options['compare']).read_text())
+            self.print_comparison(previous.get('results', {}), results)
+        
+        self.stdout.write(self.style.SUCCESS(f'Results written to {output}'))
+    
+    def get_output_path(self, output, report):
+        if output:
+            return Path(output)
+        
+        timestamp = timezone.now().strftime('%Y%m%d-%H%M%S')
+        suffix = f'-{report["git_commit"]}' if report['git_commit'] else ''
+        return Path(settings.BASE_DIR) / 'benchmarks' / 'results' / f'{timestamp}{suffix}.json'
+    
+    def print_results(self, results):
+        self.stdout.write(f'{"case":<28}{"p50 ms":>10}{"p95 ms":>10}{"ops/s":>10}{"queries":>10}')
+        for name, result in results.items():
+            if 'skipped' in result:
+                self.stdout.write(f'{name:<28}skipped: {result["skipped"]}')
+                continue
+            self.stdout.write(
+                f'{name:<28}{result["p50_ms"]:>10.2f}{result["p95_ms"]:>10.2f}'
+                f'{result["throughput_per_s"] or 0:>10.1f}{result["queries_per_iteration"]:>10}'
+            )
+    
+    def print_comparison(self, previous, results):
+        self.stdout.write('\nChange vs previous run (negative is faster):')
+        for name, result in results.items():
+            before = previous.get(name)
+            if not before or 'p50_ms' not in before or 'p50_ms' not in result:
+                continue
+            changes = []
+            for key in ('p50_ms', 'p95_ms'):
+                if before[key]:
+                    changes.append(f'{key[:3]} {(result[key] - before[key]) / before[key] * 100:+.1f}%')
+            self.stdout.write(f'  {name:<26}{"  ".join(changes)}')
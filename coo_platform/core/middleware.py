@@ -0,0 +1,53 @@
+"""
+Middleware for request instrumentation.
+"""
+from django.core.exceptions import MiddlewareNotUsed
+from .instrumentation import (
+    collect, get_instrumentation_settings, get_query_budget
+)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Middleware that records query count, DB time, cache hits and latency
+    for every request, labelled by view name (and DRF action).
+    
+    It should be placed first so that the queries of other middleware and
+    of the context processors are attributed to the request too.
+    """
+    
+    def __init__(self, get_response):
+        if not get_instrumentation_settings()['ENABLED']:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        with collect('unresolved') as collector:
+            request._instrumentation_collector = collector
+            response = self.get_response(request)
+            
+            if collector.label == 'unresolved':
+                collector.label = f'unresolved:{response.status_code}'
+        
+        return response
+    
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Label the request's collector once the view is resolved."""
+        collector = getattr(request, '_instrumentation_collector', None)
+        if collector is None:
+            return None
+        
+        match = request.resolver_match
+        label = match.view_name if match and match.view_name else view_func.__name__
+        
+        # DRF viewsets map HTTP methods to actions (list, retrieve, ...)
+        action = None
+        actions = getattr(view_func, 'actions', None)
+        if actions:
+            action = actions.get(request.method.lower())
+            if action and not label.endswith(f'-{action}'):
+                label = f'{label}:{action}'
+        
+        collector.label = label
+        collector.budget = get_query_budget(label, view_func, action)
+        return None
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:00
+
+import core.partitioning
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        core.partitioning.PartitionByMonth(
+            model_name='auditlog',
+            field_name='created_at',
+        ),
+        core.partitioning.PartitionByMonth(
+            model_name='notification',
+            field_name='created_at',
+        ),
+    ]
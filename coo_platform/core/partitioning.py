@@ -0,0 +1,345 @@
+"""
+Monthly range partitioning for the fastest-growing tables.
+
+Partitioning is only available on PostgreSQL. On other databases (SQLite in
+development and tests) the migration operation does nothing, the helpers
+return empty results and retention falls back to plain DELETEs.
+
+Each partitioned table gets one partition per month named
+``<table>_pYYYYMM`` plus a ``<table>_default`` partition that catches rows
+outside the prepared range. The primary key of a partitioned table has to
+include the partition key, so the database key becomes ``(id, <column>)``;
+Django keeps treating ``id`` as the primary key.
+"""
+from django.apps import apps
+from django.db import connection, models, transaction
+from django.db.migrations.operations.base import Operation
+from django.utils import timezone
+from datetime import date
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Partitioned models and the column they are partitioned on
+PARTITIONED_MODELS = {
+    'kpis.KPIDataPoint': 'date',
+    'automation.AutomationLog': 'created_at',
+    'core.AuditLog': 'created_at',
+    'core.Notification': 'created_at',
+}
+
+# How many future months to keep partitions ready for
+DEFAULT_MONTHS_AHEAD = 3
+
+
+def month_start(value):
+    """Return the first day of the month containing ``value``."""
+    return date(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    """Return the first day of the month ``months`` after ``value``."""
+    years, month = divmod(value.month - 1 + months, 12)
+    return date(value.year + years, month + 1, 1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y%m}'
+
+
+def supports_partitioning(conn=None):
+    return (conn or connection).vendor == 'postgresql'
+
+
+def _bound(field, month):
+    """SQL literal for a month boundary of the partition key."""
+    if isinstance(field, models.DateTimeField):
+        return f"'{month.isoformat()} 00:00:00+00'"
+    return f"'{month.isoformat()}'"
+
+
+def _partition_key(model):
+    label = model._meta.label
+    if label not in PARTITIONED_MODELS:
+        raise ValueError(f'{label} is not a partitioned model')
+    return model._meta.get_field(PARTITIONED_MODELS[label])
+
+
+def is_partitioned(table, conn=None):
+    """Check whether ``table`` is a partitioned table."""
+    conn = conn or connection
+    if not supports_partitioning(conn):
+        return False
+    
+    with conn.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)',
+            [table]
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(table, conn=None):
+    """Return ``[(partition_name, month), ...]`` for the monthly partitions of ``table``."""
+    conn = conn or connection
+    if not supports_partitioning(conn):
+        return []
+    
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+        """, [table])
+        names = [row[0] for row in cursor.fetchall()]
+    
+    pattern = re.compile(rf'^{re.escape(table)}_p(\d{{4}})(\d{{2}})$')
+    partitions = []
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_partition(cursor, table, field, month, quote_name):
+    """
+    Create the partition of ``table`` for ``month``.
+    
+    Rows of that month already sitting in the default partition are moved
+    into the new partition (PostgreSQL refuses to create it otherwise).
+    """
+    name = partition_name(table, month)
+    default = f'{table}_default'
+    column = quote_name(field.column)
+    lower, upper = _bound(field, month), _bound(field, add_months(month, 1))
+    
+    cursor.execute(
+        f'SELECT EXISTS (SELECT 1 FROM {quote_name(default)} '
+        f'WHERE {column} >= {lower} AND {column} < {upper})'
+    )
+    if not cursor.fetchone()[0]:
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {quote_name(name)} PARTITION OF {quote_name(table)} '
+            f'FOR VALUES FROM ({lower}) TO ({upper})'
+        )
+        return name
+    
+    cursor.execute(f'ALTER TABLE {quote_name(table)} DETACH PARTITION {quote_name(default)}')
+    cursor.execute(
+        f'CREATE TABLE {quote_name(name)} PARTITION OF {quote_name(table)} '
+        f'FOR VALUES FROM ({lower}) TO ({upper})'
+    )
+    cursor.execute(
+        f'INSERT INTO {quote_name(name)} SELECT * FROM {quote_name(default)} '
+        f'WHERE {column} >= {lower} AND {column} < {upper}'
+    )
+    cursor.execute(
+        f'DELETE FROM {quote_name(default)} WHERE {column} >= {lower} AND {column} < {upper}'
+    )
+    cursor.execute(f'ALTER TABLE {quote_name(table)} ATTACH PARTITION {quote_name(default)} DEFAULT')
+    return name
+
+
+def ensure_partitions(model, months_ahead=DEFAULT_MONTHS_AHEAD, conn=None):
+    """
+    Make sure partitions exist from the current month up to ``months_ahead``
+    months in the future. Returns the names of the partitions created.
+    """
+    conn = conn or connection
+    table = model._meta.db_table
+    if not is_partitioned(table, conn):
+        return []
+    
+    field = _partition_key(model)
+    existing = {month for _, month in list_partitions(table, conn)}
+    current = month_start(timezone.now())
+    
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if month not in existing:
+            with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+                created.append(create_partition(cursor, table, field, month, conn.ops.quote_name))
+    
+    if created:
+        logger.info(f"Created partitions for {table}: {', '.join(created)}")
+    return created
+
+
+def drop_partitions_before(model, cutoff, conn=None):
+    """
+    Drop the monthly partitions of ``model`` that only hold rows older than
+    ``cutoff``. Returns the names of the dropped partitions.
+    """
+    conn = conn or connection
+    table = model._meta.db_table
+    if not is_partitioned(table, conn):
+        return []
+    
+    cutoff_month = month_start(cutoff)
+    expired = [name for name, month in list_partitions(table, conn) if add_months(month, 1) <= cutoff_month]
+    
+    with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+        for name in expired:
+            cursor.execute(
+                f'ALTER TABLE {conn.ops.quote_name(table)} DETACH PARTITION {conn.ops.quote_name(name)}'
+            )
+            cursor.execute(f'DROP TABLE {conn.ops.quote_name(name)}')
+    
+    if expired:
+        logger.info(f"Dropped expired partitions of {table}: {', '.join(expired)}")
+    return expired
+
+
+def purge_before(model, cutoff):
+    """
+    Remove rows of a partitioned model older than ``cutoff``.
+    
+    Whole months are removed by dropping their partitions; the remaining rows
+    (the partially expired month, the default partition, or everything on
+    databases without partitioning) are deleted normally.
+    Returns ``(dropped_partitions, deleted_rows)``.
+    """
+    field = _partition_key(model)
+    dropped = drop_partitions_before(model, cutoff)
+    deleted = model.objects.filter(**{f'{field.name}__lt': cutoff}).delete()[0]
+    return dropped, deleted
+
+
+def ensure_all_partitions(months_ahead=DEFAULT_MONTHS_AHEAD):
+    """Create upcoming partitions for every partitioned model."""
+    created = {}
+    for label in PARTITIONED_MODELS:
+        created[label] = ensure_partitions(apps.get_model(label), months_ahead)
+    return created
+
+
+def rebuild_table(schema_editor, model, field, partitioned):
+    """
+    Rebuild ``model``'s table as a monthly partitioned table (or back into a
+    plain table), keeping its data, indexes and constraints.
+    """
+    conn = schema_editor.connection
+    quote_name = schema_editor.quote_name
+    table = model._meta.db_table
+    new_table = f'{table}__rebuild'
+    pk_column = model._meta.pk.column
+    
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT conname, contype, pg_get_constraintdef(oid)
+            FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f')
+        """, [table])
+        constraints = cursor.fetchall()
+        
+        cursor.execute("""
+            SELECT indexdef FROM pg_indexes
+            WHERE tablename = %s AND schemaname = current_schema()
+            AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass)
+        """, [table, table])
+        indexes = [row[0] for row in cursor.fetchall()]
+        
+        partition_clause = f' PARTITION BY RANGE ({quote_name(field.column)})' if partitioned else ''
+        cursor.execute(
+            f'CREATE TABLE {quote_name(new_table)} (LIKE {quote_name(table)} '
+            f'INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING CONSTRAINTS){partition_clause}'
+        )
+        
+        if partitioned:
+            cursor.execute(
+                f'CREATE TABLE {quote_name(table + "_default")} PARTITION OF {quote_name(new_table)} DEFAULT'
+            )
+            
+            # One partition per month holding data, plus the upcoming months
+            cursor.execute(f'SELECT MIN({quote_name(field.column)}) FROM {quote_name(table)}')
+            oldest = cursor.fetchone()[0]
+            month = month_start(oldest) if oldest else month_start(timezone.now())
+            last = add_months(month_start(timezone.now()), DEFAULT_MONTHS_AHEAD)
+            while month <= last:
+                cursor.execute(
+                    f'CREATE TABLE {quote_name(partition_name(table, month))} PARTITION OF {quote_name(new_table)} '
+                    f'FOR VALUES FROM ({_bound(field, month)}) TO ({_bound(field, add_months(month, 1))})'
+                )
+                month = add_months(month, 1)
+        
+        cursor.execute(f'INSERT INTO {quote_name(new_table)} SELECT * FROM {quote_name(table)}')
+        cursor.execute(f'DROP TABLE {quote_name(table)}')
+        cursor.execute(f'ALTER TABLE {quote_name(new_table)} RENAME TO {quote_name(table)}')
+        
+        # The primary key of a partitioned table must contain the partition key
+        pk_name = next((name for name, kind, _ in constraints if kind == 'p'), f'{table}_pkey')
+        pk_columns = [pk_column, field.column] if partitioned and field.column != pk_column else [pk_column]
+        cursor.execute(
+            f'ALTER TABLE {quote_name(table)} ADD CONSTRAINT {quote_name(pk_name)} '
+            f'PRIMARY KEY ({", ".join(quote_name(column) for column in pk_columns)})'
+        )
+        
+        for name, kind, definition in constraints:
+            if kind != 'p':
+                cursor.execute(f'ALTER TABLE {quote_name(table)} ADD CONSTRAINT {quote_name(name)} {definition}')
+        
+        for definition in indexes:
+            # Indexes of a partitioned table are reported as "ON ONLY"; recreate them recursively
+            cursor.execute(definition.replace(' ON ONLY ', ' ON ', 1))
+        
+        if isinstance(model._meta.pk, models.AutoField):
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence(%s, %s), COALESCE(MAX({quote_name(pk_column)}), 1)) "
+                f"FROM {quote_name(table)}",
+                [table, pk_column]
+            )
+
+
+class PartitionByMonth(Operation):
+    """
+    Migration operation converting a model's table to monthly range
+    partitions on ``field_name``. Does nothing on databases other than
+    PostgreSQL; the model state is unchanged.
+    """
+    
+    reversible = True
+    
+    def __init__(self, model_name, field_name):
+        self.model_name = model_name
+        self.field_name = field_name
+    
+    def deconstruct(self):
+        return (
+            self.__class__.__name__,
+            [],
+            {'model_name': self.model_name, 'field_name': self.field_name}
+        )
+    
+    def state_forwards(self, app_label, state):
+        pass
+    
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        self._rebuild(app_label, schema_editor, to_state, partitioned=True)
+    
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        self._rebuild(app_label, schema_editor, from_state, partitioned=False)
+    
+    def _rebuild(self, app_label, schema_editor, state, partitioned):
+        if not supports_partitioning(schema_editor.connection):
+            return
+        
+        model = state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        
+        if is_partitioned(model._meta.db_table, schema_editor.connection) == partitioned:
+            return
+        
+        rebuild_table(schema_editor, model, model._meta.get_field(self.field_name), partitioned)
+    
+    def describe(self):
+        return f'Partition {self.model_name} by month on {self.field_name}'
+    
+    @property
+    def migration_name_fragment(self):
+        return f'partition_{self.model_name.lower()}'
@@ -0,0 +1,262 @@
+"""
+Data retention engine.
+
+Expired rows are removed in bounded primary-key batches with raw DELETE
+statements, sleeping between batches so replication and autovacuum can keep
+up. Progress is checkpointed in SystemSetting, so a run that is interrupted
+or hits its time budget resumes where it stopped. Rows can optionally be
+archived to gzip-compressed JSON lines files before they are deleted.
+
+Policies are configured per model in COO_PLATFORM_SETTINGS['RETENTION'] and
+can be overridden per tenant through ``Tenant.settings['retention_days']``,
+e.g. ``{"automation.AutomationLog": 365}``.
+"""
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+from datetime import timedelta
+from pathlib import Path
+import gzip
+import json
+import logging
+import time
+
+from .models import SystemSetting
+from .partitioning import PARTITIONED_MODELS, drop_partitions_before
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'BATCH_SIZE': 2000,
+    'SLEEP_SECONDS': 0.05,
+    'MAX_SECONDS': 600,
+    'ARCHIVE_DIR': '',
+    'POLICIES': {
+        'automation.AutomationLog': {'days': 90, 'tenant_field': 'rule__tenant'},
+        'core.AuditLog': {'days': 180},
+    },
+}
+
+
+def get_retention_settings():
+    """Return the retention settings merged over the defaults."""
+    configured = settings.COO_PLATFORM_SETTINGS.get('RETENTION', {})
+    return {**DEFAULT_SETTINGS, **configured}
+
+
+class RetentionPolicy:
+    """
+    How long rows of one model are kept.
+    
+    ``tenant_field`` is the lookup path from the model to its tenant; without
+    it, tenant overrides do not apply to the model.
+    """
+    
+    def __init__(self, label, days, date_field='created_at', tenant_field=None):
+        self.label = label
+        self.model = apps.get_model(label)
+        self.days = days
+        self.date_field = date_field
+        self.tenant_field = tenant_field
+        
+        # Raw DELETEs skip Django's cascade collector, so nothing may point at these rows
+        if self.model._meta.related_objects:
+            raise ImproperlyConfigured(
+                f'Retention cannot purge {label}: other models reference it.'
+            )
+    
+    def __repr__(self):
+        return f'<RetentionPolicy {self.label} {self.days} days>'
+    
+    def cutoff(self, days=None):
+        """Start of the day ``days`` ago; stable within a day so runs can resume."""
+        start_of_today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return start_of_today - timedelta(days=days or self.days)
+    
+    def get_scopes(self):
+        """
+        Return ``[(scope, queryset, cutoff), ...]``: one scope per tenant with
+        an override, plus one for everything else.
+        """
+        manager = self.model._base_manager
+        
+        def expired(queryset, cutoff):
+            return queryset.filter(**{f'{self.date_field}__lt': cutoff})
+        
+        if not self.tenant_field:
+            return [('all', expired(manager.all(), self.cutoff()), self.cutoff())]
+        
+        from tenants.models import Tenant
+        
+        overrides = {}
+        for tenant_id, tenant_settings in Tenant.objects.values_list('id', 'settings'):
+            days = (tenant_settings or {}).get('retention_days', {}).get(self.label)
+            if days:
+                overrides[tenant_id] = int(days)
+        
+        scopes = []
+        for tenant_id, days in overrides.items():
+            cutoff = self.cutoff(days)
+            queryset = manager.filter(**{self.tenant_field: tenant_id})
+            scopes.append((f'tenant:{tenant_id}', expired(queryset, cutoff), cutoff))
+        
+        default_queryset = manager.exclude(**{f'{self.tenant_field}__in': list(overrides)})
+        scopes.append(('default', expired(default_queryset, self.cutoff()), self.cutoff()))
+        return scopes
+
+
+def get_policies(labels=None):
+    """Build the configured policies, optionally limited to some model labels."""
+    policies = []
+    for label, options in get_retention_settings()['POLICIES'].items():
+        if labels and label not in labels:
+            continue
+        policies.append(RetentionPolicy(label, **options))
+    return policies
+
+
+class RetentionEngine:
+    """
+    Applies retention policies in throttled batches.
+    """
+    
+    def __init__(self, batch_size=None, sleep_seconds=None, max_seconds=None, archive_dir=None, dry_run=False):
+        config = get_retention_settings()
+        self.batch_size = batch_size or config['BATCH_SIZE']
+        self.sleep_seconds = config['SLEEP_SECONDS'] if sleep_seconds is None else sleep_seconds
+        self.max_seconds = max_seconds or config['MAX_SECONDS']
+        archive_dir = config['ARCHIVE_DIR'] if archive_dir is None else archive_dir
+        self.archive_dir = Path(archive_dir) if archive_dir else None
+        self.dry_run = dry_run
+        self.deadline = None
+    
+    def run(self, policies=None):
+        """Apply the policies and return one stats dict per policy."""
+        self.deadline = time.monotonic() + self.max_seconds
+        return [self.apply(policy) for policy in (policies or get_policies())]
+    
+    def time_left(self):
+        return self.deadline is None or time.monotonic() < self.deadline
+    
+    def apply(self, policy):
+        """Apply one policy over all of its scopes."""
+        started = time.monotonic()
+        stats = {
+            'model': policy.label,
+            'deleted': 0,
+            'archived': 0,
+            'batches': 0,
+            'partitions_dropped': [],
+            'completed': True,
+        }
+        scopes = policy.get_scopes()
+        
+        if self.dry_run:
+            stats['would_delete'] = sum(queryset.count() for _, queryset, _ in scopes)
+            return stats
+        
+        # Whole partitions can go without archiving as long as no tenant keeps them longer
+        if policy.label in PARTITIONED_MODELS and not self.archive_dir:
+            earliest_cutoff = min(cutoff for _, _, cutoff in scopes)
+            stats['partitions_dropped'] = drop_partitions_before(policy.model, earliest_cutoff)
+        
+        for scope, queryset, cutoff in scopes:
+            if not self.purge(policy, scope, queryset, cutoff, stats):
+                stats['completed'] = False
+                break
+        
+        elapsed = time.monotonic() - started
+        stats['seconds'] = round(elapsed, 2)
+        stats['rows_per_second'] = round(stats['deleted'] / elapsed, 1) if elapsed else 0
+        
+        logger.info(
+            f"Retention {policy.label}: deleted {stats['deleted']} rows in {stats['batches']} batches "
+            f"({stats['rows_per_second']} rows/s), dropped {len(stats['partitions_dropped'])} partitions"
+            + ('' if stats['completed'] else ' - time budget reached, will resume')
+        )
+        return stats
+    
+    def purge(self, policy, scope, queryset, cutoff, stats):
+        """
+        Delete the expired rows of one scope batch by batch.
+        Returns False if the time budget ran out before the scope was done.
+        """
+        checkpoint_key = f'retention:{policy.label}:{scope}'
+        last_pk = self.load_checkpoint(checkpoint_key, cutoff)
+        pk_name = policy.model._meta.pk.name
+        
+        while True:
+            if not self.time_left():
+                return False
+            
+            batch = queryset.order_by(pk_name)
+            if last_pk is not None:
+                batch = batch.filter(**{f'{pk_name}__gt': last_pk})
+            pks = list(batch.values_list(pk_name, flat=True)[:self.batch_size])
+            if not pks:
+                break
+            
+            with transaction.atomic():
+                if self.archive_dir:
+                    stats['archived'] += self.archive(policy, cutoff, pks)
+                stats['deleted'] += self.delete_rows(policy.model, pks)
+                last_pk = pks[-1]
+                self.save_checkpoint(checkpoint_key, cutoff, last_pk)
+            
+            stats['batches'] += 1
+            if len(pks) < self.batch_size:
+                break
+            
+            time.sleep(self.sleep_seconds)
+        
+        SystemSetting.objects.filter(key=checkpoint_key).delete()
+        return True
+    
+    def delete_rows(self, model, pks):
+        """Delete rows by primary key with one raw statement."""
+        table = connection.ops.quote_name(model._meta.db_table)
+        column = connection.ops.quote_name(model._meta.pk.column)
+        placeholders = ', '.join(['%s'] * len(pks))
+        params = [model._meta.pk.get_db_prep_value(pk, connection) for pk in pks]
+        
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table} WHERE {column} IN ({placeholders})', params)
+            return cursor.rowcount
+    
+    def archive(self, policy, cutoff, pks):
+        """Append the rows to the policy's gzip JSON lines archive."""
+        directory = self.archive_dir / policy.label
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'{cutoff:%Y%m%d}.jsonl.gz'
+        
+        rows = policy.model._base_manager.filter(pk__in=pks).values()
+        count = 0
+        with gzip.open(path, 'at', encoding='utf-8') as archive:
+            for row in rows.iterator():
+                archive.write(json.dumps(row, cls=DjangoJSONEncoder))
+                archive.write('\n')
+                count += 1
+        return count
+    
+    def load_checkpoint(self, key, cutoff):
+        """Return the last purged primary key if a previous run with the same cutoff stopped early."""
+        value = SystemSetting.get_setting(key)
+        if not value:
+            return None
+        
+        checkpoint = json.loads(value)
+        if checkpoint.get('cutoff') != cutoff.isoformat():
+            return None
+        return checkpoint['last_pk']
+    
+    def save_checkpoint(self, key, cutoff, last_pk):
+        SystemSetting.objects.update_or_create(
+            key=key,
+            defaults={
+                'value': json.dumps({'cutoff': cutoff.isoformat(), 'last_pk': str(last_pk)}),
+                'description': 'Retention progress checkpoint',
+            }
+        )
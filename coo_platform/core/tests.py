@@ -0,0 +1,130 @@
+"""
+Tests for the query instrumentation and the per-endpoint query budgets.
+"""
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+import io
+
+from django.contrib.auth.models import User
+from kpis.models import SmartKPI
+from projects.models import Project, ProjectMembership, Task
+from tenants.models import Tenant, TenantUser
+from .benchmarks import BenchmarkSuite
+from .management.commands.generate_load_data import copy_fields
+from .models import UserProfile
+from .instrumentation import QueryBudgetExceeded, collect
+
+
+def instrumentation_settings(**overrides):
+    """``COO_PLATFORM_SETTINGS`` with the given instrumentation settings."""
+    return {
+        **settings.COO_PLATFORM_SETTINGS,
+        'INSTRUMENTATION': {**settings.COO_PLATFORM_SETTINGS.get('INSTRUMENTATION', {}), **overrides},
+    }
+
+
+@override_settings(COO_PLATFORM_SETTINGS=instrumentation_settings(STRICT_QUERY_BUDGETS=True))
+class StrictBudgetTests(SimpleTestCase):
+    
+    def test_over_budget_block_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            with collect('test.over_budget', budget=0) as collector:
+                collector.add_query('SELECT ?', 0.0)
+    
+    def test_block_exception_is_not_replaced(self):
+        with self.assertRaises(KeyError):
+            with collect('test.failing', budget=0) as collector:
+                collector.add_query('SELECT ?', 0.0)
+                raise KeyError('widget')
+    
+    @override_settings(COO_PLATFORM_SETTINGS=instrumentation_settings(STRICT_QUERY_BUDGETS=False))
+    def test_lenient_budgets_only_log(self):
+        with self.assertLogs('coo_platform.performance', 'WARNING'):
+            with collect('test.lenient', budget=0) as collector:
+                collector.add_query('SELECT ?', 0.0)
+
+
+class EndpointBudgetTests(TestCase):
+    """The calibrated budgets of settings.py hold for a generated tenant."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'generate_load_data', tenants=1, users=3, projects=3, tasks=30,
+            kpis=20, datapoints=200, rules=2, stdout=io.StringIO()
+        )
+    
+    def setUp(self):
+        self.client = BenchmarkSuite(Tenant.objects.get(), iterations=1, warmup=0).client
+    
+    @override_settings(COO_PLATFORM_SETTINGS=instrumentation_settings(STRICT_QUERY_BUDGETS=True))
+    def test_platform_analytics_within_budget(self):
+        response = self.client.get('/api/v1/analytics/platform/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+    
+    @override_settings(COO_PLATFORM_SETTINGS=instrumentation_settings(
+        STRICT_QUERY_BUDGETS=True, QUERY_BUDGETS={'api:platform_analytics': 1}
+    ))
+    def test_platform_analytics_over_budget_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/api/v1/analytics/platform/', HTTP_ACCEPT='application/json')
+
+
+class ListQueryCountTests(TestCase):
+    """A list page costs as many queries for one object as for a full page."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'generate_load_data', tenants=1, users=3, projects=2, tasks=20,
+            kpis=20, datapoints=200, rules=2, stdout=io.StringIO()
+        )
+    
+    def setUp(self):
+        self.client = BenchmarkSuite(Tenant.objects.get(), iterations=1, warmup=0).client
+    
+    def get(self, url):
+        response = self.client.get(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+    
+    def assertConstantQueries(self, url, queryset):
+        self.get(url)
+        with CaptureQueriesContext(connection) as page:
+            self.assertGreater(len(self.get(url)['results']), 1)
+        
+        queryset.exclude(pk=queryset.values('pk')[:1]).delete()
+        with self.assertNumQueries(len(page.captured_queries)):
+            self.assertEqual(len(self.get(url)['results']), 1)
+    
+    def test_kpi_list(self):
+        self.assertConstantQueries('/api/v1/kpis/', SmartKPI.objects.all())
+    
+    def test_task_list(self):
+        self.assertConstantQueries('/api/v1/tasks/', Task.objects.all())
+
+
+class CopyFieldsTests(SimpleTestCase):
+    """COPY leaves auto-generated primary keys to the database."""
+    
+    def columns(self, model):
+        return [field.column for field in copy_fields(model)]
+    
+    def test_auto_primary_keys_are_left_out(self):
+        for model in (User, UserProfile, TenantUser, ProjectMembership, Task.depends_on.through):
+            with self.subTest(model=model.__name__):
+                self.assertNotIn('id', self.columns(model))
+                self.assertEqual(len(self.columns(model)), len(model._meta.concrete_fields) - 1)
+    
+    def test_uuid_primary_keys_are_copied(self):
+        self.assertIn('id', self.columns(Project))
+        self.assertIn('id', self.columns(Task))
+    
+    def test_foreign_keys_are_copied(self):
+        self.assertIn('user_id', self.columns(UserProfile))
+        self.assertEqual(
+            sorted(self.columns(Task.depends_on.through)), ['from_task_id', 'to_task_id']
+        )
@@ -18,4 +18,7 @@ urlpatterns = [
     
     # Search
     path('search/', views.search_global, name='search'),
+    
+    # Instrumentation
+    path('metrics/', views.metrics, name='metrics'),
 ]
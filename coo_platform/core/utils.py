@@ -2,6 +2,8 @@
 Utility functions for the core app.
 """
 from django.contrib.auth.models import User
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
 from django.utils import timezone
 from .models import AuditLog
 
@@ -42,6 +44,51 @@ def get_client_ip(request):
     return ip
 
 
+def top_n_per_group(queryset, partition_by, order_by, n):
+    """
+    Limit ``queryset`` to the first ``n`` rows of each ``partition_by``
+    group in ``order_by`` order (e.g. the latest N data points of every
+    KPI), with a ROW_NUMBER() window in a single query.
+    
+    Args:
+        queryset: QuerySet to limit
+        partition_by: Field name (or list of names) defining the groups
+        order_by: Ordering within each group, e.g. '-date'
+        n: Rows kept per group
+    """
+    if isinstance(partition_by, str):
+        partition_by = [partition_by]
+    
+    return queryset.annotate(
+        group_rank=Window(
+            RowNumber(),
+            partition_by=[F(field) for field in partition_by],
+            order_by=order_by
+        )
+    ).filter(group_rank__lte=n)
+
+
+def keyset_after(queryset, fields, values):
+    """
+    Limit ``queryset`` to the rows after ``values`` in the ascending
+    ``fields`` order, for keyset (cursor) pagination: the next page is read
+    from where the previous one ended instead of with an OFFSET.
+    
+    Args:
+        queryset: QuerySet ordered by ``fields``
+        fields: Field or annotation names making a unique ordering (the last is usually the pk)
+        values: Values of ``fields`` in the last row of the previous page
+    """
+    # (a, b, c) > (x, y, z)  <=>  a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+    condition = Q()
+    for index, field in enumerate(fields):
+        step = Q(**{f'{field}__gt': values[index]})
+        for previous_field, previous_value in zip(fields[:index], values[:index]):
+            step &= Q(**{previous_field: previous_value})
+        condition |= step
+    return queryset.filter(condition)
+
+
 def create_notification(recipient, title, message, notification_type='info', 
                        action_url='', action_label='', metadata=None):
     """
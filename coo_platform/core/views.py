@@ -5,11 +5,13 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import TemplateView, ListView
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseForbidden
 from django.contrib import messages
 from django.db.models import Q
+from django.utils.crypto import constant_time_compare
 from .models import Notification, AuditLog
 from .utils import log_user_action
+from .instrumentation import registry, get_instrumentation_settings
 
 
 class DashboardMixin(LoginRequiredMixin):
@@ -228,4 +230,24 @@ def notifications_api(request):
         'unread_count': request.user.notifications.filter(is_read=False).count()
     }
     
-    return JsonResponse(data)
\ No newline at end of file
+    return JsonResponse(data)
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint for the request instrumentation metrics.
+    
+    Accessible to superusers, or with ``Authorization: Bearer <token>`` when
+    a METRICS_TOKEN is configured.
+    """
+    token = get_instrumentation_settings()['METRICS_TOKEN']
+    auth_header = request.META.get('HTTP_AUTHORIZATION', '')
+    
+    has_token = bool(token) and constant_time_compare(auth_header, f'Bearer {token}')
+    if not has_token and not request.user.is_superuser:
+        return HttpResponseForbidden('Metrics access denied')
+    
+    return HttpResponse(
+        registry.render_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
\ No newline at end of file
@@ -3,19 +3,36 @@ WebSocket consumers for real-time dashboard updates.
 """
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
-from django.contrib.auth.models import User
-from .models import UserDashboard, DashboardWidget
+from django.utils import timezone
+from core.instrumentation import InstrumentedConsumerMixin
+from .deltas import get_state, snapshot_frame, update_frame, update_state
+from .models import DashboardWidget
+from .realtime import USER_SPECIFIC_WIDGETS, coalesce, database_task, decode, encode, get_widget_acl
 
 
-class DashboardConsumer(AsyncWebsocketConsumer):
+class DashboardConsumer(InstrumentedConsumerMixin, AsyncWebsocketConsumer):
     """
     WebSocket consumer for real-time dashboard updates.
+    
+    Frames are encoded with orjson, database work runs in a bounded thread
+    pool, widget ACLs are cached per user and concurrent requests for the
+    same widget data share one load (see dashboard.realtime).
+    
+    Widget payloads are versioned (see dashboard.deltas): subscribing sends a
+    ``widget_snapshot``; clients acknowledge versions with
+    ``{"type": "widget_ack", "widget_id", "version"}`` and then receive
+    updates as ``widget_patch`` frames (JSON patch from ``base_version``),
+    or a new snapshot when they are not at the base version.
     """
     
+    async def send_json_frame(self, payload):
+        await self.send(text_data=encode(payload))
+    
     async def connect(self):
         """Handle WebSocket connection."""
         self.user = self.scope["user"]
+        # Subscribed widget ids -> version acknowledged by the client
+        self.widget_versions = {}
         self.dashboard_id = self.scope['url_route']['kwargs'].get('dashboard_id')
         
         # Only authenticated users can connect
@@ -39,10 +56,10 @@ class DashboardConsumer(AsyncWebsocketConsumer):
         await self.accept()
         
         # Send initial connection message
-        await self.send(text_data=json.dumps({
+        await self.send_json_frame({
             'type': 'connection_established',
             'message': 'Connected to dashboard updates'
-        }))
+        })
     
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection."""
@@ -52,11 +69,14 @@ class DashboardConsumer(AsyncWebsocketConsumer):
                 self.dashboard_group_name,
                 self.channel_name
             )
+        
+        for widget_id in getattr(self, 'widget_versions', {}):
+            await self.channel_layer.group_discard(f'widget_{widget_id}', self.channel_name)
     
     async def receive(self, text_data):
         """Handle messages from WebSocket."""
         try:
-            text_data_json = json.loads(text_data)
+            text_data_json = decode(text_data)
             message_type = text_data_json.get('type')
             
             if message_type == 'subscribe_widget':
@@ -68,12 +88,17 @@ class DashboardConsumer(AsyncWebsocketConsumer):
                 widget_id = text_data_json.get('widget_id')
                 if widget_id:
                     await self.send_widget_update(widget_id)
-                    
+            
+            elif message_type == 'widget_ack':
+                widget_id = text_data_json.get('widget_id')
+                if widget_id in self.widget_versions:
+                    self.widget_versions[widget_id] = text_data_json.get('version')
+        
         except json.JSONDecodeError:
-            await self.send(text_data=json.dumps({
+            await self.send_json_frame({
                 'type': 'error',
                 'message': 'Invalid JSON format'
-            }))
+            })
     
     async def subscribe_to_widget(self, widget_id):
         """Subscribe to updates for a specific widget."""
@@ -87,79 +112,110 @@ class DashboardConsumer(AsyncWebsocketConsumer):
                 self.channel_name
             )
             
-            await self.send(text_data=json.dumps({
+            await self.send_json_frame({
                 'type': 'widget_subscribed',
                 'widget_id': widget_id
-            }))
+            })
+            
+            # Full snapshot on (re)subscribe
+            self.widget_versions[widget_id] = None
+            state = await self.get_widget_state(widget_id)
+            if state:
+                await self.send_json_frame({**snapshot_frame(widget_id, state), 'timestamp': timezone.now().isoformat()})
         else:
-            await self.send(text_data=json.dumps({
+            await self.send_json_frame({
                 'type': 'error',
                 'message': 'Access denied for widget'
-            }))
+            })
     
     async def send_widget_update(self, widget_id):
         """Send widget data update."""
-        widget_data = await self.get_widget_data(widget_id)
+        widget_type = (await self.get_widget_acl()).get(str(widget_id))
+        if widget_type is None:
+            await self.send_json_frame({
+                'type': 'error',
+                'message': 'Access denied for widget'
+            })
+            return
         
-        if widget_data:
-            await self.send(text_data=json.dumps({
-                'type': 'widget_update',
-                'widget_id': widget_id,
-                'data': widget_data,
-                'timestamp': json.dumps(timezone.now(), default=str)
-            }))
+        state = await self.load_widget_state(widget_id, widget_type)
+        if not state:
+            return
+        
+        frame = update_frame(widget_id, state, self.widget_versions.get(widget_id))
+        if frame is None:
+            frame = {'type': 'widget_unchanged', 'widget_id': widget_id, 'version': state['version']}
+        await self.send_json_frame({**frame, 'timestamp': timezone.now().isoformat()})
     
-    @database_sync_to_async
-    def check_widget_access(self, widget_id):
+    def state_user_id(self, widget_type):
+        """User the widget state is kept for (None for widgets shared by all users)."""
+        return self.user.id if widget_type in USER_SPECIFIC_WIDGETS else None
+    
+    async def load_widget_state(self, widget_id, widget_type):
+        """Load fresh widget data and record it as the widget's latest state."""
+        user_id = self.state_user_id(widget_type)
+        
+        # Sockets asking for the same widget at once share one load
+        return await coalesce(
+            ('widget', str(widget_id), user_id),
+            lambda: database_task(self._load_widget_state)(widget_id, user_id)
+        )
+    
+    async def get_widget_state(self, widget_id):
+        """The widget's latest recorded state, loading it if there is none."""
+        widget_type = (await self.get_widget_acl()).get(str(widget_id))
+        state = await database_task(get_state)(widget_id, self.state_user_id(widget_type))
+        return state or await self.load_widget_state(widget_id, widget_type)
+    
+    async def get_widget_acl(self):
+        """The user's cached widget ACL (queried only after a widget changed)."""
+        return await database_task(get_widget_acl)(self.user)
+    
+    async def check_widget_access(self, widget_id):
         """Check if user has access to a widget."""
-        try:
-            widget = DashboardWidget.objects.get(id=widget_id)
-            
-            # Check access permissions
-            if widget.is_public:
-                return True
-            if widget.created_by == self.user:
-                return True
-            if self.user in widget.shared_with.all():
-                return True
-                
-            return False
-        except DashboardWidget.DoesNotExist:
-            return False
+        return str(widget_id) in await self.get_widget_acl()
     
-    @database_sync_to_async
-    def get_widget_data(self, widget_id):
-        """Get widget data."""
+    def _load_widget_state(self, widget_id, user_id):
         try:
-            widget = DashboardWidget.objects.get(id=widget_id)
-            return widget.get_data(user=self.user)
+            widget = DashboardWidget.objects.select_related('tenant').get(id=widget_id)
         except DashboardWidget.DoesNotExist:
             return None
+        return update_state(widget_id, widget.get_data(user=self.user), user_id)
     
     # Handler for different message types
     async def widget_update(self, event):
         """Send widget update to WebSocket."""
-        await self.send(text_data=json.dumps({
-            'type': 'widget_update',
-            'widget_id': event['widget_id'],
-            'data': event['data'],
-            'timestamp': event['timestamp']
-        }))
+        if 'version' not in event:
+            await self.send_json_frame({
+                'type': 'widget_update',
+                'widget_id': event['widget_id'],
+                'data': event['data'],
+                'timestamp': event['timestamp']
+            })
+            return
+        
+        # Versioned update (see publish_widget_update): a patch for clients
+        # at its base version, the event's full data for the others
+        widget_id = event['widget_id']
+        client_version = self.widget_versions.get(widget_id)
+        frame = update_frame(widget_id, event, client_version)
+        if frame is not None:
+            await self.send_json_frame({**frame, 'timestamp': event['timestamp']})
     
     async def dashboard_notification(self, event):
         """Send dashboard notification to WebSocket."""
-        await self.send(text_data=json.dumps({
+        await self.send_json_frame({
             'type': 'notification',
             'title': event['title'],
             'message': event['message'],
             'level': event.get('level', 'info'),
             'timestamp': event['timestamp']
-        }))
+        })
     
     async def system_message(self, event):
         """Send system message to WebSocket."""
-        await self.send(text_data=json.dumps({
+        await self.send_json_frame({
             'type': 'system_message',
             'message': event['message'],
             'timestamp': event['timestamp']
-        }))
+        })
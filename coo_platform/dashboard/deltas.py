@@ -0,0 +1,196 @@
+"""
+Versioned widget state and JSON-patch style deltas.
+
+The latest payload of each widget (per user for user-specific widgets) is
+kept in the cache with a version number and the patch (RFC 6902 ``add`` /
+``remove`` / ``replace`` operations) that leads to it from the previous
+version. Clients that acknowledged the previous version receive only the
+patch; the others, and clients (re)subscribing, receive a full snapshot.
+
+Versions are only comparable between processes when the cache is shared
+(Redis): with a per-process cache, ``publish_widget_update`` sends plain
+full updates instead of versioned ones.
+"""
+from django.core.cache import cache
+from django.utils import timezone
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+import copy
+
+import orjson
+
+STATE_TIMEOUT = 24 * 3600
+
+
+def _pointer(path, key):
+    return f"{path}/{str(key).replace('~', '~0').replace('/', '~1')}"
+
+
+def _unpointer(part):
+    return part.replace('~1', '/').replace('~0', '~')
+
+
+def diff(old, new, path=''):
+    """Return the patch operations turning ``old`` into ``new``."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = [{'op': 'remove', 'path': _pointer(path, key)} for key in old if key not in new]
+        for key, value in new.items():
+            if key in old:
+                ops.extend(diff(old[key], value, _pointer(path, key)))
+            else:
+                ops.append({'op': 'add', 'path': _pointer(path, key), 'value': value})
+        return ops
+    
+    if isinstance(old, list) and isinstance(new, list):
+        common = min(len(old), len(new))
+        ops = []
+        for index in range(common):
+            ops.extend(diff(old[index], new[index], _pointer(path, index)))
+        for index in range(common, len(new)):
+            ops.append({'op': 'add', 'path': _pointer(path, index), 'value': new[index]})
+        # Trailing removals from the end, so earlier indexes stay valid
+        for index in reversed(range(common, len(old))):
+            ops.append({'op': 'remove', 'path': _pointer(path, index)})
+        return ops
+    
+    if type(old) is type(new) and old == new:
+        return []
+    return [{'op': 'replace', 'path': path, 'value': new}]
+
+
+def apply_patch(document, patch):
+    """Apply ``patch`` (as produced by ``diff``) to a copy of ``document``."""
+    document = copy.deepcopy(document)
+    for op in patch:
+        if not op['path']:
+            document = copy.deepcopy(op['value'])
+            continue
+        
+        *parents, last = [_unpointer(part) for part in op['path'].split('/')[1:]]
+        target = document
+        for part in parents:
+            target = target[int(part)] if isinstance(target, list) else target[part]
+        
+        if isinstance(target, list):
+            index = int(last)
+            if op['op'] == 'add':
+                target.insert(index, op['value'])
+            elif op['op'] == 'remove':
+                del target[index]
+            else:
+                target[index] = op['value']
+        elif op['op'] == 'remove':
+            del target[last]
+        else:
+            target[last] = op['value']
+    return document
+
+
+def state_key(widget_id, user_id=None):
+    return f'widget-state:{widget_id}:{user_id or "shared"}'
+
+
+def get_state(widget_id, user_id=None):
+    """The latest ``{'version', 'base_version', 'patch', 'data'}`` of a widget, or None."""
+    return cache.get(state_key(widget_id, user_id))
+
+
+def update_state(widget_id, data, user_id=None):
+    """
+    Record ``data`` as the widget's latest payload. Returns the new state, or
+    the current one unchanged if ``data`` did not change. The state's patch
+    is None when it is not smaller than the snapshot.
+    """
+    key = state_key(widget_id, user_id)
+    current = cache.get(key)
+    
+    # Round trip through JSON so comparisons see what clients see
+    data = orjson.loads(orjson.dumps(data, default=str))
+    if current is not None and current['data'] == data:
+        return current
+    
+    # Versions are allocated atomically, so concurrent writers never reuse one
+    version_key = f'{key}:version'
+    cache.add(version_key, current['version'] if current is not None else 0, STATE_TIMEOUT)
+    try:
+        version = cache.incr(version_key)
+    except ValueError:
+        version = (current['version'] if current is not None else 0) + 1
+        cache.set(version_key, version, STATE_TIMEOUT)
+    
+    patch = None
+    if current is not None:
+        patch = diff(current['data'], data)
+        if len(orjson.dumps(patch)) >= len(orjson.dumps(data)):
+            patch = None
+    
+    state = {
+        'version': version,
+        'base_version': current['version'] if current is not None else None,
+        'patch': patch,
+        'data': data,
+    }
+    cache.set(key, state, STATE_TIMEOUT)
+    return state
+
+
+def snapshot_frame(widget_id, state):
+    return {
+        'type': 'widget_snapshot',
+        'widget_id': widget_id,
+        'version': state['version'],
+        'data': state['data'],
+    }
+
+
+def update_frame(widget_id, state, client_version):
+    """
+    The frame bringing a client at ``client_version`` to ``state``: None if
+    it is up to date, a patch if it acknowledged the previous version, else
+    a snapshot.
+    """
+    if client_version == state['version']:
+        return None
+    if state['patch'] is not None and client_version == state['base_version']:
+        return {
+            'type': 'widget_patch',
+            'widget_id': widget_id,
+            'version': state['version'],
+            'base_version': state['base_version'],
+            'patch': state['patch'],
+        }
+    return snapshot_frame(widget_id, state)
+
+
+def publish_widget_update(widget):
+    """
+    Recompute the payload of a (not user-specific) widget and, if it
+    changed, send it to its subscribers. Returns the new version, or None if
+    nothing changed.
+    
+    The event carries the patch and the full data, so consumers whose
+    clients are not at the patch's base version send a snapshot without
+    reading the state back.
+    """
+    from .realtime import has_shared_cache
+    
+    previous = get_state(widget.id)
+    state = update_state(widget.id, widget.get_data())
+    if previous is not None and previous['version'] == state['version']:
+        return None
+    
+    event = {
+        'type': 'widget_update',
+        'widget_id': str(widget.id),
+        'data': state['data'],
+        'timestamp': timezone.now().isoformat(),
+    }
+    if has_shared_cache():
+        event.update({
+            'version': state['version'],
+            'base_version': state['base_version'],
+            'patch': state['patch'],
+        })
+    
+    async_to_sync(get_channel_layer().group_send)(f'widget_{widget.id}', event)
+    return state['version']
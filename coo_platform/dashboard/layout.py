@@ -0,0 +1,137 @@
+"""
+Dashboard layout persistence.
+
+A submitted layout is a list of ``{"id", "x", "y", "w", "h"}`` items, one
+per widget placement. ``save_layout`` merges it over the current
+placements, checks in memory that the resulting grid has no overlapping or
+out-of-bounds widgets, and writes only the placements that moved or were
+resized with one ``bulk_update``, all in one transaction.
+
+Layouts are versioned: the client sends the ``layout_version`` it edited,
+and the save bumps it with a conditional UPDATE, so a concurrent edit makes
+the later save fail with ``LayoutConflict`` instead of silently mixing the
+two layouts.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DashboardWidgetPlacement, UserDashboard
+
+DEFAULT_COLUMNS = 12
+
+LAYOUT_FIELDS = {'x': 'position_x', 'y': 'position_y', 'w': 'width', 'h': 'height'}
+
+
+class LayoutError(Exception):
+    """Raised when a submitted layout is invalid."""
+
+
+class LayoutConflict(LayoutError):
+    """Raised when the layout was changed since the version the client edited."""
+    
+    def __init__(self, current_version):
+        super().__init__('The dashboard layout was changed by another session. Reload and try again.')
+        self.current_version = current_version
+
+
+def parse_layout(items):
+    """
+    Return ``{placement_id: {'x', 'y', 'w', 'h'}}`` from the submitted
+    items. Missing coordinates are left out (they keep their current value).
+    """
+    if not isinstance(items, list):
+        raise LayoutError('Layout must be a list of widget positions')
+    
+    layout = {}
+    for item in items:
+        if not isinstance(item, dict) or not item.get('id'):
+            raise LayoutError('Every layout item needs an id')
+        
+        position = {}
+        for key in LAYOUT_FIELDS:
+            if item.get(key) is None:
+                continue
+            try:
+                value = int(item[key])
+            except (TypeError, ValueError):
+                raise LayoutError(f"Invalid {key} for widget {item['id']}")
+            if value < (1 if key in ('w', 'h') else 0):
+                raise LayoutError(f"Invalid {key} for widget {item['id']}")
+            position[key] = value
+        
+        layout[str(item['id'])] = position
+    return layout
+
+
+def find_collisions(rects, columns):
+    """
+    Return the ``(id, id)`` pairs of overlapping rectangles and the ids of
+    rectangles wider than the grid. ``rects`` is ``{id: (x, y, w, h)}``.
+    """
+    out_of_bounds = [rect_id for rect_id, (x, y, w, h) in rects.items() if x + w > columns]
+    
+    # Sweep by row: only rectangles starting above the bottom of the current one can overlap it
+    ordered = sorted(rects.items(), key=lambda item: (item[1][1], item[1][0]))
+    overlaps = []
+    for index, (first_id, (x1, y1, w1, h1)) in enumerate(ordered):
+        for second_id, (x2, y2, w2, h2) in ordered[index + 1:]:
+            if y2 >= y1 + h1:
+                break
+            if x2 < x1 + w1 and x1 < x2 + w2:
+                overlaps.append((first_id, second_id))
+    
+    return overlaps, out_of_bounds
+
+
+def save_layout(dashboard, items, version=None):
+    """
+    Apply the submitted layout ``items`` to ``dashboard``. ``version`` is
+    the ``layout_version`` the client edited (None: the version of
+    ``dashboard`` as loaded).
+    Returns ``{'version', 'updated'}``; raises ``LayoutError`` for invalid
+    layouts and ``LayoutConflict`` for stale versions.
+    """
+    layout = parse_layout(items)
+    version = dashboard.layout_version if version is None else version
+    columns = (dashboard.layout_config or {}).get('columns', DEFAULT_COLUMNS)
+    
+    with transaction.atomic():
+        # The conditional bump also locks the dashboard row until commit,
+        # so concurrent saves of the same dashboard are serialized
+        dashboards = UserDashboard.objects.filter(pk=dashboard.pk, layout_version=version)
+        if not dashboards.update(layout_version=F('layout_version') + 1, updated_at=timezone.now()):
+            current = UserDashboard.objects.filter(pk=dashboard.pk).values_list('layout_version', flat=True).first()
+            raise LayoutConflict(current)
+        
+        placements = list(dashboard.widget_placements.only('id', 'dashboard', *LAYOUT_FIELDS.values()))
+        
+        # Placements not in the layout keep their position (unknown ids are ignored)
+        changed = []
+        rects = {}
+        for placement in placements:
+            position = layout.get(str(placement.id), {})
+            updated = False
+            for key, field in LAYOUT_FIELDS.items():
+                if key in position and getattr(placement, field) != position[key]:
+                    setattr(placement, field, position[key])
+                    updated = True
+            if updated:
+                changed.append(placement)
+            rects[str(placement.id)] = (
+                placement.position_x, placement.position_y, placement.width, placement.height
+            )
+        
+        overlaps, out_of_bounds = find_collisions(rects, columns)
+        if out_of_bounds:
+            raise LayoutError(f'{len(out_of_bounds)} widget(s) extend beyond the {columns} grid columns')
+        if overlaps:
+            raise LayoutError(f'{len(overlaps)} pair(s) of widgets overlap')
+        
+        now = timezone.now()
+        for placement in changed:
+            placement.updated_at = now
+        DashboardWidgetPlacement.objects.bulk_update(changed, [*LAYOUT_FIELDS.values(), 'updated_at'])
+    
+    dashboard.layout_version = version + 1
+    return {'version': dashboard.layout_version, 'updated': len(changed)}
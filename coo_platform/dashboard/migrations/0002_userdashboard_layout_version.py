@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userdashboard',
+            name='layout_version',
+            field=models.PositiveIntegerField(default=0, help_text='Incremented on every layout save, for optimistic locking'),
+        ),
+    ]
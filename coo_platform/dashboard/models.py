@@ -6,6 +6,7 @@ from django.contrib.auth.models import User
 from django.utils import timezone
 from core.models import TimeStampedModel, UUIDModel
 from tenants.models import TenantAwareModel
+from core.instrumentation import collect
 from datetime import datetime, timedelta
 
 
@@ -87,6 +88,10 @@ class DashboardWidget(UUIDModel, TenantAwareModel, TimeStampedModel):
         if not self.is_active:
             return {'error': 'Widget is not active'}
         
+        with collect(f'widget:{self.widget_type}'):
+            return self._get_data(user)
+    
+    def _get_data(self, user):
         try:
             if self.widget_type == 'kpi_summary':
                 return self._get_kpi_summary_data()
@@ -318,6 +323,10 @@ class UserDashboard(UUIDModel, TenantAwareModel, TimeStampedModel):
         default=dict,
         help_text="Dashboard layout and grid configuration"
     )
+    layout_version = models.PositiveIntegerField(
+        default=0,
+        help_text="Incremented on every layout save, for optimistic locking"
+    )
     
     # Settings
     auto_refresh = models.BooleanField(default=True)
@@ -0,0 +1,138 @@
+"""
+Helpers for the dashboard WebSocket consumer.
+
+- Frames are encoded and decoded with orjson.
+- Database work runs in a bounded thread pool (instead of the single
+  thread-sensitive executor), so slow queries cannot pile up threads.
+- Widget ACLs are scoped to the user's tenants and, with a cache shared by
+  all processes, cached per user and invalidated by bumping a generation
+  counter whenever a widget, its sharing or a tenant membership changes.
+- Concurrent requests for the same widget data are coalesced into one load.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from channels.db import DatabaseSyncToAsync
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+
+import orjson
+
+DEFAULT_SETTINGS = {
+    'DB_WORKERS': 8,
+    'ACL_CACHE_SECONDS': 300,
+}
+
+ACL_GENERATION_KEY = 'widget-acl-generation'
+
+# Widget types whose data depends on the requesting user
+USER_SPECIFIC_WIDGETS = {'task_list'}
+
+
+def get_realtime_settings():
+    """Return the WebSocket settings merged over the defaults."""
+    configured = settings.COO_PLATFORM_SETTINGS.get('REALTIME', {})
+    return {**DEFAULT_SETTINGS, **configured}
+
+
+def encode(payload):
+    """Encode a frame (datetimes, UUIDs and dataclasses natively, anything else as str)."""
+    return orjson.dumps(payload, default=str).decode()
+
+
+def decode(text):
+    """Decode a frame; raises ``orjson.JSONDecodeError`` (a ``json.JSONDecodeError``)."""
+    return orjson.loads(text)
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=get_realtime_settings()['DB_WORKERS'],
+            thread_name_prefix='ws-db'
+        )
+    return _executor
+
+
+def database_task(func):
+    """Like ``database_sync_to_async``, but run in the bounded WebSocket thread pool."""
+    def wrapper(*args, **kwargs):
+        return DatabaseSyncToAsync(func, thread_sensitive=False, executor=get_executor())(*args, **kwargs)
+    return wrapper
+
+
+def has_shared_cache():
+    """
+    Whether the default cache is shared between processes. Local-memory
+    (and dummy) caches are private to each web, ASGI and Celery process.
+    """
+    from django.core.cache import caches
+    from django.core.cache.backends.dummy import DummyCache
+    from django.core.cache.backends.locmem import LocMemCache
+    
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def get_widget_acl(user):
+    """
+    ``{widget_id: widget_type}`` of the widgets ``user`` may access in the
+    tenants they are an active member of: public, created by or shared with
+    them. Cached until a widget or a membership changes, and only when the
+    cache (and so the invalidation) is shared by every process; with a
+    per-process cache a revoked share would stay open in the other workers.
+    """
+    from tenants.models import TenantUser
+    from .models import DashboardWidget
+    
+    cached = has_shared_cache()
+    if cached:
+        generation = cache.get(ACL_GENERATION_KEY, 0)
+        key = f'widget-acl:{generation}:{user.pk}'
+        acl = cache.get(key)
+        if acl is not None:
+            return acl
+    
+    tenants = TenantUser.objects.filter(user=user, is_active=True).values('tenant_id')
+    acl = {
+        str(widget_id): widget_type
+        for widget_id, widget_type in DashboardWidget.objects.filter(
+            Q(is_public=True) | Q(created_by=user) | Q(shared_with=user),
+            tenant_id__in=tenants
+        ).values_list('id', 'widget_type').distinct()
+    }
+    
+    if cached:
+        cache.set(key, acl, get_realtime_settings()['ACL_CACHE_SECONDS'])
+    return acl
+
+
+def invalidate_widget_acls():
+    """Invalidate every cached widget ACL."""
+    cache.add(ACL_GENERATION_KEY, 0, None)
+    try:
+        cache.incr(ACL_GENERATION_KEY)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(ACL_GENERATION_KEY, 1, None)
+
+
+_inflight = {}
+
+
+async def coalesce(key, load):
+    """
+    Await ``load()``, sharing one call between all callers asking for
+    ``key`` while it is in flight.
+    """
+    future = _inflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(load())
+        _inflight[key] = future
+        future.add_done_callback(lambda done: _inflight.pop(key, None))
+    
+    # Shielded, so one disconnecting caller does not cancel the others' load
+    return await asyncio.shield(future)
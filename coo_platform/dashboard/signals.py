@@ -0,0 +1,28 @@
+"""
+Django signals for dashboard app.
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from tenants.models import TenantUser
+from .models import DashboardWidget
+from .realtime import invalidate_widget_acls
+
+
+@receiver(post_save, sender=DashboardWidget)
+@receiver(post_delete, sender=DashboardWidget)
+def widget_changed(sender, instance, **kwargs):
+    """Widget ownership or visibility may have changed."""
+    invalidate_widget_acls()
+
+
+@receiver(m2m_changed, sender=DashboardWidget.shared_with.through)
+def widget_sharing_changed(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_widget_acls()
+
+
+@receiver(post_save, sender=TenantUser)
+@receiver(post_delete, sender=TenantUser)
+def membership_changed(sender, instance, **kwargs):
+    """Widget ACLs are scoped to the user's active tenant memberships."""
+    invalidate_widget_acls()
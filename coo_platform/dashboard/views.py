@@ -13,6 +13,8 @@ from datetime import datetime, timedelta
 from .models import (
     DashboardWidget, UserDashboard, DashboardWidgetPlacement, DashboardTheme
 )
+from .layout import LayoutConflict, LayoutError, save_layout
+from core.fastjson import FastJsonResponse, loads
 from core.views import DashboardMixin
 from core.utils import log_user_action
 from tenants.middleware import get_current_tenant
@@ -177,7 +179,7 @@ def widget_data_api(request, widget_id):
     """
     tenant = get_current_tenant()
     if not tenant:
-        return JsonResponse({'error': 'No tenant found'}, status=404)
+        return FastJsonResponse({'error': 'No tenant found'}, status=404)
     
     try:
         widget = DashboardWidget.objects.get(
@@ -185,21 +187,21 @@ def widget_data_api(request, widget_id):
             tenant=tenant
         )
     except DashboardWidget.DoesNotExist:
-        return JsonResponse({'error': 'Widget not found'}, status=404)
+        return FastJsonResponse({'error': 'Widget not found'}, status=404)
     
     # Check permissions
     if not widget.is_public and widget.created_by != request.user:
         if request.user not in widget.shared_with.all():
-            return JsonResponse({'error': 'Permission denied'}, status=403)
+            return FastJsonResponse({'error': 'Permission denied'}, status=403)
     
     data = widget.get_data(user=request.user)
     
-    return JsonResponse({
-        'widget_id': str(widget.id),
+    return FastJsonResponse({
+        'widget_id': widget.id,
         'title': widget.title,
         'widget_type': widget.widget_type,
         'data': data,
-        'last_updated': timezone.now().isoformat()
+        'last_updated': timezone.now()
     })
 
 
@@ -218,47 +220,37 @@ def update_dashboard_layout(request):
     try:
         dashboard_id = request.POST.get('dashboard_id')
         layout_data = request.POST.get('layout_data')
+        layout_version = request.POST.get('layout_version')
         
         if not dashboard_id or not layout_data:
             return JsonResponse({'success': False, 'error': 'Missing data'})
         
+        # The version the client edited (see the dashboard page and export), for the optimistic lock
+        if not layout_version:
+            return JsonResponse({'success': False, 'error': 'Missing layout_version'}, status=400)
+        
         dashboard = UserDashboard.objects.get(
             id=dashboard_id,
             user=request.user,
             tenant=tenant
         )
         
-        import json
-        layout = json.loads(layout_data)
-        
-        # Update widget positions
-        for item in layout:
-            widget_placement_id = item.get('id')
-            x = item.get('x', 0)
-            y = item.get('y', 0)
-            w = item.get('w', 2)
-            h = item.get('h', 2)
-            
-            try:
-                placement = DashboardWidgetPlacement.objects.get(
-                    id=widget_placement_id,
-                    dashboard=dashboard
-                )
-                placement.position_x = x
-                placement.position_y = y
-                placement.width = w
-                placement.height = h
-                placement.save()
-            except DashboardWidgetPlacement.DoesNotExist:
-                continue
+        result = save_layout(dashboard, loads(layout_data), version=int(layout_version))
         
         log_user_action(
             request, 'update', 'UserDashboard',
             str(dashboard.id), 'Updated dashboard layout'
         )
         
-        return JsonResponse({'success': True})
-        
+        return JsonResponse({'success': True, **result})
+    
+    except LayoutConflict as e:
+        return JsonResponse(
+            {'success': False, 'error': str(e), 'version': e.current_version},
+            status=409
+        )
+    except (LayoutError, ValueError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
@@ -406,11 +398,13 @@ def dashboard_export(request):
         export_data = {
             'dashboard_name': dashboard.name,
             'layout_config': dashboard.layout_config,
+            'layout_version': dashboard.layout_version,
             'widgets': []
         }
         
         for placement in dashboard.get_widgets():
             export_data['widgets'].append({
+                'placement_id': placement.id,
                 'widget_title': placement.widget.title,
                 'widget_type': placement.widget.widget_type,
                 'widget_config': placement.widget.config,
@@ -435,12 +429,12 @@ def real_time_updates(request):
     """
     tenant = get_current_tenant()
     if not tenant:
-        return JsonResponse({'error': 'No tenant found'}, status=404)
+        return FastJsonResponse({'error': 'No tenant found'}, status=404)
     
     # Get widgets that need updating
     widget_ids = request.GET.getlist('widget_ids')
     if not widget_ids:
-        return JsonResponse({'updates': []})
+        return FastJsonResponse({'updates': []})
     
     updates = []
     
@@ -459,10 +453,10 @@ def real_time_updates(request):
                 updates.append({
                     'widget_id': widget_id,
                     'data': data,
-                    'timestamp': timezone.now().isoformat()
+                    'timestamp': timezone.now()
                 })
                 
         except DashboardWidget.DoesNotExist:
             continue
     
-    return JsonResponse({'updates': updates})
+    return FastJsonResponse({'updates': updates})
@@ -8,7 +8,7 @@ from django.utils.safestring import mark_safe
 from django.db.models import Count
 from .models import (
     KPICategory, SmartKPI, KPIDataPoint, KPIAlert, 
-    KPIDashboard, DashboardKPI
+    KPIAnomalyState, KPIDashboard, DashboardKPI
 )
 
 
@@ -308,6 +308,20 @@ class KPIAlertAdmin(admin.ModelAdmin):
     resolve_alerts.short_description = 'Resolve selected alerts'
 
 
+@admin.register(KPIAnomalyState)
+class KPIAnomalyStateAdmin(admin.ModelAdmin):
+    list_display = (
+        'kpi', 'sample_count', 'mean', 'last_value',
+        'last_zscore', 'is_anomalous', 'updated_at'
+    )
+    list_filter = ('is_anomalous', 'kpi__tenant')
+    search_fields = ('kpi__name',)
+    readonly_fields = (
+        'kpi', 'sample_count', 'mean', 'variance', 'last_date',
+        'last_value', 'last_zscore', 'is_anomalous', 'created_at', 'updated_at'
+    )
+
+
 class DashboardKPIInline(admin.TabularInline):
     model = DashboardKPI
     extra = 0
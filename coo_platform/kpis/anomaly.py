@@ -0,0 +1,297 @@
+"""
+Streaming anomaly detection for KPI values.
+
+Each KPI keeps an exponentially weighted mean and variance in a compact
+KPIAnomalyState row. A new data point is scored against the statistics
+before it (z-score) and then folded into them, so detection costs O(1) per
+data point and never re-reads the history. ``backfill_tenant`` rebuilds the
+states of a whole tenant from the stored history with NumPy, a chunk of
+KPIs at a time, stepping through time with the KPIs of a chunk processed as
+one vector.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+import logging
+import math
+
+import numpy as np
+
+from .models import KPIAlert, KPIAnomalyState, KPIDataPoint, SmartKPI
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'ALPHA': 0.1,
+    'Z_THRESHOLD': 3.0,
+    'MIN_SAMPLES': 10,
+    # KPIs whose history is loaded at once by backfill_tenant
+    'CHUNK_SIZE': 500,
+}
+
+# Keeps z-scores finite when a flat series suddenly moves
+MIN_STD = 1e-9
+MAX_ZSCORE = 100.0
+
+
+def get_anomaly_settings():
+    """Return the anomaly detection settings merged over the defaults."""
+    configured = settings.COO_PLATFORM_SETTINGS.get('ANOMALY', {})
+    return {**DEFAULT_SETTINGS, **configured}
+
+
+def zscore(value, mean, variance):
+    std = max(math.sqrt(variance), MIN_STD * max(1.0, abs(mean)))
+    return max(-MAX_ZSCORE, min(MAX_ZSCORE, (value - mean) / std))
+
+
+def update_state(state, value, day, config):
+    """
+    Score ``value`` against ``state`` and fold it into the running
+    statistics. Returns the z-score, or None while the detector warms up.
+    """
+    score = None
+    if state.sample_count >= config['MIN_SAMPLES']:
+        score = zscore(value, state.mean, state.variance)
+    
+    if state.sample_count == 0:
+        state.mean, state.variance = value, 0.0
+    else:
+        # Incremental exponentially weighted mean and variance
+        diff = value - state.mean
+        increment = config['ALPHA'] * diff
+        state.mean += increment
+        state.variance = (1 - config['ALPHA']) * (state.variance + diff * increment)
+    
+    state.sample_count += 1
+    state.last_date = day
+    state.last_value = value
+    state.last_zscore = score
+    state.is_anomalous = score is not None and abs(score) >= config['Z_THRESHOLD']
+    return score
+
+
+def record_datapoint(datapoint):
+    """
+    Update the anomaly state of the data point's KPI and raise or resolve its
+    ``trend_warning`` alert. Data points older than the latest one seen are
+    ignored (they need a backfill). Returns the state, or None if ignored.
+    """
+    config = get_anomaly_settings()
+    
+    with transaction.atomic():
+        state, _ = KPIAnomalyState.objects.select_for_update().get_or_create(kpi_id=datapoint.kpi_id)
+        if state.last_date and datapoint.date <= state.last_date:
+            return None
+        
+        was_anomalous = state.is_anomalous
+        update_state(state, float(datapoint.value), datapoint.date, config)
+        state.save()
+    
+    if state.is_anomalous:
+        raise_anomaly_alert(datapoint.kpi, state, config)
+    elif was_anomalous:
+        KPIAlert.objects.filter(
+            kpi_id=datapoint.kpi_id,
+            alert_type='trend_warning',
+            is_resolved=False
+        ).update(is_resolved=True, resolved_at=timezone.now())
+    
+    return state
+
+
+def record_datapoints(datapoints):
+    """
+    ``record_datapoint`` for a batch of data points written without signals
+    (``KPIDataPoint.objects.upsert``): the states of all their KPIs are
+    locked and saved with one query each and the data points folded in by
+    date, raising or resolving alerts as for single data points. Returns the
+    number of data points recorded.
+    """
+    config = get_anomaly_settings()
+    datapoints = sorted(datapoints, key=lambda datapoint: datapoint.date)
+    kpi_ids = {datapoint.kpi_id for datapoint in datapoints}
+    if not kpi_ids:
+        return 0
+    
+    recorded = 0
+    kpis, changed = {}, {}
+    with transaction.atomic():
+        KPIAnomalyState.objects.bulk_create(
+            [KPIAnomalyState(kpi_id=kpi_id) for kpi_id in kpi_ids],
+            ignore_conflicts=True
+        )
+        states = KPIAnomalyState.objects.select_for_update().in_bulk(kpi_ids)
+        was_anomalous = {kpi_id: state.is_anomalous for kpi_id, state in states.items()}
+        
+        for datapoint in datapoints:
+            state = states[datapoint.kpi_id]
+            if state.last_date and datapoint.date <= state.last_date:
+                continue
+            update_state(state, float(datapoint.value), datapoint.date, config)
+            state.updated_at = timezone.now()
+            kpis[datapoint.kpi_id] = datapoint.kpi
+            changed[datapoint.kpi_id] = state
+            recorded += 1
+        
+        KPIAnomalyState.objects.bulk_update(
+            list(changed.values()),
+            [
+                'sample_count', 'mean', 'variance', 'last_date', 'last_value',
+                'last_zscore', 'is_anomalous', 'updated_at'
+            ],
+            batch_size=1000
+        )
+    
+    for kpi_id, state in changed.items():
+        if state.is_anomalous:
+            raise_anomaly_alert(kpis[kpi_id], state, config)
+    
+    resolved = [kpi_id for kpi_id, state in changed.items() if was_anomalous[kpi_id] and not state.is_anomalous]
+    if resolved:
+        KPIAlert.objects.filter(
+            kpi_id__in=resolved,
+            alert_type='trend_warning',
+            is_resolved=False
+        ).update(is_resolved=True, resolved_at=timezone.now())
+    
+    return recorded
+
+
+def raise_anomaly_alert(kpi, state, config):
+    """Create a ``trend_warning`` alert unless one is already open."""
+    if KPIAlert.objects.filter(kpi=kpi, alert_type='trend_warning', is_resolved=False).exists():
+        return None
+    
+    direction = 'above' if state.last_zscore > 0 else 'below'
+    alert = KPIAlert.objects.create(
+        kpi=kpi,
+        alert_type='trend_warning',
+        severity='critical' if abs(state.last_zscore) >= 2 * config['Z_THRESHOLD'] else 'warning',
+        title=f'{kpi.name} anomalous value',
+        message=(
+            f'Value {state.last_value:g} on {state.last_date} is {abs(state.last_zscore):.1f} standard '
+            f'deviations {direction} the recent average ({state.mean:g})'
+        ),
+        trigger_value=state.last_value,
+    )
+    
+    alert.notify_stakeholders()
+    return alert
+
+
+def load_series(kpi_ids):
+    """
+    Return ``(kpi_ids, last_dates, values)`` for the KPIs ``kpi_ids``
+    having data points, where ``values`` is a KPIs x time matrix of each
+    KPI's values in date order, left aligned and padded with NaN.
+    """
+    rows = KPIDataPoint.objects.filter(
+        kpi_id__in=kpi_ids
+    ).order_by('kpi_id', 'date').values_list('kpi_id', 'date', 'value')
+    
+    ids, dates, values = [], [], []
+    for kpi_id, day, value in rows.iterator(chunk_size=10000):
+        ids.append(kpi_id)
+        dates.append(day)
+        values.append(float(value))
+    
+    if not values:
+        return [], [], np.empty((0, 0))
+    
+    ids = np.array(ids, dtype=object)
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    counts = np.diff(np.r_[starts, len(ids)])
+    rows_index = np.repeat(np.arange(len(starts)), counts)
+    columns_index = np.arange(len(ids)) - np.repeat(starts, counts)
+    
+    matrix = np.full((len(starts), counts.max()), np.nan)
+    matrix[rows_index, columns_index] = values
+    
+    last_rows = starts + counts - 1
+    return list(ids[starts]), [dates[i] for i in last_rows], matrix
+
+
+def backfill_tenant(tenant):
+    """
+    Rebuild the anomaly states of all active KPIs of ``tenant`` from their
+    stored history and return the number of states written. The history is
+    read ``CHUNK_SIZE`` KPIs at a time, so memory stays bounded by the
+    history of one chunk.
+    """
+    config = get_anomaly_settings()
+    kpi_ids = list(
+        SmartKPI.objects.filter(tenant=tenant, is_active=True).order_by('id').values_list('id', flat=True)
+    )
+    
+    rebuilt = 0
+    for start in range(0, len(kpi_ids), config['CHUNK_SIZE']):
+        rebuilt += backfill_states(kpi_ids[start:start + config['CHUNK_SIZE']], config)
+    
+    logger.info(f'Rebuilt {rebuilt} KPI anomaly states for {tenant.name}')
+    return rebuilt
+
+
+def backfill_states(kpi_ids, config):
+    """
+    Rebuild the anomaly states of the KPIs ``kpi_ids`` from their stored
+    history, stepping through time with all of them as one vector. Returns
+    the number of states written.
+    """
+    kpi_ids, last_dates, matrix = load_series(kpi_ids)
+    if not kpi_ids:
+        return 0
+    
+    alpha, threshold = config['ALPHA'], config['Z_THRESHOLD']
+    size = len(kpi_ids)
+    count = np.zeros(size, dtype=np.int64)
+    mean = np.zeros(size)
+    variance = np.zeros(size)
+    last_value = np.full(size, np.nan)
+    last_score = np.full(size, np.nan)
+    
+    # One vectorized step per position in the series, across every KPI at once
+    for column in matrix.T:
+        present = ~np.isnan(column)
+        value = np.where(present, column, 0.0)
+        
+        std = np.maximum(np.sqrt(variance), MIN_STD * np.maximum(1.0, np.abs(mean)))
+        scored = present & (count >= config['MIN_SAMPLES'])
+        score = np.clip((value - mean) / std, -MAX_ZSCORE, MAX_ZSCORE)
+        last_score = np.where(present, np.where(scored, score, np.nan), last_score)
+        
+        first = present & (count == 0)
+        diff = value - mean
+        increment = alpha * diff
+        updated = present & ~first
+        variance = np.where(updated, (1 - alpha) * (variance + diff * increment), variance)
+        mean = np.where(first, value, np.where(updated, mean + increment, mean))
+        last_value = np.where(present, value, last_value)
+        count += present
+    
+    states = [
+        KPIAnomalyState(
+            kpi_id=kpi_ids[i],
+            sample_count=int(count[i]),
+            mean=float(mean[i]),
+            variance=float(variance[i]),
+            last_date=last_dates[i],
+            last_value=float(last_value[i]),
+            last_zscore=None if np.isnan(last_score[i]) else float(last_score[i]),
+            is_anomalous=bool(not np.isnan(last_score[i]) and abs(last_score[i]) >= threshold),
+        )
+        for i in range(size)
+    ]
+    
+    KPIAnomalyState.objects.bulk_create(
+        states,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['kpi'],
+        update_fields=[
+            'sample_count', 'mean', 'variance', 'last_date', 'last_value',
+            'last_zscore', 'is_anomalous', 'updated_at'
+        ]
+    )
+    
+    return size
@@ -11,3 +11,4 @@ class KpisConfig(AppConfig):
     
     def ready(self):
         import kpis.signals  # Import signals when app is ready
+        import kpis.collectors  # Register the data source collectors
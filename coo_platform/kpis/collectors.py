@@ -0,0 +1,309 @@
+"""
+Collectors for the ``api`` and ``database`` KPI data sources.
+
+Both take a batch of KPIs claimed by ``kpis.refresh`` and return their
+values, which the refresh writes with one bulk upsert.
+
+``api`` KPIs are fetched concurrently from an asyncio event loop: requests
+to the same host share a pool of keep-alive connections and are capped per
+host, the blocking socket I/O runs in a bounded thread pool. Only hosts
+listed in the ``API_ALLOWED_HOSTS`` collector setting are fetched. Idle
+connections are dropped after ``API_IDLE_SECONDS``, and a request on a
+reused connection the server has closed meanwhile is retried once on a new
+one.
+``data_source_config``::
+    
+    {"url": "https://...", "method": "GET", "headers": {}, "params": {},
+     "body": null, "value_path": "data.0.value", "timeout": 10}
+
+``database`` KPIs run a single SELECT on one of the database aliases listed
+in the ``DATABASES`` collector setting, in a read-only transaction with a
+statement timeout, over Django's persistent per-alias connections. Results
+are cached, and KPIs sharing a query run it once. ``data_source_config``::
+    
+    {"database": "reporting", "query": "SELECT ...", "params": [],
+     "cache_seconds": 300}
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode, urlsplit
+import asyncio
+import hashlib
+import http.client
+import json
+import logging
+import threading
+import time
+
+from .refresh import register_collector
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'API_MAX_CONNECTIONS': 20,
+    'API_MAX_PER_HOST': 4,
+    'API_TIMEOUT': 10,
+    # Idle keep-alive connections older than this are closed instead of reused
+    'API_IDLE_SECONDS': 30,
+    # Hosts API KPIs may be fetched from (empty: collector disabled)
+    'API_ALLOWED_HOSTS': [],
+    # Database aliases database KPIs may query (empty: collector disabled)
+    'DATABASES': [],
+    'DB_STATEMENT_TIMEOUT_MS': 5000,
+    'DB_CACHE_SECONDS': 300,
+}
+
+
+class CollectorError(Exception):
+    """Raised when the value of a KPI cannot be collected."""
+
+
+def get_collector_settings():
+    """Return the collector settings merged over the defaults."""
+    configured = settings.COO_PLATFORM_SETTINGS.get('COLLECTORS', {})
+    return {**DEFAULT_SETTINGS, **configured}
+
+
+def to_decimal(value):
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, TypeError, ValueError):
+        raise CollectorError(f'Not a number: {value!r}')
+
+
+def extract_value(document, path):
+    """Follow a dotted ``path`` (keys or list indexes) into a JSON document."""
+    value = document
+    for part in filter(None, (path or '').split('.')):
+        try:
+            value = value[int(part)] if isinstance(value, list) else value[part]
+        except (KeyError, IndexError, ValueError, TypeError):
+            raise CollectorError(f"'{path}' not found in response")
+    return to_decimal(value)
+
+
+# API collector
+
+# Errors of a reused keep-alive connection the server closed while it was idle
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError)
+
+
+class ConnectionPool:
+    """Idle keep-alive connections per (scheme, host, port), reused across batches."""
+    
+    def __init__(self):
+        self.idle = defaultdict(list)
+        self.lock = threading.Lock()
+    
+    def acquire(self, key, timeout, max_idle=None):
+        """
+        Return ``(connection, reused)``: the most recently released idle
+        connection not idle for longer than ``max_idle`` seconds, or a new one.
+        """
+        now = time.monotonic()
+        with self.lock:
+            while self.idle[key]:
+                connection, released_at = self.idle[key].pop()
+                if max_idle is None or now - released_at <= max_idle:
+                    return connection, True
+                connection.close()
+        scheme, host, port = key
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return connection_class(host, port, timeout=timeout), False
+    
+    def release(self, key, connection):
+        with self.lock:
+            self.idle[key].append((connection, time.monotonic()))
+    
+    def clear(self):
+        with self.lock:
+            for connections in self.idle.values():
+                for connection, _ in connections:
+                    connection.close()
+            self.idle.clear()
+
+
+pool = ConnectionPool()
+
+
+def fetch(config, timeout, max_idle=None):
+    """Perform one request (blocking) and return the KPI value."""
+    url = urlsplit(config['url'])
+    key = (url.scheme, url.hostname, url.port or (443 if url.scheme == 'https' else 80))
+    
+    path = url.path or '/'
+    query = '&'.join(filter(None, [url.query, urlencode(config.get('params') or {})]))
+    if query:
+        path = f'{path}?{query}'
+    
+    body = config.get('body')
+    headers = {'Accept': 'application/json', **(config.get('headers') or {})}
+    if body is not None and not isinstance(body, (str, bytes)):
+        body = json.dumps(body)
+        headers.setdefault('Content-Type', 'application/json')
+    
+    while True:
+        connection, reused = pool.acquire(key, timeout, max_idle)
+        try:
+            connection.request(config.get('method', 'GET').upper(), path, body=body, headers=headers)
+            response = connection.getresponse()
+            content = response.read()
+        except STALE_CONNECTION_ERRORS:
+            connection.close()
+            if reused:
+                # Closed by the server while idle: retry on a new connection
+                continue
+            raise
+        except Exception:
+            connection.close()
+            raise
+        break
+    
+    if response.will_close:
+        connection.close()
+    else:
+        pool.release(key, connection)
+    
+    if response.status >= 400:
+        raise CollectorError(f'HTTP {response.status} from {url.hostname}')
+    
+    if not config.get('value_path'):
+        try:
+            return to_decimal(content.decode().strip())
+        except CollectorError:
+            pass
+    try:
+        document = json.loads(content)
+    except ValueError:
+        raise CollectorError(f'Invalid JSON from {url.hostname}')
+    return extract_value(document, config.get('value_path'))
+
+
+async def fetch_all(kpis, config):
+    """
+    Fetch every KPI concurrently, at most ``API_MAX_PER_HOST`` requests per
+    host. Returns ``(kpi, value or exception)`` pairs.
+    """
+    loop = asyncio.get_running_loop()
+    limits = defaultdict(lambda: asyncio.Semaphore(config['API_MAX_PER_HOST']))
+    allowed = set(config['API_ALLOWED_HOSTS'])
+    
+    async def fetch_one(kpi, executor):
+        source = kpi.data_source_config or {}
+        host = urlsplit(source.get('url', '')).hostname
+        if not host:
+            raise CollectorError('No url configured')
+        if host not in allowed:
+            raise CollectorError(f'Host {host} is not allowed')
+        
+        async with limits[host]:
+            return await loop.run_in_executor(
+                executor, fetch, source, source.get('timeout', config['API_TIMEOUT']), config['API_IDLE_SECONDS']
+            )
+    
+    with ThreadPoolExecutor(max_workers=config['API_MAX_CONNECTIONS']) as executor:
+        results = await asyncio.gather(
+            *[fetch_one(kpi, executor) for kpi in kpis],
+            return_exceptions=True
+        )
+    return list(zip(kpis, results))
+
+
+@register_collector('api')
+def collect_api(kpis):
+    config = get_collector_settings()
+    values = {}
+    for kpi, result in asyncio.run(fetch_all(kpis, config)):
+        if isinstance(result, Exception):
+            logger.warning(f'Could not collect API KPI {kpi.name}: {result}')
+            continue
+        values[kpi.id] = result
+    return values
+
+
+# Database collector
+
+def validate_query(query):
+    """Only single SELECT (or WITH ... SELECT) statements are accepted."""
+    statement = query.strip().rstrip(';').strip()
+    if not statement.lower().startswith(('select', 'with')) or ';' in statement:
+        raise CollectorError('Only a single SELECT statement is allowed')
+    return statement
+
+
+def run_query(alias, query, params, timeout_ms):
+    """Run ``query`` on ``alias`` read-only with a statement timeout; returns the first column of the first row."""
+    connection = connections[alias]
+    
+    with transaction.atomic(using=alias):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET TRANSACTION READ ONLY')
+                cursor.execute('SET LOCAL statement_timeout = %s', [int(timeout_ms)])
+                cursor.execute(query, params)
+                row = cursor.fetchone()
+            
+            elif connection.vendor == 'sqlite':
+                raw = connection.connection
+                deadline = time.monotonic() + timeout_ms / 1000
+                # A non-zero return from the progress handler interrupts the query
+                raw.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+                cursor.execute('PRAGMA query_only = ON')
+                try:
+                    cursor.execute(query, params)
+                    row = cursor.fetchone()
+                finally:
+                    cursor.execute('PRAGMA query_only = OFF')
+                    raw.set_progress_handler(None, 0)
+            
+            else:
+                raise CollectorError(f'Database collector does not support {connection.vendor}')
+    
+    if not row or row[0] is None:
+        raise CollectorError('Query returned no value')
+    return to_decimal(row[0])
+
+
+@register_collector('database')
+def collect_database(kpis):
+    config = get_collector_settings()
+    allowed = set(config['DATABASES'])
+    
+    # KPIs sharing the same query (and parameters) run it once
+    queries = defaultdict(list)
+    for kpi in kpis:
+        source = kpi.data_source_config or {}
+        alias = source.get('database', 'default')
+        try:
+            if alias not in allowed:
+                raise CollectorError(f"Database '{alias}' is not enabled for collectors")
+            statement = validate_query(source.get('query', ''))
+        except CollectorError as e:
+            logger.warning(f'Could not collect database KPI {kpi.name}: {e}')
+            continue
+        
+        params = tuple(source.get('params') or [])
+        cache_seconds = source.get('cache_seconds', config['DB_CACHE_SECONDS'])
+        queries[(alias, statement, params, cache_seconds)].append(kpi)
+    
+    values = {}
+    for (alias, statement, params, cache_seconds), group in queries.items():
+        key = 'kpi-collector:db:' + hashlib.md5(repr((alias, statement, params)).encode()).hexdigest()
+        value = cache.get(key)
+        
+        if value is None:
+            try:
+                value = run_query(alias, statement, list(params), config['DB_STATEMENT_TIMEOUT_MS'])
+            except Exception as e:
+                logger.warning(f'Could not collect database KPIs {", ".join(kpi.name for kpi in group)}: {e}')
+                continue
+            if cache_seconds:
+                cache.set(key, value, cache_seconds)
+        
+        for kpi in group:
+            values[kpi.id] = value
+    return values
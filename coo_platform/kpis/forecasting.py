@@ -0,0 +1,340 @@
+"""
+KPI forecasting.
+
+A robust linear trend (least squares reweighted with Huber weights) is
+fitted to the recent history of every KPI at once: the series are packed
+into NaN padded matrices and all fits are computed with array operations,
+split over a process pool for large tenants. From the trend we project the
+KPI forward and predict when it will cross its critical threshold or reach
+its target.
+
+Forecasts are cached per KPI under a key derived from the KPI's latest data
+point version and thresholds, so they are only recomputed when new data
+arrives; ``raise_forecast_alerts`` turns predicted breaches into early
+warning alerts.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils import timezone
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+import hashlib
+import logging
+import math
+import multiprocessing
+
+import numpy as np
+
+from .models import KPIAlert, KPIDataPoint, SmartKPI
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'HISTORY_DAYS': 365,
+    'HORIZON_DAYS': 90,
+    'STEP_DAYS': 7,
+    'MIN_SAMPLES': 5,
+    'ROBUST_ITERATIONS': 10,
+    'ALERT_DAYS': 30,
+    'WORKERS': 4,
+    'CHUNK_SIZE': 2000,
+    'CACHE_SECONDS': 7 * 24 * 3600,
+}
+
+HUBER_K = 1.345
+METHOD = 'robust_linear'
+
+
+def get_forecast_settings():
+    """Return the forecasting settings merged over the defaults."""
+    configured = settings.COO_PLATFORM_SETTINGS.get('FORECAST', {})
+    return {**DEFAULT_SETTINGS, **configured}
+
+
+def fit_trends(x, y, iterations=DEFAULT_SETTINGS['ROBUST_ITERATIONS']):
+    """
+    Fit ``y = intercept + slope * x`` to every row of the NaN padded
+    matrices ``x`` and ``y``. Returns ``(slope, intercept, residual_std,
+    samples)`` arrays with one entry per row.
+    """
+    valid = ~np.isnan(y)
+    samples = valid.sum(axis=1)
+    x = np.where(valid, x, 0.0)
+    y = np.where(valid, y, 0.0)
+    weights = valid.astype(float)
+    
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for iteration in range(iterations + 1):
+            total = weights.sum(axis=1)
+            mean_x = (weights * x).sum(axis=1) / total
+            mean_y = (weights * y).sum(axis=1) / total
+            dx = x - mean_x[:, None]
+            sxx = (weights * dx * dx).sum(axis=1)
+            sxy = (weights * dx * (y - mean_y[:, None])).sum(axis=1)
+            slope = np.where(sxx > 0, sxy / sxx, 0.0)
+            intercept = mean_y - slope * mean_x
+            
+            residuals = np.where(valid, y - (intercept[:, None] + slope[:, None] * x), np.nan)
+            if iteration == iterations:
+                break
+            
+            # Huber weights from a robust (MAD) residual scale
+            scale = 1.4826 * np.nanmedian(np.abs(residuals), axis=1)
+            scale = np.where(scale > 0, scale, 1.0)
+            weights = np.where(valid, np.minimum(1.0, HUBER_K * scale[:, None] / np.abs(residuals)), 0.0)
+            weights = np.nan_to_num(weights, nan=1.0)
+        
+        degrees = np.maximum(samples - 2, 1)
+        residual_std = np.sqrt(np.nansum(residuals ** 2, axis=1) / degrees)
+    
+    return (
+        np.nan_to_num(slope),
+        np.nan_to_num(intercept),
+        np.nan_to_num(residual_std),
+        samples,
+    )
+
+
+def _fit_chunk(args):
+    return fit_trends(*args)
+
+
+def fit_all(x, y, config):
+    """Fit all rows, in a process pool when there are enough of them."""
+    chunk = config['CHUNK_SIZE']
+    workers = config['WORKERS']
+    
+    # Daemonic processes (e.g. prefork Celery workers) cannot have children
+    if len(y) <= chunk or workers <= 1 or multiprocessing.current_process().daemon:
+        return fit_trends(x, y, config['ROBUST_ITERATIONS'])
+    
+    chunks = [
+        (x[i:i + chunk], y[i:i + chunk], config['ROBUST_ITERATIONS'])
+        for i in range(0, len(y), chunk)
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_fit_chunk, chunks))
+    return tuple(np.concatenate(parts) for parts in zip(*results))
+
+
+def get_versions(kpis):
+    """
+    Cache version of each KPI: its latest data point and the settings that
+    shape the forecast, so a new or edited data point invalidates it.
+    """
+    rows = KPIDataPoint.objects.filter(
+        kpi__in=[kpi.id for kpi in kpis]
+    ).values('kpi_id').annotate(
+        last_date=Max('date'),
+        last_modified=Max('updated_at'),
+        count=Count('id'),
+    ).order_by()
+    latest = {row['kpi_id']: row for row in rows}
+    
+    versions = {}
+    for kpi in kpis:
+        row = latest.get(kpi.id)
+        if row is None:
+            continue
+        raw = (
+            f"{row['last_date']}:{row['last_modified'].timestamp()}:{row['count']}:"
+            f"{kpi.target_value}:{kpi.critical_threshold}:{kpi.trend_direction}"
+        )
+        versions[kpi.id] = hashlib.md5(raw.encode()).hexdigest()[:16]
+    return versions
+
+
+def cache_key(kpi_id, version):
+    return f'kpi-forecast:{kpi_id}:{version}'
+
+
+def load_series(kpi_ids, config):
+    """
+    Return ``(kpi_ids, last_dates, x, y)``: per KPI, day offsets relative to
+    its latest data point and the values, as NaN padded matrices.
+    """
+    since = timezone.now().date() - timedelta(days=config['HISTORY_DAYS'])
+    rows = KPIDataPoint.objects.filter(
+        kpi_id__in=kpi_ids,
+        date__gte=since
+    ).order_by('kpi_id', 'date').values_list('kpi_id', 'date', 'value')
+    
+    ids, ordinals, values, dates = [], [], [], []
+    for kpi_id, day, value in rows.iterator(chunk_size=10000):
+        ids.append(kpi_id)
+        dates.append(day)
+        ordinals.append(day.toordinal())
+        values.append(float(value))
+    
+    if not values:
+        return [], [], np.empty((0, 0)), np.empty((0, 0))
+    
+    ids_array = np.array(ids, dtype=object)
+    starts = np.flatnonzero(np.r_[True, ids_array[1:] != ids_array[:-1]])
+    counts = np.diff(np.r_[starts, len(ids)])
+    rows_index = np.repeat(np.arange(len(starts)), counts)
+    columns_index = np.arange(len(ids)) - np.repeat(starts, counts)
+    last_rows = starts + counts - 1
+    
+    ordinals = np.array(ordinals, dtype=float)
+    x = np.full((len(starts), counts.max()), np.nan)
+    y = np.full((len(starts), counts.max()), np.nan)
+    x[rows_index, columns_index] = ordinals - np.repeat(ordinals[last_rows], counts)
+    y[rows_index, columns_index] = values
+    
+    return list(ids_array[starts]), [dates[i] for i in last_rows], x, y
+
+
+def crossing(intercept, slope, value, horizon):
+    """Days after the latest data point at which the trend reaches ``value``, if within the horizon."""
+    if slope == 0:
+        return None
+    days = (value - intercept) / slope
+    if 0 < days <= horizon:
+        return math.ceil(days)
+    return None
+
+
+def build_forecast(kpi, version, last_date, slope, intercept, residual_std, samples, config):
+    """Assemble the JSON-serializable forecast of one KPI."""
+    horizon = config['HORIZON_DAYS']
+    projection = []
+    for day in range(config['STEP_DAYS'], horizon + 1, config['STEP_DAYS']):
+        value = intercept + slope * day
+        spread = 1.96 * residual_std
+        projection.append({
+            'date': (last_date + timedelta(days=day)).isoformat(),
+            'value': round(value, 4),
+            'lower': round(value - spread, 4),
+            'upper': round(value + spread, 4),
+        })
+    
+    forecast = {
+        'kpi_id': str(kpi.id),
+        'method': METHOD,
+        'version': version,
+        'generated_at': timezone.now().isoformat(),
+        'last_date': last_date.isoformat(),
+        'samples': int(samples),
+        'slope_per_day': round(slope, 6),
+        'trend_value': round(intercept, 4),
+        'residual_std': round(residual_std, 4),
+        'projection': projection,
+        'critical_breach_date': None,
+        'target_date': None,
+    }
+    
+    # Only crossings in the bad (threshold) or good (target) direction count
+    rising = slope > 0
+    if kpi.trend_direction in ('up_good', 'down_good'):
+        bad_direction = not rising if kpi.trend_direction == 'up_good' else rising
+        
+        if kpi.critical_threshold and bad_direction:
+            days = crossing(intercept, slope, float(kpi.critical_threshold), horizon)
+            if days:
+                forecast['critical_breach_date'] = (last_date + timedelta(days=days)).isoformat()
+        
+        if kpi.target_value and not bad_direction:
+            days = crossing(intercept, slope, float(kpi.target_value), horizon)
+            if days:
+                forecast['target_date'] = (last_date + timedelta(days=days)).isoformat()
+    
+    return forecast
+
+
+def get_forecasts(kpis):
+    """
+    Return ``{kpi_id: forecast}`` for ``kpis`` (KPIs without enough data are
+    left out). Cached forecasts are reused; the others are fitted in one
+    batch and cached.
+    """
+    config = get_forecast_settings()
+    kpis = list(kpis)
+    by_id = {kpi.id: kpi for kpi in kpis}
+    versions = get_versions(kpis)
+    
+    keys = {kpi_id: cache_key(kpi_id, version) for kpi_id, version in versions.items()}
+    cached = cache.get_many(list(keys.values()))
+    forecasts = {
+        kpi_id: cached[key] for kpi_id, key in keys.items() if key in cached
+    }
+    
+    missing = [kpi_id for kpi_id in versions if kpi_id not in forecasts]
+    if not missing:
+        return forecasts
+    
+    kpi_ids, last_dates, x, y = load_series(missing, config)
+    if kpi_ids:
+        slope, intercept, residual_std, samples = fit_all(x, y, config)
+        
+        fresh = {}
+        for i, kpi_id in enumerate(kpi_ids):
+            if samples[i] < config['MIN_SAMPLES']:
+                continue
+            fresh[kpi_id] = build_forecast(
+                by_id[kpi_id], versions[kpi_id], last_dates[i],
+                float(slope[i]), float(intercept[i]), float(residual_std[i]), samples[i], config
+            )
+        
+        cache.set_many({keys[kpi_id]: forecast for kpi_id, forecast in fresh.items()}, config['CACHE_SECONDS'])
+        forecasts.update(fresh)
+        logger.debug(f'Fitted {len(kpi_ids)} KPI forecasts ({len(forecasts) - len(fresh)} cached)')
+    
+    return forecasts
+
+
+def get_forecast(kpi):
+    """Return the forecast of a single KPI, or None without enough data."""
+    return get_forecasts([kpi]).get(kpi.id)
+
+
+def raise_forecast_alerts(kpis, forecasts=None):
+    """
+    Open a ``predicted_breach`` alert for every KPI projected to cross its
+    critical threshold within ``ALERT_DAYS``, and resolve the alerts of
+    KPIs no longer projected to. Returns the number of alerts created.
+    """
+    config = get_forecast_settings()
+    kpis = list(kpis)
+    forecasts = get_forecasts(kpis) if forecasts is None else forecasts
+    today = timezone.now().date()
+    alert_until = (today + timedelta(days=config['ALERT_DAYS'])).isoformat()
+    
+    at_risk = {
+        kpi_id: forecast for kpi_id, forecast in forecasts.items()
+        if forecast['critical_breach_date'] and forecast['critical_breach_date'] <= alert_until
+    }
+    
+    KPIAlert.objects.filter(
+        kpi__in=[kpi.id for kpi in kpis],
+        alert_type='predicted_breach',
+        is_resolved=False
+    ).exclude(
+        kpi_id__in=list(at_risk)
+    ).update(is_resolved=True, resolved_at=timezone.now())
+    
+    already_open = set(KPIAlert.objects.filter(
+        kpi_id__in=list(at_risk),
+        alert_type='predicted_breach',
+        is_resolved=False
+    ).values_list('kpi_id', flat=True))
+    
+    created = 0
+    for kpi in SmartKPI.objects.filter(id__in=set(at_risk) - already_open).select_related('owner'):
+        forecast = at_risk[kpi.id]
+        alert = KPIAlert.objects.create(
+            kpi=kpi,
+            alert_type='predicted_breach',
+            severity='warning',
+            title=f'{kpi.name} projected to breach critical threshold',
+            message=(
+                f'At its current trend ({forecast["slope_per_day"]:+g} per day) {kpi.name} is projected '
+                f'to cross the critical threshold ({kpi.critical_threshold}) around {forecast["critical_breach_date"]}'
+            ),
+            threshold_value=kpi.critical_threshold,
+        )
+        alert.notify_stakeholders()
+        created += 1
+    
+    return created
@@ -0,0 +1,123 @@
+"""
+KPI data freshness.
+
+A KPI is stale when no data point arrived within its
+``auto_update_frequency`` (plus a grace period). Staleness is computed in
+SQL by ``SmartKPIQuerySet.with_freshness()`` (one index lookup per KPI for
+its latest data point), so ``detect_stale_kpis`` finds every overdue KPI of
+every tenant with one query and opens or resolves ``data_missing`` alerts
+with a constant number of bulk statements.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef
+from django.utils import timezone
+import logging
+
+from .models import KPIAlert, SmartKPI
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    # Days of slack after the expected update, per update frequency
+    'GRACE_DAYS': {
+        'daily': 1,
+        'weekly': 2,
+        'monthly': 5,
+        'quarterly': 10,
+        'yearly': 30,
+    },
+    # Overdue by more than this many intervals makes the alert critical
+    'CRITICAL_INTERVALS': 3,
+}
+
+
+def get_freshness_settings():
+    """Return the freshness settings merged over the defaults."""
+    configured = settings.COO_PLATFORM_SETTINGS.get('FRESHNESS', {})
+    return {**DEFAULT_SETTINGS, **configured}
+
+
+def annotate_freshness(queryset, today=None):
+    """Annotate ``queryset`` with the configured grace periods."""
+    config = get_freshness_settings()
+    return queryset.with_freshness(today=today, grace_days=config['GRACE_DAYS'])
+
+
+def get_freshness_summary(queryset, today=None, limit=100):
+    """
+    Freshness of the KPIs in ``queryset``: counts per state and the most
+    overdue stale KPIs (two queries whatever the number of KPIs).
+    """
+    today = today or timezone.now().date()
+    annotated = annotate_freshness(queryset, today)
+    
+    counts = dict(annotated.values_list('freshness').annotate(count=Count('id')).order_by())
+    stale = annotated.filter(freshness='stale').order_by('data_since').values(
+        'id', 'name', 'auto_update_frequency', 'last_data_date', 'data_since', 'stale_before'
+    )[:limit]
+    
+    return {
+        'date': today,
+        'total': sum(counts.values()),
+        'fresh': counts.get('fresh', 0),
+        'stale': counts.get('stale', 0),
+        'stale_kpis': [
+            {**row, 'days_overdue': (row['stale_before'] - row['data_since']).days}
+            for row in stale
+        ],
+    }
+
+
+def _alert_for(kpi, today, config):
+    interval = SmartKPI.UPDATE_INTERVALS[kpi['auto_update_frequency']]
+    last_date = kpi['last_data_date']
+    
+    if last_date is None:
+        message = f"No data has been recorded yet ({kpi['auto_update_frequency']} updates expected)"
+        overdue = today - kpi['data_since']
+    else:
+        message = f"No data since {last_date} ({kpi['auto_update_frequency']} updates expected)"
+        overdue = today - last_date
+    
+    critical = overdue > interval * config['CRITICAL_INTERVALS']
+    return KPIAlert(
+        kpi_id=kpi['id'],
+        alert_type='data_missing',
+        severity='critical' if critical else 'warning',
+        title=f"{kpi['name']} data is overdue",
+        message=message,
+    )
+
+
+def detect_stale_kpis(queryset=None, today=None):
+    """
+    Open a ``data_missing`` alert for every stale active KPI without one and
+    resolve the open alerts of KPIs that are fresh again. Returns
+    ``{'stale', 'created', 'resolved'}``.
+    """
+    config = get_freshness_settings()
+    today = today or timezone.now().date()
+    queryset = SmartKPI.objects.filter(is_active=True) if queryset is None else queryset
+    stale = annotate_freshness(queryset, today).filter(freshness='stale')
+    
+    open_alerts = KPIAlert.objects.filter(alert_type='data_missing', is_resolved=False)
+    
+    with transaction.atomic():
+        # Alerts of KPIs that received data since are resolved
+        resolved = open_alerts.filter(
+            kpi__in=queryset
+        ).exclude(
+            kpi__in=stale.values('id')
+        ).update(is_resolved=True, resolved_at=timezone.now())
+        
+        needing_alert = stale.exclude(
+            Exists(open_alerts.filter(kpi=OuterRef('pk')))
+        ).values('id', 'name', 'auto_update_frequency', 'last_data_date', 'data_since')
+        
+        alerts = [_alert_for(kpi, today, config) for kpi in needing_alert.iterator(chunk_size=2000)]
+        KPIAlert.objects.bulk_create(alerts, batch_size=1000)
+    
+    stale_count = stale.count()
+    logger.info(f'{stale_count} stale KPIs: {len(alerts)} alerts created, {resolved} resolved')
+    return {'stale': stale_count, 'created': len(alerts), 'resolved': resolved}
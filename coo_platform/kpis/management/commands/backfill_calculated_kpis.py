@@ -0,0 +1,57 @@
+"""
+Management command to recompute the history of calculated KPIs.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from datetime import datetime
+
+from kpis.calculation import FormulaError, backfill_kpi, dependency_order
+from kpis.models import SmartKPI
+
+
+class Command(BaseCommand):
+    help = 'Recompute the data points of calculated KPIs from their parent KPIs history'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--kpi', action='append', help='Only backfill this KPI id (can be repeated)')
+        parser.add_argument('--tenant', type=str, default=None, help='Only backfill the KPIs of this tenant id')
+        parser.add_argument('--since', type=str, default=None, help='Only recompute dates from YYYY-MM-DD on')
+        parser.add_argument('--dry-run', action='store_true', help='Only show what would change')
+        parser.add_argument('--show', type=int, default=10, help='Changes listed per KPI in dry runs')
+    
+    def handle(self, *args, **options):
+        kpis = SmartKPI.objects.filter(
+            data_source_type='calculated',
+            is_active=True
+        ).prefetch_related('parent_kpis')
+        if options['kpi']:
+            kpis = kpis.filter(id__in=options['kpi'])
+        if options['tenant']:
+            kpis = kpis.filter(tenant_id=options['tenant'])
+        
+        since = None
+        if options['since']:
+            since = datetime.strptime(options['since'], '%Y-%m-%d').date()
+        
+        try:
+            ordered = dependency_order(list(kpis))
+        except FormulaError as e:
+            raise CommandError(str(e))
+        
+        for kpi in ordered:
+            try:
+                diff = backfill_kpi(kpi, since=since, dry_run=options['dry_run'])
+            except FormulaError as e:
+                self.stderr.write(f'{kpi.name}: {e}')
+                continue
+            
+            verb = 'would be' if options['dry_run'] else 'were'
+            self.stdout.write(
+                f"{kpi.name}: {diff['created']} data points {verb} created, {diff['updated']} updated, "
+                f"{diff['unchanged']} unchanged"
+            )
+            
+            if options['dry_run']:
+                for change in diff['changes'][:options['show']]:
+                    self.stdout.write(f"  {change['date']}: {change['old']} -> {change['new']}")
+                if len(diff['changes']) > options['show']:
+                    self.stdout.write(f"  ... {len(diff['changes']) - options['show']} more")
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kpis', '0002_partition_kpidatapoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KPIAnomalyState',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('kpi', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='anomaly_state', serialize=False, to='kpis.smartkpi')),
+                ('sample_count', models.PositiveIntegerField(default=0)),
+                ('mean', models.FloatField(default=0)),
+                ('variance', models.FloatField(default=0)),
+                ('last_date', models.DateField(blank=True, null=True)),
+                ('last_value', models.FloatField(blank=True, null=True)),
+                ('last_zscore', models.FloatField(blank=True, null=True)),
+                ('is_anomalous', models.BooleanField(default=False)),
+            ],
+            options={
+                'verbose_name': 'KPI anomaly state',
+            },
+        ),
+    ]
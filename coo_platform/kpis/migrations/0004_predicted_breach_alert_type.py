@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kpis', '0003_kpianomalystate'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='kpialert',
+            name='alert_type',
+            field=models.CharField(choices=[('threshold_breach', 'Threshold Breach'), ('trend_warning', 'Trend Warning'), ('data_missing', 'Data Missing'), ('target_achieved', 'Target Achieved'), ('improvement_opportunity', 'Improvement Opportunity'), ('predicted_breach', 'Predicted Breach')], max_length=30),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kpis', '0004_predicted_breach_alert_type'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='kpidatapoint',
+            name='source',
+            field=models.CharField(choices=[('manual', 'Manual Entry'), ('api', 'API Import'), ('csv', 'CSV Upload'), ('calculated', 'Auto-calculated'), ('database', 'Database Query')], default='manual', max_length=50),
+        ),
+    ]
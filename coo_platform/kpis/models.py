@@ -7,6 +7,7 @@ from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.urls import reverse
 from django.db.models import Avg, Sum, Count, Max, Min
+from django.db.models.functions import Abs, Coalesce, TruncDate
 from core.models import TimeStampedModel, UUIDModel
 from tenants.models import TenantAwareModel
 from decimal import Decimal
@@ -47,13 +48,116 @@ class KPICategory(TenantAwareModel, TimeStampedModel):
     
     @property
     def kpi_count(self):
+        if hasattr(self, 'active_kpi_count'):
+            return self.active_kpi_count
         return self.kpis.filter(is_active=True).count()
 
 
+class SmartKPIQuerySet(models.QuerySet):
+    """
+    QuerySet with helpers for loading computed KPI values in bulk.
+    """
+    
+    def with_latest_value(self):
+        """Annotate each KPI with the value of its most recent data point."""
+        latest = KPIDataPoint.objects.filter(
+            kpi=models.OuterRef('pk')
+        ).order_by('-date').values('value')[:1]
+        
+        return self.annotate(
+            latest_value=models.Subquery(
+                latest,
+                output_field=models.DecimalField(max_digits=15, decimal_places=4)
+            )
+        )
+    
+    def with_last_data_date(self):
+        """Annotate each KPI with the date of its most recent data point."""
+        latest = KPIDataPoint.objects.filter(
+            kpi=models.OuterRef('pk')
+        ).order_by('-date').values('date')[:1]
+        
+        return self.annotate(last_data_date=models.Subquery(latest, output_field=models.DateField()))
+    
+    def with_freshness(self, today=None, grace_days=None):
+        """
+        Annotate each KPI with ``freshness``: 'stale' when no data arrived
+        within its update frequency (plus ``grace_days[frequency]`` days) up
+        to ``today``, else 'fresh'. KPIs without data count from creation.
+        Also annotates ``last_data_date`` and ``stale_before``.
+        """
+        today = today or timezone.now().date()
+        grace_days = grace_days or {}
+        queryset = self if 'last_data_date' in self.query.annotations else self.with_last_data_date()
+        
+        # One cutoff date per frequency, so staleness is a plain date comparison
+        cutoffs = [
+            models.When(
+                auto_update_frequency=frequency,
+                then=models.Value(today - interval - timedelta(days=grace_days.get(frequency, 0)))
+            )
+            for frequency, interval in SmartKPI.UPDATE_INTERVALS.items()
+        ]
+        
+        return queryset.annotate(
+            stale_before=models.Case(*cutoffs, default=None, output_field=models.DateField()),
+            data_since=Coalesce('last_data_date', TruncDate('created_at')),
+        ).annotate(
+            freshness=models.Case(
+                models.When(data_since__lt=models.F('stale_before'), then=models.Value('stale')),
+                default=models.Value('fresh'),
+                output_field=models.CharField()
+            )
+        )
+    
+    def with_performance_status(self):
+        """
+        Annotate each KPI with ``performance_status``, computed in SQL with the
+        same rules as SmartKPI.calculate_performance_status().
+        """
+        queryset = self if 'latest_value' in self.query.annotations else self.with_latest_value()
+        
+        value = models.F('latest_value')
+        up = models.Q(trend_direction='up_good')
+        down = models.Q(trend_direction='down_good')
+        has_warning = models.Q(warning_threshold__isnull=False) & ~models.Q(warning_threshold=0)
+        has_critical = models.Q(critical_threshold__isnull=False) & ~models.Q(critical_threshold=0)
+        unknown = (
+            models.Q(latest_value__isnull=True) | models.Q(latest_value=0) |
+            models.Q(target_value__isnull=True) | models.Q(target_value=0)
+        )
+        
+        def within(percent):
+            return models.Q(target_variance__lte=models.F('target_value') * Decimal(percent))
+        
+        return queryset.annotate(
+            target_variance=Abs(value - models.F('target_value')),
+            performance_status=models.Case(
+                models.When(unknown, then=models.Value('unknown')),
+                models.When(up & models.Q(latest_value__gte=models.F('target_value')), then=models.Value('excellent')),
+                models.When(up & has_warning & models.Q(latest_value__gte=models.F('warning_threshold')), then=models.Value('good')),
+                models.When(up & has_critical & models.Q(latest_value__gte=models.F('critical_threshold')), then=models.Value('warning')),
+                models.When(up, then=models.Value('critical')),
+                models.When(down & models.Q(latest_value__lte=models.F('target_value')), then=models.Value('excellent')),
+                models.When(down & has_warning & models.Q(latest_value__lte=models.F('warning_threshold')), then=models.Value('good')),
+                models.When(down & has_critical & models.Q(latest_value__lte=models.F('critical_threshold')), then=models.Value('warning')),
+                models.When(down, then=models.Value('critical')),
+                # stable_good: 5% / 10% / 20% variance around the target
+                models.When(within('0.05'), then=models.Value('excellent')),
+                models.When(within('0.10'), then=models.Value('good')),
+                models.When(within('0.20'), then=models.Value('warning')),
+                default=models.Value('critical'),
+                output_field=models.CharField()
+            )
+        )
+
+
 class SmartKPI(UUIDModel, TenantAwareModel, TimeStampedModel):
     """
     Enhanced KPI model with automation and advanced analytics capabilities.
     """
+    objects = SmartKPIQuerySet.as_manager()
+    
     DATA_SOURCE_TYPES = [
         ('manual', 'Manual Entry'),
         ('api', 'API Integration'),
@@ -70,6 +174,14 @@ class SmartKPI(UUIDModel, TenantAwareModel, TimeStampedModel):
         ('yearly', 'Yearly'),
     ]
     
+    UPDATE_INTERVALS = {
+        'daily': timedelta(days=1),
+        'weekly': timedelta(weeks=1),
+        'monthly': timedelta(days=30),
+        'quarterly': timedelta(days=90),
+        'yearly': timedelta(days=365),
+    }
+    
     CALCULATION_METHODS = [
         ('sum', 'Sum'),
         ('average', 'Average'),
@@ -140,7 +252,7 @@ class SmartKPI(UUIDModel, TenantAwareModel, TimeStampedModel):
         related_name='owned_kpis'
     )
     stakeholders = models.ManyToManyField(
-        User,
+        User, 
         blank=True,
         related_name='stakeholder_kpis',
         help_text="Users who should be notified about this KPI"
@@ -179,6 +291,13 @@ class SmartKPI(UUIDModel, TenantAwareModel, TimeStampedModel):
         if self.calculation_method == 'custom' and not self.calculation_formula:
             raise ValidationError('Custom calculation method requires a formula.')
         
+        if self.calculation_method == 'custom':
+            from .calculation import FormulaError, compile_formula
+            try:
+                compile_formula(self.calculation_formula)
+            except FormulaError as e:
+                raise ValidationError({'calculation_formula': str(e)})
+        
         if self.data_source_type == 'calculated' and not self.parent_kpis.exists():
             raise ValidationError('Calculated KPIs must have parent KPIs defined.')
     
@@ -187,30 +306,42 @@ class SmartKPI(UUIDModel, TenantAwareModel, TimeStampedModel):
     
     def get_latest_value(self):
         """Get the most recent data point value."""
+        # Use the value annotated by SmartKPIQuerySet.with_latest_value() if present
+        if hasattr(self, 'latest_value'):
+            return self.latest_value
+        
         latest = self.datapoints.order_by('-date').first()
         return latest.value if latest else None
     
-    def get_trend_data(self, days=30):
-        """Get trend data for the specified number of days."""
-        end_date = timezone.now().date()
-        start_date = end_date - timedelta(days=days)
+    def get_trend_series(self, days=30):
+        """``KPISeries`` of the last ``days`` days of data."""
+        # Use the series attached by kpis.series.attach_trend_series() if present
+        if getattr(self, 'trend_days', None) == days:
+            return self.trend_series
         
-        datapoints = self.datapoints.filter(
-            date__gte=start_date,
-            date__lte=end_date
-        ).order_by('date')
+        from .series import KPISeries
+        end_date = timezone.now().date()
+        return KPISeries.load(self, since=end_date - timedelta(days=days), until=end_date)
+    
+    def get_recent_series(self, points=30):
+        """``KPISeries`` of the latest ``points`` data points."""
+        # Use the series attached by kpis.series.attach_recent_series() if present
+        if getattr(self, 'recent_points', None) == points:
+            return self.recent_series
         
-        return [
-            {
-                'date': dp.date.isoformat(),
-                'value': float(dp.value),
-                'target': float(self.target_value) if self.target_value else None
-            }
-            for dp in datapoints
-        ]
+        from .series import KPISeries
+        return KPISeries.load(self, last=points)
+    
+    def get_trend_data(self, days=30):
+        """Get trend data for the specified number of days."""
+        return self.get_trend_series(days).to_trend_data(self.target_value)
     
     def calculate_performance_status(self):
         """Calculate current performance status based on thresholds."""
+        # Use the status annotated by SmartKPIQuerySet.with_performance_status() if present
+        if hasattr(self, 'performance_status'):
+            return self.performance_status
+        
         current_value = self.get_latest_value()
         if not current_value or not self.target_value:
             return 'unknown'
@@ -258,7 +389,10 @@ class SmartKPI(UUIDModel, TenantAwareModel, TimeStampedModel):
         # Get latest values from parent KPIs
         parent_values = {}
         for parent_kpi in self.parent_kpis.all():
-            parent_values[f'kpi_{parent_kpi.id}'] = parent_kpi.get_latest_value() or 0
+            latest_value = parent_kpi.get_latest_value() or 0
+            parent_values[f'kpi_{parent_kpi.id}'] = latest_value
+            # UUIDs contain dashes, so formulas reference parents by their hex form
+            parent_values[f'kpi_{parent_kpi.id.hex}'] = latest_value
         
         # Execute custom formula if provided
         if self.calculation_method == 'custom' and self.calculation_formula:
@@ -297,26 +431,44 @@ class SmartKPI(UUIDModel, TenantAwareModel, TimeStampedModel):
         if not self.auto_update_frequency:
             return
         
-        now = timezone.now()
+        from .refresh import get_next_update
         
-        if self.auto_update_frequency == 'daily':
-            self.next_auto_update = now + timedelta(days=1)
-        elif self.auto_update_frequency == 'weekly':
-            self.next_auto_update = now + timedelta(weeks=1)
-        elif self.auto_update_frequency == 'monthly':
-            self.next_auto_update = now + timedelta(days=30)
-        elif self.auto_update_frequency == 'quarterly':
-            self.next_auto_update = now + timedelta(days=90)
-        elif self.auto_update_frequency == 'yearly':
-            self.next_auto_update = now + timedelta(days=365)
+        next_update = get_next_update(self.auto_update_frequency, timezone.now())
+        if next_update:
+            self.next_auto_update = next_update
         
         self.save(update_fields=['next_auto_update'])
 
 
+class KPIDataPointQuerySet(models.QuerySet):
+    """
+    QuerySet with the bulk write path for data points.
+    """
+    
+    def upsert(self, datapoints, batch_size=1000):
+        """
+        Insert ``datapoints``, replacing the value (and source and notes) of
+        existing data points of the same KPI and date. Bypasses save() and
+        signals: new values are fed to kpis.anomaly.record_datapoints by the
+        caller (see kpis.refresh), rewritten history needs the
+        backfill_anomaly_states task and thresholds are picked up by the
+        periodic check_kpi_thresholds task.
+        """
+        return self.bulk_create(
+            datapoints,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['kpi', 'date'],
+            update_fields=['value', 'source', 'notes', 'updated_at']
+        )
+
+
 class KPIDataPoint(UUIDModel, TimeStampedModel):
     """
     Individual data points for KPIs with rich metadata.
     """
+    objects = KPIDataPointQuerySet.as_manager()
+    
     kpi = models.ForeignKey(SmartKPI, on_delete=models.CASCADE, related_name='datapoints')
     date = models.DateField()
     value = models.DecimalField(max_digits=15, decimal_places=4)
@@ -330,6 +482,7 @@ class KPIDataPoint(UUIDModel, TimeStampedModel):
             ('api', 'API Import'),
             ('csv', 'CSV Upload'),
             ('calculated', 'Auto-calculated'),
+            ('database', 'Database Query'),
         ],
         default='manual'
     )
@@ -382,6 +535,7 @@ class KPIAlert(UUIDModel, TimeStampedModel):
         ('data_missing', 'Data Missing'),
         ('target_achieved', 'Target Achieved'),
         ('improvement_opportunity', 'Improvement Opportunity'),
+        ('predicted_breach', 'Predicted Breach'),
     ]
     
     SEVERITY_LEVELS = [
@@ -403,7 +557,7 @@ class KPIAlert(UUIDModel, TimeStampedModel):
     # Status tracking
     is_acknowledged = models.BooleanField(default=False)
     acknowledged_by = models.ForeignKey(
-        User, 
+        User,
         on_delete=models.SET_NULL, 
         null=True, 
         blank=True,
@@ -439,6 +593,55 @@ class KPIAlert(UUIDModel, TimeStampedModel):
             self.is_resolved = True
             self.resolved_at = timezone.now()
             self.save(update_fields=['is_resolved', 'resolved_at'])
+    
+    def notify_stakeholders(self):
+        """Notify the KPI's stakeholders and owner about this alert."""
+        from core.utils import create_notification
+        
+        kpi = self.kpi
+        stakeholders = list(kpi.stakeholders.all())
+        if kpi.owner and kpi.owner not in stakeholders:
+            stakeholders.append(kpi.owner)
+        
+        for stakeholder in stakeholders:
+            create_notification(
+                recipient=stakeholder,
+                notification_type='kpi_alert',
+                title=self.title,
+                message=self.message,
+                action_url=kpi.get_absolute_url(),
+                action_label='View KPI'
+            )
+
+
+class KPIAnomalyState(TimeStampedModel):
+    """
+    Running EWMA statistics of a KPI's values, updated in place for every new
+    data point so anomaly detection never re-reads the history.
+    """
+    kpi = models.OneToOneField(
+        SmartKPI,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='anomaly_state'
+    )
+    
+    # Exponentially weighted statistics
+    sample_count = models.PositiveIntegerField(default=0)
+    mean = models.FloatField(default=0)
+    variance = models.FloatField(default=0)
+    
+    # Latest observation
+    last_date = models.DateField(null=True, blank=True)
+    last_value = models.FloatField(null=True, blank=True)
+    last_zscore = models.FloatField(null=True, blank=True)
+    is_anomalous = models.BooleanField(default=False)
+    
+    class Meta:
+        verbose_name = 'KPI anomaly state'
+    
+    def __str__(self):
+        return f"{self.kpi.name} - mean {self.mean:.2f} (n={self.sample_count})"
 
 
 class KPIDashboard(UUIDModel, TenantAwareModel, TimeStampedModel):
@@ -0,0 +1,154 @@
+"""
+Automatic KPI refresh.
+
+KPIs due for an automatic update are claimed in ``next_auto_update`` order
+(one range scan of the ``(data_source_type, next_auto_update)`` index per
+source type) with SKIP LOCKED, so several workers can refresh concurrently.
+Claiming advances ``next_auto_update`` with a single ``bulk_update``; a
+random jitter spreads the next refreshes instead of having every KPI of a
+frequency come due at the same instant. Each batch is then handed to the
+collector registered for its source type and the collected values are
+written with one bulk upsert and fed to the anomaly detector as a batch.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from datetime import timedelta
+import logging
+import random
+
+from .models import KPIDataPoint, SmartKPI
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'BATCH_SIZE': 200,
+    # Random delay added to each next update, as a fraction of its interval...
+    'JITTER_FRACTION': 0.05,
+    # ...capped to this many seconds
+    'MAX_JITTER_SECONDS': 3600,
+}
+
+# Collectors by data source type: callables taking a list of KPIs and
+# returning ``{kpi_id: value}`` for the KPIs they could collect
+COLLECTORS = {}
+
+
+def get_refresh_settings():
+    """Return the refresh settings merged over the defaults."""
+    configured = settings.COO_PLATFORM_SETTINGS.get('REFRESH', {})
+    return {**DEFAULT_SETTINGS, **configured}
+
+
+def register_collector(source_type):
+    """Decorator registering the collector of a data source type."""
+    def decorator(collector):
+        COLLECTORS[source_type] = collector
+        return collector
+    return decorator
+
+
+def get_next_update(frequency, after, config=None):
+    """Next automatic update for ``frequency`` after ``after``, with jitter."""
+    config = config or get_refresh_settings()
+    interval = SmartKPI.UPDATE_INTERVALS.get(frequency)
+    if interval is None:
+        return None
+    
+    jitter = min(interval.total_seconds() * config['JITTER_FRACTION'], config['MAX_JITTER_SECONDS'])
+    return after + interval + timedelta(seconds=random.uniform(0, jitter))
+
+
+@register_collector('calculated')
+def collect_calculated(kpis):
+    from .calculation import calculate_latest
+    return calculate_latest(kpis)
+
+
+def claim_due_kpis(source_type, now, limit, config=None):
+    """
+    Claim up to ``limit`` active KPIs of ``source_type`` due for an update,
+    skipping rows locked by other workers, and advance their
+    ``next_auto_update`` so no other run picks them up again.
+    """
+    config = config or get_refresh_settings()
+    
+    with transaction.atomic():
+        kpis = list(SmartKPI.objects.select_for_update(
+            skip_locked=True, of=('self',)
+        ).filter(
+            data_source_type=source_type,
+            next_auto_update__lte=now,
+            is_active=True
+        ).order_by('next_auto_update')[:limit])
+        
+        for kpi in kpis:
+            kpi.next_auto_update = get_next_update(kpi.auto_update_frequency, now, config)
+        
+        # bulk_update skips the post_save signals of SmartKPI
+        SmartKPI.objects.bulk_update(kpis, ['next_auto_update'])
+    
+    return kpis
+
+
+def write_values(kpis, values, day, source_type):
+    """Store the collected ``values`` as ``day``'s data points of ``kpis``."""
+    datapoints = [
+        KPIDataPoint(
+            kpi=kpi,
+            date=day,
+            value=values[kpi.id],
+            source=source_type,
+            notes='Collected automatically'
+        )
+        for kpi in kpis
+        if kpi.id in values
+    ]
+    KPIDataPoint.objects.upsert(datapoints)
+    
+    # upsert() skips post_save, so feed the batch to the anomaly detector here
+    try:
+        from .anomaly import record_datapoints
+        record_datapoints(datapoints)
+    except Exception as e:
+        logger.error(f"Error recording anomaly states for {source_type} KPIs: {str(e)}")
+    
+    return len(datapoints)
+
+
+def refresh_batch(source_type, kpis, now):
+    """Collect and store the values of one claimed batch; returns the number refreshed."""
+    values = COLLECTORS[source_type](kpis)
+    refreshed = write_values(kpis, values, timezone.localdate(now), source_type)
+    
+    SmartKPI.objects.filter(id__in=list(values)).update(last_auto_update=now)
+    return refreshed
+
+
+def refresh_due_kpis(now=None, batch_size=None, source_types=None):
+    """
+    Refresh every KPI due for an automatic update whose source type has a
+    collector. Returns ``{'claimed', 'refreshed', 'errors'}``.
+    """
+    config = get_refresh_settings()
+    now = now or timezone.now()
+    batch_size = batch_size or config['BATCH_SIZE']
+    source_types = [source for source in (source_types or COLLECTORS) if source in COLLECTORS]
+    
+    stats = {'claimed': 0, 'refreshed': 0, 'errors': 0}
+    for source_type in source_types:
+        while True:
+            kpis = claim_due_kpis(source_type, now, batch_size, config)
+            if not kpis:
+                break
+            
+            stats['claimed'] += len(kpis)
+            try:
+                stats['refreshed'] += refresh_batch(source_type, kpis, now)
+            except Exception as e:
+                # The batch keeps its advanced schedule, so a failing source cannot hot-loop
+                stats['errors'] += len(kpis)
+                logger.error(f"Error refreshing {len(kpis)} {source_type} KPIs: {str(e)}")
+    
+    logger.info(f"KPI refresh: {stats['claimed']} due, {stats['refreshed']} refreshed, {stats['errors']} errors")
+    return stats
@@ -0,0 +1,229 @@
+"""
+Compact KPI time series for read-side analytics.
+
+A ``KPISeries`` holds the data points of one KPI, oldest first, as two
+NumPy arrays: dates as int32 days since 1970-01-01 and values as float64.
+Series are loaded from ``values_list`` rows (no model instances, no
+``notes``/``metadata`` columns), and their statistics are vectorized.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from core.utils import top_n_per_group
+from .models import KPIDataPoint
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def to_epoch_day(day):
+    return day.toordinal() - EPOCH_ORDINAL
+
+
+def from_epoch_day(day):
+    return date.fromordinal(int(day) + EPOCH_ORDINAL)
+
+
+def filter_dates(queryset, since=None, until=None):
+    if since is not None:
+        queryset = queryset.filter(date__gte=since)
+    if until is not None:
+        queryset = queryset.filter(date__lte=until)
+    return queryset
+
+
+class KPISeries:
+    """Dates (int32 epoch days) and values (float64) of a KPI, oldest first."""
+    
+    __slots__ = ('days', 'values')
+    
+    def __init__(self, days=(), values=()):
+        self.days = np.asarray(days, dtype=np.int32)
+        self.values = np.asarray(values, dtype=np.float64)
+    
+    @classmethod
+    def from_rows(cls, rows):
+        """Build a series from ``(date, value)`` rows, oldest first."""
+        rows = list(rows)
+        return cls(
+            np.fromiter((to_epoch_day(day) for day, _ in rows), dtype=np.int32, count=len(rows)),
+            np.fromiter((value for _, value in rows), dtype=np.float64, count=len(rows))
+        )
+    
+    @classmethod
+    def load(cls, kpi, since=None, until=None, last=None):
+        """
+        Load the data points of ``kpi`` (an instance or id) between ``since``
+        and ``until`` (inclusive); with ``last``, only the latest ``last``.
+        """
+        rows = filter_dates(KPIDataPoint.objects.filter(kpi=kpi), since, until)
+        if last is not None:
+            return cls.from_rows(reversed(rows.order_by('-date').values_list('date', 'value')[:last]))
+        return cls.from_rows(rows.order_by('date').values_list('date', 'value'))
+    
+    @classmethod
+    def load_many(cls, kpi_ids, since=None, until=None):
+        """Return ``{kpi_id: KPISeries}`` for every id (empty if it has no data), with one query."""
+        kpi_ids = list(kpi_ids)
+        rows = filter_dates(KPIDataPoint.objects.filter(kpi_id__in=kpi_ids), since, until)
+        return cls.group(kpi_ids, rows.order_by('kpi_id', 'date').values_list('kpi_id', 'date', 'value'))
+    
+    @classmethod
+    def load_recent(cls, kpi_ids, count):
+        """
+        Return ``{kpi_id: KPISeries}`` of the latest ``count`` data points of
+        every KPI, with one window-function query.
+        """
+        kpi_ids = list(kpi_ids)
+        rows = top_n_per_group(KPIDataPoint.objects.filter(kpi_id__in=kpi_ids), 'kpi_id', '-date', count)
+        return cls.group(kpi_ids, rows.order_by('kpi_id', 'date').values_list('kpi_id', 'date', 'value'))
+    
+    @classmethod
+    def group(cls, kpi_ids, rows):
+        """Split ``(kpi_id, date, value)`` rows ordered by KPI and date into ``{kpi_id: KPISeries}``."""
+        series = {kpi_id: cls() for kpi_id in kpi_ids}
+        ids, days, values = [], [], []
+        for kpi_id, day, value in rows.iterator(chunk_size=10000):
+            ids.append(kpi_id)
+            days.append(to_epoch_day(day))
+            values.append(value)
+        
+        if ids:
+            days = np.array(days, dtype=np.int32)
+            values = np.array(values, dtype=np.float64)
+            # Rows are grouped by KPI: split where the id changes
+            starts = [0] + [i for i in range(1, len(ids)) if ids[i] != ids[i - 1]]
+            ends = starts[1:] + [len(ids)]
+            for start, end in zip(starts, ends):
+                series[ids[start]] = cls(days[start:end], values[start:end])
+        
+        return series
+    
+    def __len__(self):
+        return len(self.values)
+    
+    def __repr__(self):
+        if not len(self):
+            return '<KPISeries: empty>'
+        return f'<KPISeries: {len(self)} points, {self.first_date} to {self.last_date}>'
+    
+    @property
+    def dates(self):
+        return [from_epoch_day(day) for day in self.days]
+    
+    @property
+    def first_date(self):
+        return from_epoch_day(self.days[0]) if len(self) else None
+    
+    @property
+    def last_date(self):
+        return from_epoch_day(self.days[-1]) if len(self) else None
+    
+    @property
+    def last(self):
+        return float(self.values[-1]) if len(self) else None
+    
+    def since(self, day):
+        """The part of the series from ``day`` on."""
+        start = np.searchsorted(self.days, to_epoch_day(day), side='left')
+        return KPISeries(self.days[start:], self.values[start:])
+    
+    def tail(self, count):
+        """The latest ``count`` points."""
+        return KPISeries(self.days[-count:], self.values[-count:]) if count else KPISeries()
+    
+    def min(self):
+        return float(self.values.min()) if len(self) else None
+    
+    def max(self):
+        return float(self.values.max()) if len(self) else None
+    
+    def mean(self):
+        return float(self.values.mean()) if len(self) else None
+    
+    def change(self, periods=1):
+        """Latest value minus the value ``periods`` points earlier."""
+        if len(self) <= periods:
+            return None
+        return float(self.values[-1] - self.values[-1 - periods])
+    
+    def change_percent(self, periods=1):
+        """``change`` relative to the earlier value, in percent (None if that value is 0)."""
+        if len(self) <= periods or not self.values[-1 - periods]:
+            return None
+        return float(self.change(periods) / self.values[-1 - periods] * 100)
+    
+    def rolling_mean(self, window):
+        """Series of the mean of each ``window`` consecutive points (dated by the last of them)."""
+        if window < 1 or len(self) < window:
+            return KPISeries()
+        sums = np.cumsum(np.r_[0.0, self.values])
+        return KPISeries(self.days[window - 1:], (sums[window:] - sums[:-window]) / window)
+    
+    def stats(self):
+        """Summary statistics, as shown on the KPI detail page."""
+        change = self.change_percent()
+        return {
+            'current': self.last,
+            'previous': float(self.values[-2]) if len(self) > 1 else None,
+            'average': self.mean(),
+            'min': self.min(),
+            'max': self.max(),
+            'change_percent': round(change, 2) if change is not None and self.last else None,
+        }
+    
+    def to_trend_data(self, target=None):
+        """The ``[{'date', 'value', 'target'}]`` list used by charts and the API."""
+        target = float(target) if target else None
+        labels = self.days.astype('datetime64[D]').astype(str).tolist()
+        return [
+            {'date': label, 'value': value, 'target': target}
+            for label, value in zip(labels, self.values.tolist())
+        ]
+    
+    def sparkline(self, width=120, height=32):
+        """SVG polyline ``points`` drawing the values evenly spaced in a ``width`` x ``height`` box."""
+        if len(self) < 2:
+            return ''
+        
+        x = np.linspace(0, width, len(self))
+        span = np.ptp(self.values)
+        if span:
+            y = height - (self.values - self.values.min()) / span * height
+        else:
+            y = np.full(len(self), height / 2)
+        return ' '.join(f'{a:.1f},{b:.1f}' for a, b in zip(x, y))
+
+
+def attach_trend_series(kpis, days=30):
+    """
+    Attach the data points of the last ``days`` days to each of ``kpis`` as
+    ``trend_series``, with one query for all of them. Call it on the
+    evaluated page of KPIs, e.g. after pagination. Returns the KPIs as a list.
+    """
+    kpis = list(kpis)
+    end_date = timezone.now().date()
+    series = KPISeries.load_many(
+        [kpi.id for kpi in kpis],
+        since=end_date - timedelta(days=days),
+        until=end_date
+    )
+    for kpi in kpis:
+        kpi.trend_series = series[kpi.id]
+        kpi.trend_days = days
+    return kpis
+
+
+def attach_recent_series(kpis, points=30):
+    """
+    Attach the latest ``points`` data points of each of ``kpis`` as
+    ``recent_series`` (e.g. for sparklines), with one window-function query
+    for all of them. Returns the KPIs as a list.
+    """
+    kpis = list(kpis)
+    series = KPISeries.load_recent([kpi.id for kpi in kpis], points)
+    for kpi in kpis:
+        kpi.recent_series = series[kpi.id]
+        kpi.recent_points = points
+    return kpis
@@ -1,7 +1,7 @@
 """
 Django signals for KPIs app.
 """
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 from .models import SmartKPI, KPIDataPoint, KPIAlert
@@ -131,14 +131,15 @@ def check_kpi_thresholds(sender, instance, created, **kwargs):
                 )
 
 
-@receiver(post_save, sender=SmartKPI)
-def schedule_kpi_updates(sender, instance, created, **kwargs):
+@receiver(pre_save, sender=SmartKPI)
+def schedule_kpi_updates(sender, instance, **kwargs):
     """
-    Schedule automatic updates for KPIs.
+    Schedule the first automatic update of new KPIs (set before the insert,
+    so creating a KPI does not cost a second save).
     """
-    if created or 'auto_update_frequency' in getattr(instance, '_updated_fields', set()):
-        if instance.auto_update_frequency:
-            instance.schedule_next_update()
+    if instance._state.adding and instance.auto_update_frequency and not instance.next_auto_update:
+        from .refresh import get_next_update
+        instance.next_auto_update = get_next_update(instance.auto_update_frequency, timezone.now())
 
 
 @receiver(post_save, sender=KPIDataPoint)
@@ -193,6 +194,18 @@ def auto_resolve_alerts(sender, instance, created, **kwargs):
                 )
 
 
+@receiver(post_save, sender=KPIDataPoint)
+def detect_anomalies(sender, instance, created, **kwargs):
+    """
+    Fold new data points into the KPI's streaming anomaly detector.
+    """
+    if not created:
+        return
+    
+    from .anomaly import record_datapoint
+    record_datapoint(instance)
+
+
 @receiver(post_save, sender=KPIDataPoint)
 def update_calculated_kpis(sender, instance, created, **kwargs):
     """
@@ -0,0 +1,178 @@
+"""
+Tests for the KPI collectors, against local stand-in HTTP servers and the
+test database (SQLite or PostgreSQL, whichever ``default`` is).
+"""
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from decimal import Decimal
+import io
+import json
+import threading
+import time
+
+from core.benchmarks import BenchmarkSuite
+from tenants.models import Tenant
+from .collectors import collect_api, collect_database, pool
+from .models import SmartKPI
+
+
+def collector_settings(**overrides):
+    """``COO_PLATFORM_SETTINGS`` with the given collector settings."""
+    return {
+        **settings.COO_PLATFORM_SETTINGS,
+        'COLLECTORS': {**settings.COO_PLATFORM_SETTINGS.get('COLLECTORS', {}), **overrides},
+    }
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Keep-alive JSON endpoint closing connections idle for ``timeout`` seconds."""
+    
+    protocol_version = 'HTTP/1.1'
+    timeout = 0.5
+    
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+    
+    def do_GET(self):
+        if self.path.startswith('/error'):
+            status, body = 500, b'{}'
+        else:
+            status, body = 200, json.dumps({'data': [{'value': 42}]}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+class APICollectorTests(SimpleTestCase):
+    
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        self.server.connections = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.addCleanup(pool.clear)
+    
+    def kpi(self, path='/value', **config):
+        host, port = self.server.server_address
+        return SmartKPI(
+            name=f'API {path}',
+            data_source_type='api',
+            data_source_config={'url': f'http://{host}:{port}{path}', 'value_path': 'data.0.value', **config},
+        )
+    
+    @override_settings(COO_PLATFORM_SETTINGS=collector_settings(API_ALLOWED_HOSTS=['127.0.0.1']))
+    def test_collects_value(self):
+        kpi = self.kpi()
+        self.assertEqual(collect_api([kpi]), {kpi.id: 42})
+    
+    @override_settings(COO_PLATFORM_SETTINGS=collector_settings(API_ALLOWED_HOSTS=['127.0.0.1']))
+    def test_reuses_keep_alive_connection(self):
+        kpi = self.kpi()
+        collect_api([kpi])
+        collect_api([kpi])
+        self.assertEqual(self.server.connections, 1)
+    
+    @override_settings(COO_PLATFORM_SETTINGS=collector_settings(
+        API_ALLOWED_HOSTS=['127.0.0.1'], API_IDLE_SECONDS=60
+    ))
+    def test_retries_connection_closed_by_server(self):
+        kpi = self.kpi()
+        self.assertEqual(collect_api([kpi]), {kpi.id: 42})
+        # The server closes the pooled connection after 0.5s idle
+        time.sleep(1.0)
+        self.assertEqual(collect_api([kpi]), {kpi.id: 42})
+        self.assertEqual(self.server.connections, 2)
+    
+    @override_settings(COO_PLATFORM_SETTINGS=collector_settings(
+        API_ALLOWED_HOSTS=['127.0.0.1'], API_IDLE_SECONDS=0
+    ))
+    def test_drops_idle_connections(self):
+        kpi = self.kpi()
+        collect_api([kpi])
+        time.sleep(0.05)
+        collect_api([kpi])
+        self.assertEqual(self.server.connections, 2)
+    
+    @override_settings(COO_PLATFORM_SETTINGS=collector_settings(API_ALLOWED_HOSTS=['127.0.0.1']))
+    def test_http_error_is_skipped(self):
+        ok, failing = self.kpi(), self.kpi('/error')
+        self.assertEqual(collect_api([ok, failing]), {ok.id: 42})
+    
+    @override_settings(COO_PLATFORM_SETTINGS=collector_settings(API_ALLOWED_HOSTS=[]))
+    def test_no_allowed_hosts_denies_every_host(self):
+        self.assertEqual(collect_api([self.kpi()]), {})
+        self.assertEqual(self.server.connections, 0)
+    
+    @override_settings(COO_PLATFORM_SETTINGS=collector_settings(API_ALLOWED_HOSTS=['example.com']))
+    def test_other_hosts_are_denied(self):
+        self.assertEqual(collect_api([self.kpi()]), {})
+        self.assertEqual(self.server.connections, 0)
+
+
+@override_settings(COO_PLATFORM_SETTINGS=collector_settings(DATABASES=['default'], DB_CACHE_SECONDS=0))
+class DatabaseCollectorTests(TransactionTestCase):
+    
+    def kpi(self, query, **config):
+        return SmartKPI(
+            name=query,
+            data_source_type='database',
+            data_source_config={'database': 'default', 'query': query, **config},
+        )
+    
+    def test_collects_value(self):
+        kpi = self.kpi('SELECT 42')
+        self.assertEqual(collect_database([kpi]), {kpi.id: 42})
+    
+    def test_query_params(self):
+        kpi = self.kpi('SELECT %s + 1', params=[41])
+        self.assertEqual(collect_database([kpi]), {kpi.id: 42})
+    
+    def test_kpis_sharing_a_query(self):
+        first, second = self.kpi('SELECT 7'), self.kpi('SELECT 7')
+        self.assertEqual(collect_database([first, second]), {first.id: 7, second.id: 7})
+    
+    def test_only_select_statements(self):
+        kpis = [self.kpi('DELETE FROM kpis_smartkpi'), self.kpi('SELECT 1; SELECT 2')]
+        self.assertEqual(collect_database(kpis), {})
+    
+    def test_runs_read_only(self):
+        kpi = self.kpi('WITH doomed AS (SELECT 1) DELETE FROM kpis_smartkpi')
+        self.assertEqual(collect_database([kpi]), {})
+    
+    @override_settings(COO_PLATFORM_SETTINGS=collector_settings(DATABASES=[], DB_CACHE_SECONDS=0))
+    def test_disabled_database(self):
+        self.assertEqual(collect_database([self.kpi('SELECT 42')]), {})
+
+
+class KPIDashboardViewTests(TestCase):
+    
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'generate_load_data', tenants=1, users=2, projects=1, tasks=2,
+            kpis=4, datapoints=40, rules=1, stdout=io.StringIO()
+        )
+    
+    def test_stable_good_tiles(self):
+        tenant = Tenant.objects.get()
+        SmartKPI.objects.filter(tenant=tenant).update(
+            trend_direction='stable_good', target_value=Decimal('100'), is_featured=True, is_active=True
+        )
+        client = BenchmarkSuite(tenant, iterations=1, warmup=0).client
+        
+        response = client.get('/kpis/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        tiles = response.context['dashboard_kpis']
+        self.assertEqual(len(tiles), 4)
+        for tile in tiles:
+            self.assertIsInstance(tile.kpi.latest_value, Decimal)
+            self.assertIn(tile.kpi.calculate_performance_status(), ('excellent', 'good', 'warning', 'critical'))
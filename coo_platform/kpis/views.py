@@ -18,11 +18,17 @@ from .models import (
     SmartKPI, KPICategory, KPIDataPoint, KPIAlert, 
     KPIDashboard, DashboardKPI
 )
+from .forecasting import get_forecast
+from .series import KPISeries, attach_recent_series
+from core.fastjson import FastJsonResponse
 from core.views import DashboardMixin
 from core.utils import log_user_action, create_notification
 from tenants.middleware import get_current_tenant
 import json
 
+# Data points in the sparklines of the KPI list and dashboard tiles
+SPARKLINE_POINTS = 30
+
 
 class KPIListView(DashboardMixin, LoginRequiredMixin, ListView):
     """
@@ -41,7 +47,9 @@ class KPIListView(DashboardMixin, LoginRequiredMixin, ListView):
         queryset = SmartKPI.objects.filter(
             tenant=tenant, 
             is_active=True
-        ).select_related('category', 'owner').prefetch_related('stakeholders')
+        ).select_related('category', 'owner').prefetch_related(
+            'stakeholders'
+        )
         
         # Filter by category if specified
         category = self.request.GET.get('category')
@@ -72,6 +80,11 @@ class KPIListView(DashboardMixin, LoginRequiredMixin, ListView):
         context = super().get_context_data(**kwargs)
         tenant = get_current_tenant()
         
+        # Sparklines of the KPIs on this page only, with one query
+        context['kpis'] = context['object_list'] = attach_recent_series(
+            context['object_list'], SPARKLINE_POINTS
+        )
+        
         if tenant:
             categories = KPICategory.objects.filter(tenant=tenant, is_active=True)
             
@@ -155,8 +168,8 @@ class KPIDetailView(DashboardMixin, LoginRequiredMixin, DetailView):
         context = super().get_context_data(**kwargs)
         kpi = self.object
         
-        # Get recent data points
-        recent_datapoints = kpi.datapoints.order_by('-date')[:30]
+        # Get recent data points (the table does not show notes or metadata)
+        recent_datapoints = kpi.datapoints.defer('notes', 'metadata').order_by('-date')[:30]
         
         # Get trend data for charts
         trend_data = kpi.get_trend_data(days=90)
@@ -164,32 +177,8 @@ class KPIDetailView(DashboardMixin, LoginRequiredMixin, DetailView):
         # Get recent alerts
         recent_alerts = kpi.alerts.filter(is_resolved=False).order_by('-created_at')[:10]
         
-        # Calculate basic statistics
-        if recent_datapoints:
-            values = [dp.value for dp in recent_datapoints]
-            stats = {
-                'current': values[0] if values else None,
-                'previous': values[1] if len(values) > 1 else None,
-                'average': sum(values) / len(values) if values else None,
-                'min': min(values) if values else None,
-                'max': max(values) if values else None,
-            }
-            
-            # Calculate change from previous period
-            if stats['current'] and stats['previous']:
-                change = ((stats['current'] - stats['previous']) / stats['previous']) * 100
-                stats['change_percent'] = round(float(change), 2)
-            else:
-                stats['change_percent'] = None
-        else:
-            stats = {
-                'current': None,
-                'previous': None,
-                'average': None,
-                'min': None,
-                'max': None,
-                'change_percent': None,
-            }
+        # Calculate basic statistics over the recent data points
+        stats = KPISeries.from_rows((dp.date, dp.value) for dp in reversed(recent_datapoints)).stats()
         
         context.update({
             'recent_datapoints': recent_datapoints,
@@ -197,6 +186,7 @@ class KPIDetailView(DashboardMixin, LoginRequiredMixin, DetailView):
             'recent_alerts': recent_alerts,
             'stats': stats,
             'performance_status': kpi.calculate_performance_status(),
+            'forecast': get_forecast(kpi),
         })
         
         return context
@@ -228,10 +218,6 @@ class KPICreateView(LoginRequiredMixin, CreateView):
         
         response = super().form_valid(form)
         
-        # Schedule next update if automated
-        if self.object.auto_update_frequency:
-            self.object.schedule_next_update()
-        
         log_user_action(
             self.request, 'create', 'SmartKPI', 
             str(self.object.id), f'Created KPI: {self.object.name}'
@@ -319,12 +305,12 @@ def kpi_chart_data(request, kpi_id):
     """
     tenant = get_current_tenant()
     if not tenant:
-        return JsonResponse({'error': 'No tenant found'}, status=404)
+        return FastJsonResponse({'error': 'No tenant found'}, status=404)
     
     try:
         kpi = SmartKPI.objects.get(id=kpi_id, tenant=tenant)
     except SmartKPI.DoesNotExist:
-        return JsonResponse({'error': 'KPI not found'}, status=404)
+        return FastJsonResponse({'error': 'KPI not found'}, status=404)
     
     # Get time range from request
     days = int(request.GET.get('days', 30))
@@ -381,7 +367,7 @@ def kpi_chart_data(request, kpi_id):
             'pointRadius': 0
         })
     
-    return JsonResponse({
+    return FastJsonResponse({
         'chart_config': chart_config,
         'current_value': float(kpi.get_latest_value() or 0),
         'target_value': float(kpi.target_value or 0),
@@ -408,8 +394,8 @@ def kpi_dashboard_view(request, dashboard_id=None):
         )
         
         # Check permissions
-        if not dashboard.is_public and dashboard.owner != request.user:
-            if request.user not in dashboard.shared_with.all():
+        if not dashboard.is_public and dashboard.owner_id != request.user.id:
+            if not dashboard.shared_with.filter(pk=request.user.pk).exists():
                 messages.error(request, 'You do not have access to this dashboard.')
                 return redirect('kpis:list')
     else:
@@ -446,14 +432,23 @@ def kpi_dashboard_view(request, dashboard_id=None):
                 )
     
     # Get dashboard KPIs
-    dashboard_kpis = DashboardKPI.objects.filter(
+    dashboard_kpis = list(DashboardKPI.objects.filter(
         dashboard=dashboard
-    ).select_related('kpi', 'kpi__category').order_by('position_y', 'position_x')
+    ).select_related('kpi', 'kpi__category').order_by('position_y', 'position_x'))
+    
+    # Latest values, statuses and sparklines of every tile from one window-function query;
+    # the full chart of a tile is only fetched (from kpi_chart_data) when it is expanded
+    recent = KPISeries.load_recent([tile.kpi_id for tile in dashboard_kpis], SPARKLINE_POINTS)
+    for tile in dashboard_kpis:
+        tile.series = recent[tile.kpi_id]
+        # Decimal, like the data point values calculate_performance_status() compares to the targets
+        last = tile.series.last
+        tile.kpi.latest_value = Decimal(str(last)) if last is not None else None
     
     context = {
         'dashboard': dashboard,
         'dashboard_kpis': dashboard_kpis,
-        'can_edit': dashboard.owner == request.user,
+        'can_edit': dashboard.owner_id == request.user.id,
     }
     
     return render(request, 'kpis/dashboard.html', context)
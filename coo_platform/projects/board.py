@@ -0,0 +1,108 @@
+"""
+Kanban board of a project's tasks.
+
+The board is one column per task status, each ordered by the tasks'
+fractional ``rank`` (see ``projects.ranking``). ``get_board`` reads the
+first tasks and the task count of every column with a single windowed
+query; ``move_task`` places a task between two neighbours by giving it a
+rank between theirs, without renumbering the column.
+"""
+from django.db.models import Count, F, Window
+from django.utils import timezone
+import uuid
+
+from core.utils import top_n_per_group
+from .models import Task
+from .ranking import is_overlong, rank_between, rebalance_column
+
+BOARD_COLUMN_SIZE = 50
+
+MAX_BOARD_COLUMN_SIZE = 200
+
+COLUMN_ORDERING = ('rank', 'created_at')
+
+
+def get_board(queryset, size=BOARD_COLUMN_SIZE):
+    """
+    Return the board columns of the tasks in ``queryset``, in status order:
+    ``[{'status', 'label', 'count', 'tasks'}]`` with the first ``size``
+    tasks of each column and its total task count.
+    """
+    tasks = top_n_per_group(queryset, 'status', list(COLUMN_ORDERING), size).annotate(
+        column_count=Window(Count('id'), partition_by=[F('status')])
+    ).order_by('status', *COLUMN_ORDERING)
+    
+    columns = {
+        status: {'status': status, 'label': label, 'count': 0, 'tasks': []}
+        for status, label in Task.STATUS_CHOICES
+    }
+    for task in tasks:
+        column = columns[task.status]
+        column['count'] = task.column_count
+        column['tasks'].append(task)
+    return list(columns.values())
+
+
+def _neighbour_ranks(task, status, after=None, before=None):
+    """
+    Return the ranks the moved ``task`` goes between in the ``status``
+    column: those of the ``after`` and ``before`` task ids, or of the
+    adjacent task in the column when only one of them is given (the bottom
+    of the column when neither is).
+    """
+    for pk in (after, before):
+        if pk:
+            try:
+                uuid.UUID(str(pk))
+            except ValueError:
+                raise ValueError(f'Invalid task id: {pk}')
+    
+    column = Task.objects.filter(project_id=task.project_id, status=status).exclude(pk=task.pk)
+    ranks = dict(column.filter(pk__in=[pk for pk in (after, before) if pk]).values_list('id', 'rank'))
+    ranks = {str(pk): rank for pk, rank in ranks.items()}
+    for pk in (after, before):
+        if pk and str(pk) not in ranks:
+            raise ValueError(f'Task {pk} is not in the {status} column')
+    
+    lower = ranks[str(after)] if after else None
+    upper = ranks[str(before)] if before else None
+    if after and not before:
+        upper = column.filter(rank__gt=lower).order_by('rank').values_list('rank', flat=True).first()
+    elif before and not after:
+        lower = column.filter(rank__lt=upper).order_by('-rank').values_list('rank', flat=True).first()
+    elif not after and not before:
+        lower = column.order_by('-rank').values_list('rank', flat=True).first()
+    return lower, upper
+
+
+def move_task(task, status, after=None, before=None):
+    """
+    Move ``task`` to the ``status`` column, after the task with id
+    ``after`` and before the one with id ``before``. Returns the new rank.
+    
+    A reorder within the column is a single-row UPDATE of the rank. A move
+    to another column saves the task, so status changes keep their side
+    effects (timestamps, project progress, notifications).
+    """
+    if status not in dict(Task.STATUS_CHOICES):
+        raise ValueError(f'Invalid status: {status}')
+    
+    lower, upper = _neighbour_ranks(task, status, after, before)
+    try:
+        # Unranked neighbours (rank '', e.g. from bulk_create) have no position yet
+        rank = rank_between(lower, upper) if '' not in (lower, upper) else None
+    except ValueError:
+        # Equal or inverted neighbour ranks
+        rank = None
+    if rank is None or is_overlong(rank):
+        rebalance_column(task.project_id, status)
+        rank = rank_between(*_neighbour_ranks(task, status, after, before))
+    
+    if status == task.status:
+        Task.objects.filter(pk=task.pk).update(rank=rank, updated_at=timezone.now())
+        task.rank = rank
+    else:
+        task.status = status
+        task.rank = rank
+        task.save()
+    return rank
@@ -0,0 +1,255 @@
+"""
+Task dependency graph of a project.
+
+The tasks and the ``depends_on`` edge list of a project are loaded with two
+queries; everything else runs in memory in O(V + E):
+
+- a topological order (Kahn's algorithm), which also finds dependency cycles
+- the blocked set: incomplete tasks with an incomplete task anywhere upstream
+- a critical path schedule: earliest start/finish from now and the remaining
+  ``estimated_hours`` (forward pass), latest start/finish from the due dates
+  and the project finish (backward pass), and the slack of every task
+
+``get_task_graph`` caches the analysis per project; the signals in
+``projects.signals`` invalidate it when a task or a dependency changes.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from collections import deque
+from datetime import timedelta
+
+from .models import Task
+
+DEFAULT_SETTINGS = {
+    # Duration assumed for tasks without an estimate
+    'DEFAULT_TASK_HOURS': 8,
+    'CACHE_SECONDS': 300,
+}
+
+
+def get_task_graph_settings():
+    """Return the task graph settings merged over the defaults."""
+    configured = settings.COO_PLATFORM_SETTINGS.get('TASK_GRAPH', {})
+    return {**DEFAULT_SETTINGS, **configured}
+
+
+class TaskGraph:
+    """Dependency graph of a project's tasks (edges point from a dependency to its dependents)."""
+    
+    def __init__(self, tasks, edges):
+        """``tasks`` is ``{id: {field: value}}``, ``edges`` ``(task_id, depends_on_id)`` pairs."""
+        self.tasks = tasks
+        self.dependencies = {task_id: [] for task_id in tasks}
+        self.dependents = {task_id: [] for task_id in tasks}
+        for task_id, dependency_id in edges:
+            # Dependencies on tasks of other projects are not part of the graph
+            if task_id in tasks and dependency_id in tasks:
+                self.dependencies[task_id].append(dependency_id)
+                self.dependents[dependency_id].append(task_id)
+    
+    @classmethod
+    def load(cls, project):
+        tasks = {
+            task['id']: task
+            for task in Task.objects.filter(project=project).order_by().values(
+                'id', 'title', 'status', 'estimated_hours', 'actual_hours',
+                'due_date', 'started_at', 'completed_at'
+            )
+        }
+        edges = Task.depends_on.through.objects.filter(
+            from_task__project=project
+        ).values_list('from_task_id', 'to_task_id')
+        return cls(tasks, edges)
+    
+    @property
+    def edge_count(self):
+        return sum(len(dependencies) for dependencies in self.dependencies.values())
+    
+    def is_complete(self, task_id):
+        return self.tasks[task_id]['status'] == 'completed'
+    
+    def topological_order(self):
+        """
+        Return ``(order, cyclic)``: the tasks with all their dependencies
+        before them, and the set of tasks left out because they are on or
+        downstream of a cycle.
+        """
+        remaining = {task_id: len(dependencies) for task_id, dependencies in self.dependencies.items()}
+        queue = deque(task_id for task_id, count in remaining.items() if count == 0)
+        order = []
+        
+        while queue:
+            task_id = queue.popleft()
+            order.append(task_id)
+            for dependent_id in self.dependents[task_id]:
+                remaining[dependent_id] -= 1
+                if remaining[dependent_id] == 0:
+                    queue.append(dependent_id)
+        
+        return order, set(self.tasks) - set(order)
+    
+    def find_cycle(self, cyclic):
+        """Return one dependency cycle (a list of task ids) among the ``cyclic`` tasks, or []."""
+        if not cyclic:
+            return []
+        
+        # Every cyclic task has a cyclic dependency: follow them until one repeats
+        task_id = next(iter(cyclic))
+        seen = {}
+        path = []
+        while task_id not in seen:
+            seen[task_id] = len(path)
+            path.append(task_id)
+            task_id = next(dependency for dependency in self.dependencies[task_id] if dependency in cyclic)
+        return path[seen[task_id]:]
+    
+    def blocked(self, order, cyclic):
+        """
+        Incomplete tasks with an incomplete dependency, direct or
+        transitive. Tasks on or after a cycle can never start, so they are
+        blocked too.
+        """
+        # Tasks that are incomplete or sit after an incomplete task
+        pending = set(cyclic)
+        blocked = set(task_id for task_id in cyclic if not self.is_complete(task_id))
+        for task_id in order:
+            if any(dependency in pending for dependency in self.dependencies[task_id]):
+                if not self.is_complete(task_id):
+                    blocked.add(task_id)
+                pending.add(task_id)
+            elif not self.is_complete(task_id):
+                pending.add(task_id)
+        return blocked
+    
+    def downstream(self, task_id):
+        """Every task depending on ``task_id``, directly or transitively."""
+        found = set()
+        queue = deque([task_id])
+        while queue:
+            for dependent_id in self.dependents[queue.popleft()]:
+                if dependent_id not in found:
+                    found.add(dependent_id)
+                    queue.append(dependent_id)
+        return found
+    
+    def remaining_hours(self, task_id, default_hours):
+        task = self.tasks[task_id]
+        if task['status'] == 'completed':
+            return 0.0
+        estimate = float(task['estimated_hours']) if task['estimated_hours'] is not None else default_hours
+        return max(estimate - float(task['actual_hours'] or 0), 0.0)
+    
+    def schedule(self, order, now=None, default_hours=None):
+        """
+        Earliest and latest start/finish and slack (hours) of every task in
+        ``order``. Completed tasks finish at their completion time; the
+        others cannot start before ``now``.
+        """
+        now = now or timezone.now()
+        default_hours = get_task_graph_settings()['DEFAULT_TASK_HOURS'] if default_hours is None else default_hours
+        schedule = {}
+        
+        for task_id in order:
+            task = self.tasks[task_id]
+            if task['status'] == 'completed':
+                finish = task['completed_at'] or now
+                schedule[task_id] = {'earliest_start': finish, 'earliest_finish': finish}
+                continue
+            
+            start = max([now] + [schedule[dependency]['earliest_finish'] for dependency in self.dependencies[task_id]])
+            schedule[task_id] = {
+                'earliest_start': start,
+                'earliest_finish': start + timedelta(hours=self.remaining_hours(task_id, default_hours)),
+            }
+        
+        finish = max((times['earliest_finish'] for times in schedule.values()), default=now)
+        for task_id in reversed(order):
+            times = schedule[task_id]
+            latest_finish = min(
+                [schedule[dependent]['latest_start'] for dependent in self.dependents[task_id] if dependent in schedule]
+                or [finish]
+            )
+            if self.tasks[task_id]['due_date'] and self.tasks[task_id]['status'] != 'completed':
+                latest_finish = min(latest_finish, self.tasks[task_id]['due_date'])
+            
+            duration = times['earliest_finish'] - times['earliest_start']
+            times['latest_finish'] = latest_finish
+            times['latest_start'] = latest_finish - duration
+            times['slack_hours'] = round((times['latest_start'] - times['earliest_start']).total_seconds() / 3600, 2)
+        
+        return schedule
+    
+    def critical_path(self, schedule):
+        """
+        The chain of incomplete tasks that determines the project finish:
+        from the task finishing last, back through the dependency that
+        finishes last at each step.
+        """
+        pending = [task_id for task_id in schedule if not self.is_complete(task_id)]
+        if not pending:
+            return []
+        
+        task_id = max(pending, key=lambda task_id: schedule[task_id]['earliest_finish'])
+        path = [task_id]
+        while True:
+            dependencies = [
+                dependency for dependency in self.dependencies[task_id]
+                if dependency in schedule and not self.is_complete(dependency)
+            ]
+            if not dependencies:
+                break
+            task_id = max(dependencies, key=lambda dependency: schedule[dependency]['earliest_finish'])
+            path.append(task_id)
+        
+        path.reverse()
+        return path
+    
+    def analyze(self, now=None):
+        """Run the whole analysis; returns a dict suitable for caching and JSON responses."""
+        order, cyclic = self.topological_order()
+        schedule = self.schedule(order, now)
+        critical_path = self.critical_path(schedule)
+        
+        return {
+            'task_count': len(self.tasks),
+            'edge_count': self.edge_count,
+            'cycle': self.find_cycle(cyclic),
+            'cyclic': sorted(cyclic, key=str),
+            'blocked': sorted(self.blocked(order, cyclic), key=str),
+            'critical_path': critical_path,
+            'finish': schedule[critical_path[-1]]['earliest_finish'] if critical_path else None,
+            'schedule': schedule,
+        }
+
+
+def task_graph_key(project_id):
+    return f'task-graph:{project_id}'
+
+
+def get_task_graph(project):
+    """The cached dependency analysis of ``project`` (see ``TaskGraph.analyze``)."""
+    key = task_graph_key(project.pk)
+    analysis = cache.get(key)
+    if analysis is None:
+        analysis = TaskGraph.load(project).analyze()
+        cache.set(key, analysis, get_task_graph_settings()['CACHE_SECONDS'])
+    return analysis
+
+
+def mark_tasks(tasks, analysis):
+    """
+    Set ``is_dependency_blocked``, ``is_critical`` and ``slack_hours`` on
+    the ``tasks`` instances from a ``get_task_graph`` analysis.
+    """
+    blocked = set(analysis['blocked'])
+    critical = set(analysis['critical_path'])
+    for task in tasks:
+        task.is_dependency_blocked = task.id in blocked
+        task.is_critical = task.id in critical
+        task.slack_hours = analysis['schedule'].get(task.id, {}).get('slack_hours')
+    return tasks
+
+
+def invalidate_task_graph(project_id):
+    cache.delete(task_graph_key(project_id))
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def rank_existing_tasks(apps, schema_editor):
+    from projects.ranking import spaced_ranks
+
+    Task = apps.get_model('projects', 'Task')
+    columns = Task.objects.order_by().values_list('project_id', 'status').distinct()
+    for project_id, status in columns:
+        tasks = list(
+            Task.objects.filter(project_id=project_id, status=status)
+            .order_by('priority', 'due_date', 'created_at')
+            .only('id')
+        )
+        for task, rank in zip(tasks, spaced_ranks(len(tasks))):
+            task.rank = rank
+        Task.objects.bulk_update(tasks, ['rank'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='rank',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['project', 'status', 'rank'], name='projects_ta_project_0fec5d_idx'),
+        ),
+        migrations.RunPython(rank_existing_tasks, migrations.RunPython.noop),
+    ]
@@ -17,7 +17,7 @@ class ProjectCategory(TenantAwareModel, TimeStampedModel):
     Categories for organizing projects.
     """
     objects = TenantAwareManager()
-
+    
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     color = models.CharField(max_length=7, default='#007bff', help_text="Hex color code")
@@ -38,7 +38,7 @@ class Project(UUIDModel, TenantAwareModel, TimeStampedModel):
     """
     # Use the tenant-aware manager
     objects = TenantAwareManager()
-
+    
     STATUS_CHOICES = [
         ('planning', 'Planning'),
         ('active', 'Active'),
@@ -293,10 +293,14 @@ class Task(UUIDModel, TimeStampedModel):
     # Metadata
     tags = models.JSONField(default=list, blank=True)
     
+    # Position within the status column of the Kanban board (see projects.ranking)
+    rank = models.CharField(max_length=64, blank=True, default='')
+    
     class Meta:
         ordering = ['priority', 'due_date', 'created_at']
         indexes = [
             models.Index(fields=['project', 'status']),
+            models.Index(fields=['project', 'status', 'rank']),
             models.Index(fields=['assigned_to', 'status']),
             models.Index(fields=['due_date']),
         ]
@@ -311,6 +315,17 @@ class Task(UUIDModel, TimeStampedModel):
         elif self.status == 'completed' and not self.completed_at:
             self.completed_at = timezone.now()
         
+        # New tasks go to the bottom of their column
+        if not self.rank:
+            from .ranking import is_overlong, rank_after, rebalance_column
+            column = Task.objects.filter(
+                project_id=self.project_id, status=self.status
+            ).exclude(pk=self.pk).order_by('-rank').values_list('rank', flat=True)
+            self.rank = rank_after(column.first())
+            if is_overlong(self.rank):
+                rebalance_column(self.project_id, self.status)
+                self.rank = rank_after(column.first())
+        
         super().save(*args, **kwargs)
         
         # Update project progress when task status changes
@@ -0,0 +1,145 @@
+"""
+Fractional ranks ordering the tasks within a Kanban column.
+
+A rank is a string of base-36 digits (``0-9a-z``) read as a fraction:
+``"h"`` is 17/36, ``"h8"`` is 17/36 + 8/1296. Ranks sort like their
+fractions when compared as strings (they never end with ``"0"``), and there
+is always a rank between two others, so moving a task only rewrites its
+own rank: a single-row UPDATE.
+
+Appending to a column steps the leading digit (``"h"``, ``"i"``, ...,
+``"z"``, ``"z1"``, ...), so ranks grow one digit per 35 appends; repeated
+inserts at the same spot halve the gap and grow faster. ``rebalance_column``
+rewrites a column with short, evenly spaced ranks: ``Task.save`` and
+``move_task`` do so when a rank would exceed ``MAX_RANK_LENGTH``, and the
+``rebalance_task_ranks`` task for every column with overlong or missing ranks.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.db.models.functions import Length
+
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+BASE = len(DIGITS)
+
+DEFAULT_SETTINGS = {
+    # Columns whose longest rank exceeds this many digits are rebalanced
+    'MAX_RANK_LENGTH': 12,
+}
+
+
+def get_ranking_settings():
+    """Return the Kanban ranking settings merged over the defaults."""
+    configured = settings.COO_PLATFORM_SETTINGS.get('RANKING', {})
+    return {**DEFAULT_SETTINGS, **configured}
+
+
+def rank_between(lower=None, upper=None):
+    """
+    Return a rank sorting after ``lower`` and before ``upper`` (None or ''
+    for the start and end of the column). Raises ``ValueError`` unless
+    ``lower < upper``.
+    """
+    lower = lower or ''
+    if not upper:
+        return rank_after(lower)
+    if lower >= upper:
+        raise ValueError(f'Cannot rank between {lower!r} and {upper!r}')
+    return _midpoint(lower, upper)
+
+
+def rank_after(rank):
+    """
+    Return a rank after ``rank`` with nothing above it: the first digit
+    below ``"z"`` is stepped up and the rest dropped (``"h3"`` -> ``"i"``,
+    ``"zz"`` -> ``"zz1"``), so appends only lengthen ranks every 35 steps.
+    """
+    if not rank:
+        return _midpoint('', None)
+    for position, digit in enumerate(rank):
+        if digit != DIGITS[-1]:
+            return rank[:position] + DIGITS[DIGITS.index(digit) + 1]
+    return rank + DIGITS[1]
+
+
+def _midpoint(low, high):
+    # Digits shared by both ends (``low`` is padded with zeros) are kept
+    if high is not None:
+        common = 0
+        while common < len(high) and (low[common] if common < len(low) else '0') == high[common]:
+            common += 1
+        if common:
+            return high[:common] + _midpoint(low[common:], high[common:])
+    
+    low_digit = DIGITS.index(low[0]) if low else 0
+    high_digit = DIGITS.index(high[0]) if high is not None else BASE
+    if high_digit - low_digit > 1:
+        return DIGITS[(low_digit + high_digit) // 2]
+    
+    # Consecutive first digits: ``high``'s first digit alone still sorts
+    # before ``high`` if it has more digits; otherwise look past ``low``'s
+    if high is not None and len(high) > 1:
+        return high[0]
+    return DIGITS[low_digit] + _midpoint(low[1:], None)
+
+
+def spaced_ranks(count):
+    """``count`` increasing ranks spread evenly over the whole range, as short as possible."""
+    width = 1
+    while BASE ** width <= count:
+        width += 1
+    
+    step = BASE ** width // (count + 1)
+    ranks = []
+    for position in range(1, count + 1):
+        value = position * step
+        digits = []
+        for _ in range(width):
+            value, digit = divmod(value, BASE)
+            digits.append(DIGITS[digit])
+        ranks.append(''.join(reversed(digits)).rstrip('0'))
+    return ranks
+
+
+def rebalance_column(project_id, status):
+    """
+    Give the tasks of one column short, evenly spaced ranks, keeping their
+    order. Returns the number of tasks updated.
+    """
+    from .models import Task
+    
+    with transaction.atomic():
+        tasks = list(
+            Task.objects.select_for_update()
+            .filter(project_id=project_id, status=status)
+            .order_by('rank', 'created_at')
+            .only('id', 'rank')
+        )
+        changed = []
+        for task, rank in zip(tasks, spaced_ranks(len(tasks))):
+            if task.rank != rank:
+                task.rank = rank
+                changed.append(task)
+        Task.objects.bulk_update(changed, ['rank'], batch_size=500)
+    return len(changed)
+
+
+def is_overlong(rank):
+    return len(rank) > get_ranking_settings()['MAX_RANK_LENGTH']
+
+
+def columns_to_rebalance(max_length=None):
+    """
+    Return the ``(project_id, status)`` columns with a rank longer than
+    ``max_length`` digits or tasks without a rank, with one query.
+    """
+    from .models import Task
+    
+    max_length = max_length or get_ranking_settings()['MAX_RANK_LENGTH']
+    return list(
+        Task.objects.order_by().values('project_id', 'status').annotate(
+            longest=Max(Length('rank')),
+            unranked=Count('id', filter=Q(rank='')),
+        ).filter(Q(longest__gt=max_length) | Q(unranked__gt=0)).values_list('project_id', 'status')
+    )
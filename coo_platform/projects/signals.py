@@ -1,7 +1,7 @@
 """
 Django signals for projects app.
 """
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.db.models.signals import post_save, post_delete, pre_save, m2m_changed
 from django.dispatch import receiver
 from .models import Project, Task, ProjectMembership
 from core.utils import create_notification
@@ -158,3 +158,29 @@ def project_status_changed(sender, instance, **kwargs):
         # Clean up temporary attributes
         delattr(instance, '_status_changed')
         delattr(instance, '_old_status')
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def task_graph_changed(sender, instance, **kwargs):
+    """
+    Drop the cached dependency graph of the task's project.
+    """
+    from .graph import invalidate_task_graph
+    invalidate_task_graph(instance.project_id)
+
+
+@receiver(m2m_changed, sender=Task.depends_on.through)
+def task_dependencies_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Drop the cached dependency graphs of the projects whose edges changed.
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    
+    from .graph import invalidate_task_graph
+    project_ids = {instance.project_id}
+    if pk_set:
+        project_ids.update(Task.objects.filter(pk__in=pk_set).values_list('project_id', flat=True).distinct())
+    for project_id in project_ids:
+        invalidate_task_graph(project_id)
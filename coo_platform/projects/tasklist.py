@@ -0,0 +1,101 @@
+"""
+Keyset-paginated task list of a project.
+
+Tasks are listed most urgent first, then by due date (tasks without one
+last), then by id, which makes the order total. A page ends with a cursor
+encoding the sort key of its last task; the next page is read with
+``keyset_after`` from there, so deep pages cost the same as the first one
+and tasks added or completed meanwhile do not shift rows between pages.
+"""
+from django.db.models import Case, When, Value, IntegerField, DateTimeField, Q
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+from datetime import datetime, timezone as dt_timezone
+import base64
+import uuid
+
+from core import fastjson
+from core.utils import keyset_after
+
+TASK_PAGE_SIZE = 50
+
+MAX_TASK_PAGE_SIZE = 200
+
+PRIORITY_RANK = {'urgent': 0, 'high': 1, 'medium': 2, 'low': 3}
+
+# Sort key of tasks without a due date
+NO_DUE_DATE = datetime(9999, 12, 31, tzinfo=dt_timezone.utc)
+
+ORDERING = ('priority_rank', 'due_key', 'id')
+
+
+def with_sort_key(queryset):
+    """Annotate the ``priority_rank`` and ``due_key`` fields of the task ordering."""
+    return queryset.annotate(
+        priority_rank=Case(
+            *[When(priority=priority, then=Value(rank)) for priority, rank in PRIORITY_RANK.items()],
+            default=Value(len(PRIORITY_RANK)),
+            output_field=IntegerField()
+        ),
+        due_key=Coalesce('due_date', Value(NO_DUE_DATE, output_field=DateTimeField())),
+    )
+
+
+def filter_tasks(queryset, params):
+    """
+    Apply the task list filters in ``params`` (a QueryDict): ``status``,
+    ``priority``, ``assigned_to`` (a user id, or ``none``) and ``q`` (title
+    search). Raises ``ValueError`` if ``assigned_to`` is not a user id.
+    """
+    if params.get('status'):
+        queryset = queryset.filter(status=params['status'])
+    if params.get('priority'):
+        queryset = queryset.filter(priority=params['priority'])
+    
+    assigned_to = params.get('assigned_to')
+    if assigned_to == 'none':
+        queryset = queryset.filter(assigned_to__isnull=True)
+    elif assigned_to:
+        try:
+            queryset = queryset.filter(assigned_to_id=int(assigned_to))
+        except ValueError as exc:
+            raise ValueError(f'Invalid assigned_to: {assigned_to}') from exc
+    
+    if params.get('q'):
+        queryset = queryset.filter(Q(title__icontains=params['q']) | Q(description__icontains=params['q']))
+    return queryset
+
+
+def encode_cursor(task):
+    key = [task.priority_rank, task.due_key.isoformat(), str(task.id)]
+    return base64.urlsafe_b64encode(fastjson.dumps(key)).decode()
+
+
+def decode_cursor(cursor):
+    """Return the sort key encoded in ``cursor``; raises ``ValueError`` if it is invalid."""
+    try:
+        rank, due, task_id = fastjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+        due = parse_datetime(due)
+        if due is None:
+            raise ValueError
+        return [int(rank), due, uuid.UUID(task_id)]
+    except (TypeError, ValueError) as exc:
+        raise ValueError('Invalid cursor') from exc
+
+
+def get_task_page(queryset, cursor=None, size=TASK_PAGE_SIZE):
+    """
+    Return ``(tasks, next_cursor)``: the ``size`` tasks of ``queryset``
+    after ``cursor`` (from the start without one), and the cursor of the
+    following page (None on the last page).
+    """
+    queryset = with_sort_key(queryset).order_by(*ORDERING)
+    if cursor:
+        queryset = keyset_after(queryset, ORDERING, decode_cursor(cursor))
+    
+    # One extra row tells whether there is a next page
+    tasks = list(queryset[:size + 1])
+    if len(tasks) > size:
+        tasks = tasks[:size]
+        return tasks, encode_cursor(tasks[-1])
+    return tasks, None
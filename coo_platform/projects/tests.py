@@ -0,0 +1,256 @@
+"""
+Tests for the Kanban ranks of the task columns and the task dependency graph.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from datetime import datetime, timedelta, timezone
+import io
+import random
+
+from .board import move_task
+from .graph import TaskGraph
+from .models import Project, Task
+from .ranking import (
+    DIGITS, columns_to_rebalance, is_overlong, rank_after, rank_between, spaced_ranks
+)
+
+
+def ranking_settings(**overrides):
+    """``COO_PLATFORM_SETTINGS`` with the given Kanban ranking settings."""
+    return {
+        **settings.COO_PLATFORM_SETTINGS,
+        'RANKING': {**settings.COO_PLATFORM_SETTINGS.get('RANKING', {}), **overrides},
+    }
+
+
+class RankTests(SimpleTestCase):
+    
+    def assertValidRank(self, rank):
+        self.assertTrue(rank)
+        self.assertFalse(rank.endswith('0'), rank)
+        self.assertTrue(set(rank) <= set(DIGITS), rank)
+    
+    def test_random_inserts_keep_order(self):
+        generator = random.Random(42)
+        ranks = [rank_between()]
+        for _ in range(1000):
+            position = generator.randint(0, len(ranks))
+            lower = ranks[position - 1] if position else None
+            upper = ranks[position] if position < len(ranks) else None
+            rank = rank_between(lower, upper)
+            self.assertValidRank(rank)
+            self.assertTrue((lower or '') < rank, (lower, rank))
+            if upper:
+                self.assertLess(rank, upper)
+            ranks.insert(position, rank)
+        self.assertEqual(ranks, sorted(set(ranks)))
+    
+    def test_repeated_inserts_at_one_spot(self):
+        for lower, upper in (('h', 'i'), (None, '1'), ('y', None)):
+            with self.subTest(lower=lower, upper=upper):
+                for _ in range(100):
+                    rank = rank_between(lower, upper)
+                    self.assertValidRank(rank)
+                    self.assertTrue((lower or '') < rank and (not upper or rank < upper))
+                    upper = rank
+    
+    def test_unordered_bounds_raise(self):
+        for lower, upper in (('b', 'a'), ('h', 'h')):
+            with self.assertRaises(ValueError):
+                rank_between(lower, upper)
+    
+    def test_rank_after_steps_the_first_digit(self):
+        self.assertEqual(rank_after('h3'), 'i')
+        self.assertEqual(rank_after('zz'), 'zz1')
+        self.assertEqual(rank_after(None), rank_between())
+        
+        ranks = [rank_after(None)]
+        for _ in range(100):
+            ranks.append(rank_after(ranks[-1]))
+        self.assertEqual(ranks, sorted(set(ranks)))
+        self.assertLessEqual(max(len(rank) for rank in ranks), 4)
+    
+    def test_spaced_ranks(self):
+        for count in (1, 2, 35, 36, 1000):
+            with self.subTest(count=count):
+                ranks = spaced_ranks(count)
+                self.assertEqual(len(ranks), count)
+                self.assertEqual(ranks, sorted(set(ranks)))
+                for rank in ranks:
+                    self.assertValidRank(rank)
+        self.assertEqual(max(len(rank) for rank in spaced_ranks(35)), 1)
+        self.assertEqual(max(len(rank) for rank in spaced_ranks(1000)), 2)
+    
+    @override_settings(COO_PLATFORM_SETTINGS=ranking_settings(MAX_RANK_LENGTH=3))
+    def test_is_overlong(self):
+        self.assertFalse(is_overlong('abc'))
+        self.assertTrue(is_overlong('abc1'))
+
+
+@override_settings(COO_PLATFORM_SETTINGS=ranking_settings(MAX_RANK_LENGTH=3))
+class RebalanceTests(TestCase):
+    """Ranks longer than MAX_RANK_LENGTH get the column rebalanced."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'generate_load_data', tenants=1, users=1, projects=2, tasks=0,
+            kpis=1, datapoints=1, rules=0, stdout=io.StringIO()
+        )
+        Task.objects.all().delete()
+        cls.project, cls.other_project = Project.objects.order_by('name')
+        cls.user = User.objects.filter(is_superuser=False).first()
+    
+    def create_tasks(self, ranks, status='todo', project=None):
+        tasks = [
+            Task.objects.create(project=project or self.project, title=f'Task {rank}', created_by=self.user)
+            for rank in ranks
+        ]
+        for task, rank in zip(tasks, ranks):
+            Task.objects.filter(pk=task.pk).update(rank=rank, status=status)
+            task.rank, task.status = rank, status
+        return tasks
+    
+    def column(self, status='todo'):
+        return list(
+            Task.objects.filter(project=self.project, status=status).order_by('rank').values_list('title', 'rank')
+        )
+    
+    def assertShortRanks(self, column):
+        for title, rank in column:
+            self.assertFalse(is_overlong(rank), (title, rank))
+    
+    def test_save_rebalances_overlong_append(self):
+        self.create_tasks(['h', 'zzz'])
+        Task.objects.create(project=self.project, title='Task new', created_by=self.user)
+        
+        column = self.column()
+        self.assertEqual([title for title, rank in column], ['Task h', 'Task zzz', 'Task new'])
+        self.assertShortRanks(column)
+    
+    def test_move_task_rebalances_overlong_insert(self):
+        tasks = self.create_tasks(['h', 'h11', 'h12'])
+        moved = self.create_tasks(['k'], status='in_progress')[0]
+        
+        rank = move_task(moved, 'todo', after=tasks[1].pk, before=tasks[2].pk)
+        
+        column = self.column()
+        self.assertEqual([title for title, rank in column], ['Task h', 'Task h11', 'Task k', 'Task h12'])
+        self.assertShortRanks(column)
+        self.assertEqual(rank, dict(column)['Task k'])
+    
+    def test_columns_to_rebalance(self):
+        self.create_tasks(['h', 'h111'])
+        self.create_tasks(['h', ''], status='review')
+        self.create_tasks(['h', 'i'], status='blocked')
+        self.create_tasks(['h', 'h11'], project=self.other_project)
+        
+        self.assertEqual(
+            sorted(columns_to_rebalance()),
+            sorted([(self.project.pk, 'todo'), (self.project.pk, 'review')])
+        )
+
+
+NOW = datetime(2026, 1, 5, 9, 0, tzinfo=timezone.utc)
+
+
+def graph_task(hours, status='todo', actual_hours=0, due_date=None, completed_at=None):
+    return {
+        'status': status, 'estimated_hours': hours, 'actual_hours': actual_hours,
+        'due_date': due_date, 'completed_at': completed_at,
+    }
+
+
+class TaskGraphTests(SimpleTestCase):
+    """Edges are ``(task_id, depends_on_id)`` pairs, as ``TaskGraph.load`` reads them."""
+    
+    def test_chain(self):
+        graph = TaskGraph(
+            {'a': graph_task(1), 'b': graph_task(2), 'c': graph_task(3)},
+            [('b', 'a'), ('c', 'b')]
+        )
+        order, cyclic = graph.topological_order()
+        self.assertEqual(order, ['a', 'b', 'c'])
+        self.assertEqual(cyclic, set())
+        self.assertEqual(graph.blocked(order, cyclic), {'b', 'c'})
+        self.assertEqual(graph.downstream('a'), {'b', 'c'})
+        
+        analysis = graph.analyze(NOW)
+        self.assertEqual(analysis['edge_count'], 2)
+        self.assertEqual(analysis['critical_path'], ['a', 'b', 'c'])
+        self.assertEqual(analysis['finish'], NOW + timedelta(hours=6))
+        self.assertEqual(analysis['schedule']['b']['earliest_start'], NOW + timedelta(hours=1))
+        for task_id in 'abc':
+            self.assertEqual(analysis['schedule'][task_id]['slack_hours'], 0)
+    
+    def test_diamond(self):
+        graph = TaskGraph(
+            {'a': graph_task(1), 'b': graph_task(4), 'c': graph_task(2), 'd': graph_task(1)},
+            [('b', 'a'), ('c', 'a'), ('d', 'b'), ('d', 'c')]
+        )
+        order, cyclic = graph.topological_order()
+        self.assertEqual(order[0], 'a')
+        self.assertEqual(order[-1], 'd')
+        self.assertEqual(cyclic, set())
+        
+        analysis = graph.analyze(NOW)
+        self.assertEqual(analysis['blocked'], ['b', 'c', 'd'])
+        self.assertEqual(analysis['critical_path'], ['a', 'b', 'd'])
+        self.assertEqual(analysis['finish'], NOW + timedelta(hours=6))
+        self.assertEqual(analysis['schedule']['d']['earliest_start'], NOW + timedelta(hours=5))
+        self.assertEqual(analysis['schedule']['b']['slack_hours'], 0)
+        self.assertEqual(analysis['schedule']['c']['slack_hours'], 2)
+    
+    def test_cycle(self):
+        graph = TaskGraph(
+            {'a': graph_task(1), 'b': graph_task(1), 'c': graph_task(1), 'd': graph_task(1), 'e': graph_task(1)},
+            [('b', 'a'), ('c', 'b'), ('a', 'c'), ('d', 'c')]
+        )
+        order, cyclic = graph.topological_order()
+        self.assertEqual(order, ['e'])
+        self.assertEqual(cyclic, {'a', 'b', 'c', 'd'})
+        
+        cycle = graph.find_cycle(cyclic)
+        self.assertEqual(sorted(cycle), ['a', 'b', 'c'])
+        for task_id, dependency_id in zip(cycle, cycle[1:] + cycle[:1]):
+            self.assertIn(dependency_id, graph.dependencies[task_id])
+        
+        analysis = graph.analyze(NOW)
+        self.assertEqual(analysis['cyclic'], ['a', 'b', 'c', 'd'])
+        self.assertEqual(analysis['blocked'], ['a', 'b', 'c', 'd'])
+        self.assertEqual(analysis['critical_path'], ['e'])
+    
+    def test_completed_upstream(self):
+        completed_at = NOW - timedelta(hours=2)
+        graph = TaskGraph(
+            {
+                'a': graph_task(5, status='completed', completed_at=completed_at),
+                'b': graph_task(3, actual_hours=1),
+                'c': graph_task(None),
+            },
+            [('b', 'a'), ('c', 'b'), ('c', 'outside')]
+        )
+        self.assertEqual(graph.edge_count, 2)
+        self.assertEqual(graph.remaining_hours('a', 8), 0)
+        self.assertEqual(graph.remaining_hours('b', 8), 2)
+        self.assertEqual(graph.remaining_hours('c', 8), 8)
+        
+        order, cyclic = graph.topological_order()
+        self.assertEqual(graph.blocked(order, cyclic), {'c'})
+        
+        schedule = graph.schedule(order, NOW, default_hours=8)
+        self.assertEqual(schedule['a']['earliest_finish'], completed_at)
+        self.assertEqual(schedule['b']['earliest_start'], NOW)
+        self.assertEqual(schedule['c']['earliest_finish'], NOW + timedelta(hours=10))
+        self.assertEqual(graph.critical_path(schedule), ['b', 'c'])
+    
+    def test_due_dates_limit_slack(self):
+        graph = TaskGraph(
+            {'a': graph_task(2), 'b': graph_task(2, due_date=NOW + timedelta(hours=3))},
+            [('b', 'a')]
+        )
+        schedule = graph.schedule(graph.topological_order()[0], NOW)
+        self.assertEqual(schedule['b']['slack_hours'], -1)
+        self.assertEqual(schedule['a']['slack_hours'], -1)
@@ -19,4 +19,5 @@ urlpatterns = [
     
     # API endpoints
     path('<uuid:project_id>/api/dashboard/', views.project_dashboard_data, name='dashboard_data'),
+    path('<uuid:project_id>/api/tasks/', views.project_task_list_data, name='task_list_data'),
 ]
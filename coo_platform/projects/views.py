@@ -9,6 +9,7 @@ from django.views.generic import (
 )
 from django.contrib import messages
 from django.http import JsonResponse
+from django.template.loader import render_to_string
 from django.db.models import Q, Count, Avg
 from django.utils import timezone
 from django.urls import reverse_lazy
@@ -18,6 +19,9 @@ from .models import (
     TaskComment, ProjectUpdate
 )
 from .forms import ProjectForm
+from .graph import get_task_graph, mark_tasks
+from .tasklist import TASK_PAGE_SIZE, MAX_TASK_PAGE_SIZE, filter_tasks, get_task_page
+from core.fastjson import FastJsonResponse
 from core.views import DashboardMixin
 from core.utils import log_user_action, create_notification
 from tenants.middleware import get_current_tenant
@@ -127,8 +131,19 @@ class ProjectDetailView(DashboardMixin, LoginRequiredMixin, DetailView):
             is_active=True
         ).first()
         
+        # Only the first page of tasks is rendered; the page loads the rest
+        # from project_task_list_data as it scrolls. Blocked and critical
+        # tasks come from the cached dependency graph.
+        dependency_graph = get_task_graph(project)
+        task_page, next_task_cursor = get_task_page(tasks.select_related('assigned_to'))
+        mark_tasks(task_page, dependency_graph)
+        
         context.update({
-            'tasks': tasks.order_by('priority', 'due_date'),
+            'tasks': task_page,
+            'next_task_cursor': next_task_cursor,
+            'task_status_choices': Task.STATUS_CHOICES,
+            'task_priority_choices': Task.PRIORITY_CHOICES,
+            'dependency_graph': dependency_graph,
             'task_stats': task_stats,
             'recent_updates': recent_updates,
             'team_members': team_members,
@@ -173,9 +188,9 @@ class ProjectCreateView(LoginRequiredMixin, CreateView):
         if not form.initial.get('project_manager'):
             form.initial['project_manager'] = self.request.user
             form.initial['status'] = 'planning'
-            
+        
         return form
-
+    
     def get_initial(self):
         initial = super().get_initial()
         initial['project_manager'] = self.request.user
@@ -216,7 +231,7 @@ class ProjectCreateView(LoginRequiredMixin, CreateView):
             
             messages.success(self.request, f'Project "{self.object.name}" created successfully.')
             return response
-            
+        
         except Exception as e:
             messages.error(self.request, f'Error creating project: {str(e)}')
             return self.form_invalid(form)
@@ -269,9 +284,9 @@ class ProjectUpdateView(LoginRequiredMixin, UpdateView):
             current_user = self.request.user
             if current_user not in form.fields['project_manager'].queryset:
                 form.fields['project_manager'].queryset |= User.objects.filter(pk=current_user.pk)
-            
+        
         return form
-
+    
     def get_success_url(self):
         return reverse_lazy('projects:detail', kwargs={'pk': self.object.pk})
     
@@ -494,3 +509,73 @@ def project_dashboard_data(request, project_id):
         'budget': budget_data,
         'timeline': timeline_data
     })
+
+
+@login_required
+def project_task_list_data(request, project_id):
+    """
+    Get one page of a project's tasks (AJAX endpoint for the project detail page).
+    
+    Query parameters: the ``filter_tasks`` filters, ``cursor`` (the
+    ``next_cursor`` of the previous page), ``size``, and ``render=1`` to
+    include the rendered task rows as ``html``.
+    """
+    tenant_user = request.user.tenant_memberships.filter(is_active=True).first()
+    if not tenant_user:
+        return FastJsonResponse({'error': 'No tenant access'}, status=404)
+    
+    try:
+        project = Project.objects.get(id=project_id, tenant=tenant_user.tenant)
+    except Project.DoesNotExist:
+        return FastJsonResponse({'error': 'Project not found'}, status=404)
+    
+    try:
+        size = min(max(int(request.GET.get('size', TASK_PAGE_SIZE)), 1), MAX_TASK_PAGE_SIZE)
+    except ValueError:
+        size = TASK_PAGE_SIZE
+    
+    try:
+        tasks = filter_tasks(project.tasks.select_related('assigned_to'), request.GET)
+        task_page, next_cursor = get_task_page(tasks, request.GET.get('cursor'), size)
+    except ValueError as e:
+        return FastJsonResponse({'error': str(e)}, status=400)
+    mark_tasks(task_page, get_task_graph(project))
+    
+    data = {
+        'results': [
+            {
+                'id': task.id,
+                'title': task.title,
+                'status': task.status,
+                'priority': task.priority,
+                'assigned_to': (
+                    task.assigned_to.get_full_name() or task.assigned_to.username
+                ) if task.assigned_to else None,
+                'due_date': task.due_date,
+                'estimated_hours': task.estimated_hours,
+                'is_overdue': task.is_overdue,
+                'is_dependency_blocked': task.is_dependency_blocked,
+                'is_critical': task.is_critical,
+            }
+            for task in task_page
+        ],
+        'next_cursor': next_cursor,
+    }
+    
+    if request.GET.get('render'):
+        user_membership = ProjectMembership.objects.filter(
+            project=project,
+            user=request.user,
+            is_active=True
+        ).first()
+        # Rendered without the request: context processors would run once per row
+        data['html'] = ''.join(
+            render_to_string('components/task_row.html', {
+                'task': task,
+                'user': request.user,
+                'user_membership': user_membership,
+            })
+            for task in task_page
+        )
+    
+    return FastJsonResponse(data)
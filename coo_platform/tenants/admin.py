@@ -5,7 +5,7 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import Tenant, TenantUser, TenantInvitation, ActiveTenant, TrialTenant
+from .models import Tenant, TenantUser, TenantInvitation, TenantReport, ActiveTenant, TrialTenant
 
 
 @admin.register(Tenant)
@@ -198,3 +198,23 @@ class TenantInvitationAdmin(admin.ModelAdmin):
         )
         self.message_user(request, f'{updated} invitation expiry dates extended.')
     extend_expiry.short_description = 'Extend expiry by 7 days'
+
+
+@admin.register(TenantReport)
+class TenantReportAdmin(admin.ModelAdmin):
+    list_display = ('tenant', 'month', 'generated_at', 'generation_ms')
+    list_filter = ('month', 'generated_at')
+    search_fields = ('tenant__name',)
+    readonly_fields = ('id', 'generated_at', 'generation_ms', 'created_at', 'updated_at')
+    raw_id_fields = ('tenant',)
+    
+    actions = ['regenerate_reports']
+    
+    def regenerate_reports(self, request, queryset):
+        from .reports import generate_report
+        
+        for report in queryset.select_related('tenant'):
+            generate_report(report.tenant, report.month)
+        
+        self.message_user(request, f'{queryset.count()} reports regenerated.')
+    regenerate_reports.short_description = 'Regenerate selected reports'
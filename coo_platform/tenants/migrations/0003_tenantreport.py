@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:00
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0002_tenant_owner'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TenantReport',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('month', models.DateField(help_text='First day of the reported month')),
+                ('data', models.JSONField(default=dict, help_text='Aggregated report statistics')),
+                ('deltas', models.JSONField(default=dict, help_text="Changes compared to the previous month's report")),
+                ('generated_at', models.DateTimeField()),
+                ('generation_ms', models.PositiveIntegerField(default=0)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reports', to='tenants.tenant')),
+            ],
+            options={
+                'ordering': ['-month'],
+                'unique_together': {('tenant', 'month')},
+            },
+        ),
+    ]
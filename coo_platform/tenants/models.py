@@ -203,6 +203,32 @@ class TenantInvitation(UUIDModel, TimeStampedModel):
         return not self.is_accepted and not self.is_expired
 
 
+class TenantReport(UUIDModel, TimeStampedModel):
+    """
+    Stored snapshot of a tenant's monthly report.
+    
+    Reports are generated once per month (see tenants.reports) and served
+    from the snapshot afterwards; regenerating overwrites the snapshot.
+    """
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='reports')
+    month = models.DateField(help_text="First day of the reported month")
+    
+    # Report contents
+    data = models.JSONField(default=dict, help_text="Aggregated report statistics")
+    deltas = models.JSONField(default=dict, help_text="Changes compared to the previous month's report")
+    
+    # Generation metadata
+    generated_at = models.DateTimeField()
+    generation_ms = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['tenant', 'month']
+        ordering = ['-month']
+    
+    def __str__(self):
+        return f"{self.tenant.name} report for {self.month:%B %Y}"
+
+
 class TenantAwareModel(models.Model):
     """
     Abstract base model for all tenant-aware models.
@@ -0,0 +1,183 @@
+"""
+Monthly tenant reports.
+
+A report is computed with a few aggregate queries per tenant and stored as a
+TenantReport snapshot; it is served from the snapshot afterwards. Deltas are
+taken against the previous month's snapshot instead of recomputing it.
+"""
+from django.db import transaction
+from django.db.models import Avg, Count, Q
+from django.utils import timezone
+from datetime import datetime, time
+import logging
+import time as clock
+
+from core.partitioning import add_months, month_start
+from .models import TenantReport
+
+logger = logging.getLogger(__name__)
+
+ON_TARGET_STATUSES = ['excellent', 'good']
+
+
+def get_report_month(value=None):
+    """
+    First day of the month to report on: the month containing ``value``
+    (a date or ISO string), or the last complete month by default.
+    """
+    if value is None:
+        return add_months(month_start(timezone.now().date()), -1)
+    if isinstance(value, str):
+        value = datetime.strptime(value[:10], '%Y-%m-%d').date()
+    return month_start(value)
+
+
+def _month_bounds(month):
+    """Aware datetimes delimiting ``month`` (index friendly range filters)."""
+    start = timezone.make_aware(datetime.combine(month, time.min))
+    end = timezone.make_aware(datetime.combine(add_months(month, 1), time.min))
+    return start, end
+
+
+def get_project_stats(tenant, month):
+    from projects.models import Project
+    
+    next_month = add_months(month, 1)
+    today = timezone.now().date()
+    return Project.objects.filter(tenant=tenant).aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(status='active')),
+        completed_this_month=Count('id', filter=Q(
+            status='completed',
+            actual_end_date__gte=month,
+            actual_end_date__lt=next_month
+        )),
+        overdue=Count('id', filter=Q(
+            target_end_date__lt=today,
+            status__in=['planning', 'active', 'on_hold']
+        )),
+        average_progress=Avg('progress_percentage'),
+    )
+
+
+def get_task_stats(tenant, month):
+    from projects.models import Task
+    
+    start, end = _month_bounds(month)
+    return Task.objects.filter(project__tenant=tenant).aggregate(
+        created_this_month=Count('id', filter=Q(created_at__gte=start, created_at__lt=end)),
+        completed_this_month=Count('id', filter=Q(completed_at__gte=start, completed_at__lt=end)),
+        open=Count('id', filter=Q(status__in=['todo', 'in_progress'])),
+    )
+
+
+def get_kpi_stats(tenant, month):
+    from kpis.models import KPIAlert, SmartKPI
+    
+    # Performance status is computed in SQL and grouped, so KPIs are never loaded
+    by_status = {
+        row['performance_status']: row['count']
+        for row in SmartKPI.objects.filter(
+            tenant=tenant, is_active=True
+        ).with_performance_status().values('performance_status').annotate(
+            count=Count('id')
+        ).order_by()
+    }
+    
+    start, end = _month_bounds(month)
+    alerts = KPIAlert.objects.filter(
+        kpi__tenant=tenant,
+        created_at__gte=start,
+        created_at__lt=end
+    ).aggregate(
+        alerts_this_month=Count('id'),
+        unresolved_alerts=Count('id', filter=Q(is_resolved=False)),
+        critical_alerts=Count('id', filter=Q(severity='critical')),
+    )
+    
+    return {
+        'total': sum(by_status.values()),
+        'on_target': sum(by_status.get(status, 0) for status in ON_TARGET_STATUSES),
+        'by_status': by_status,
+        **alerts,
+    }
+
+
+def get_automation_stats(tenant, month):
+    from automation.models import AutomationLog
+    
+    start, end = _month_bounds(month)
+    return AutomationLog.objects.filter(
+        rule__tenant=tenant,
+        created_at__gte=start,
+        created_at__lt=end
+    ).aggregate(
+        executions=Count('id'),
+        succeeded=Count('id', filter=Q(status='success')),
+        failed=Count('id', filter=Q(status='error')),
+    )
+
+
+def build_report(tenant, month):
+    """Compute the report data of ``tenant`` for ``month``."""
+    data = {
+        'tenant': tenant.name,
+        'month': month.isoformat(),
+        'projects': get_project_stats(tenant, month),
+        'tasks': get_task_stats(tenant, month),
+        'kpis': get_kpi_stats(tenant, month),
+        'automation': get_automation_stats(tenant, month),
+    }
+    data['projects']['average_progress'] = round(data['projects']['average_progress'] or 0, 1)
+    return data
+
+
+def compute_deltas(current, previous):
+    """Numeric differences between two report sections, recursively."""
+    deltas = {}
+    for key, value in current.items():
+        before = previous.get(key)
+        if isinstance(value, dict) and isinstance(before, dict):
+            nested = compute_deltas(value, before)
+            if nested:
+                deltas[key] = nested
+        elif isinstance(value, (int, float)) and isinstance(before, (int, float)):
+            deltas[key] = round(value - before, 2)
+    return deltas
+
+
+def generate_report(tenant, month=None):
+    """
+    Build and store the report of ``tenant`` for ``month``, replacing an
+    existing snapshot. Deltas come from the previous month's snapshot.
+    """
+    month = get_report_month(month)
+    started = clock.monotonic()
+    data = build_report(tenant, month)
+    
+    previous = TenantReport.objects.filter(
+        tenant=tenant, month=add_months(month, -1)
+    ).values_list('data', flat=True).first()
+    deltas = compute_deltas(data, previous) if previous else {}
+    
+    with transaction.atomic():
+        report, _ = TenantReport.objects.update_or_create(
+            tenant=tenant,
+            month=month,
+            defaults={
+                'data': data,
+                'deltas': deltas,
+                'generated_at': timezone.now(),
+                'generation_ms': int((clock.monotonic() - started) * 1000),
+            }
+        )
+    
+    logger.info(f"Generated {month:%B %Y} report for {tenant.name} in {report.generation_ms}ms")
+    return report
+
+
+def get_report(tenant, month=None):
+    """Return the stored report, generating it only if there is no snapshot yet."""
+    month = get_report_month(month)
+    report = TenantReport.objects.filter(tenant=tenant, month=month).first()
+    return report or generate_report(tenant, month)